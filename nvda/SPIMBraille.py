@@ -12,15 +12,33 @@ if (__name__ == "__main__"):
 	exit()
 
 # Python imports
-import socket, re
+import re, struct, itertools
 
 # NVDA imports
 import braille
 from logHandler import log
 
+# SPIM Braille tracing
+import spim_trace
+
+# Sharing frames with viewers in other processes
+import spim_publish
+
 # Log loading of driver
 log.info("Loading SPIM Braille support")
 
+# The ways a register slot can show a number, as (name, label). See encoders.
+RENDERINGS = (
+	("hex", _("hex")),
+	("signed", _("signed decimal")),
+	("unsigned", _("unsigned decimal")),
+	("bytes", _("binary by byte")),
+	("halfwords", _("binary by halfword")),
+	("ascii", _("ASCII")),
+	("float", _("float")),
+)
+
+
 # This class extends the existing Braille driver to add the extended SPIM
 # functionality.
 # Drivers can essentially be copied and modified slightly to add this support.
@@ -38,6 +56,51 @@ class SPIMBrailleDisplayDriver(braille.BrailleDisplayDriver):
 	# make any use of SpimBraille.
 	hasSPIM = True
 
+	# Callables given the cells of every frame written to the display. See addFrameListener.
+	frameListeners = ()
+
+	# The spim_publish.FramePublisher frames are shared through, while publishing is on
+	publisher = None
+
+	# Cells of the register slots being shown, encoded when the registers are
+	# set rather than on every frame. None until the next display.
+	registerCells = None
+
+	# Register banks: pages of register slots that can be switched between.
+	# Every bank's cells are encoded when the banks are set, so showing another
+	# bank only swaps which encoded cells follow the main cells.
+	bankNames = ()
+	bankValues = ()
+	bankCells = ()
+	currentBank = 0
+
+	# Which register slot each cell of the display belongs to, with None for
+	# NVDA's cells and the separators. Worked out again only when the layout
+	# (main cell count, slot count, separators) changes. See registerAt.
+	regionMap = ()
+	regionLayout = None
+
+	# How each slot shows numbers, as one of the RENDERINGS names. Slots past
+	# the end of the list are shown in hex. Raw cells are shown as they are.
+	slotModes = ()
+	renderings = RENDERINGS
+
+	# For displays with WizWheels: the actions a wheel can be set to, as (label,
+	# script to scroll back, script to scroll forward). See initWizWheels.
+	wizWheelActions=[
+		# Translators: The name of a key on a braille display, that scrolls the display to show previous/next part of a long line.
+		(_("display scroll"),("globalCommands","GlobalCommands","braille_scrollBack"),("globalCommands","GlobalCommands","braille_scrollForward")),
+		# Translators: The name of a key on a braille display, that scrolls the display to show the next/previous line.
+		(_("line scroll"),("globalCommands","GlobalCommands","braille_previousLine"),("globalCommands","GlobalCommands","braille_nextLine")),
+		# Switches between the register banks set by the app module.
+		(_("register banks"),None,None),
+	]
+
+	# While this is above 0, display() composes frames but holds the write; the
+	# latest frame is kept and written once holding ends. See holdFrame.
+	_holdWrites = 0
+	_heldCells = None
+
 	@classmethod
 	def check(cls):
 		# In the superclass, this will return false to prevent NVDA from thinking the superclass is an actual available driver.
@@ -48,7 +111,83 @@ class SPIMBrailleDisplayDriver(braille.BrailleDisplayDriver):
 		"""Returns the number of registers available for display."""
 		# The self.registers variable MUST be initialized as a list of Nones with a length being the number of available registers.
 		return len(self.registers)
+
+	def addFrameListener(self, listener):
+		"""Registers a callable to be given the cells of every frame written to the display."""
+		# The list is replaced rather than changed, so a write in progress on another thread is unaffected.
+		self.frameListeners = list(self.frameListeners) + [listener]
+
+	def removeFrameListener(self, listener):
+		"""Stops giving frames to a callable registered with addFrameListener."""
+		self.frameListeners = [l for l in self.frameListeners if l != listener]
+
+	def startPublishing(self, path=None):
+		"""Starts sharing every frame written with viewers in other processes. Returns the frame file's name."""
+		if (self.publisher is None):
+			self.publisher = spim_publish.FramePublisher(path or spim_publish.DEFAULT_PATH)
+			self.addFrameListener(self.publisher.publish)
+		return self.publisher.path
+
+	def stopPublishing(self):
+		"""Stops sharing frames. Viewers keep the last frame published."""
+		if (self.publisher is None): return
+		publisher, self.publisher = self.publisher, None
+		self.removeFrameListener(publisher.publish)
+		publisher.close()
+
+	# A derived class calls this after writing a frame to the hardware. Listeners are
+	# things like session recorders; they must be quick, as they run on the write path.
+	def frameWritten(self, cells):
+		for listener in self.frameListeners:
+			try:
+				listener(cells)
+			except:
+				log.warn("SPIM Braille frame listener failed.", exc_info=True)
 	
+	def initWizWheels(self):
+		"""Sets both WizWheels to the first of wizWheelActions. A driver for a display with WizWheels calls this from its init method."""
+		self.leftWizWheelActionCycle = itertools.cycle(self.wizWheelActions)
+		self.leftWizWheelAction = self.leftWizWheelActionCycle.next()
+		self.rightWizWheelActionCycle = itertools.cycle(self.wizWheelActions)
+		self.rightWizWheelAction = self.rightWizWheelActionCycle.next()
+
+	def holdFrame(self, cells):
+		"""Keeps a composed frame to write later if writes are being held. Returns True if it was kept, in which case the driver mustn't write it now."""
+		if (self._holdWrites > 0):
+			self._heldCells = cells
+			return True
+		return False
+
+	def _writeCells(self, cells):
+		"""Writes a composed frame to the display. A driver that uses holdFrame must provide this."""
+		raise NotImplementedError
+
+	# Coalesced WizWheel scrolling. The driver folds a burst of wheel turns into
+	# one gesture with a count, and binds its wheel gestures to this script.
+	def script_wizWheelScroll(self, gesture):
+		action = self.rightWizWheelAction if gesture.isRight else self.leftWizWheelAction
+		if (action[1] is None):
+			# Register banks are already encoded, so a whole burst is one swap.
+			name = self.selectBank(self.currentBank + (gesture.count if gesture.isDown else -gesture.count))
+			if (name is not None):
+				import ui
+				ui.message(name)
+			return
+		scriptName = (action[2] if gesture.isDown else action[1])[2]
+		import globalCommands
+		script = getattr(globalCommands.commands, "script_%s" % scriptName)
+		if spim_trace.enabled: spim_trace.record(spim_trace.EV_WIZWHEEL_BURST, gesture.count)
+		# Move through every unit of the burst, but only put the final position on the display.
+		self._holdWrites += 1
+		try:
+			for unit in xrange(gesture.count):
+				script(gesture)
+		finally:
+			self._holdWrites -= 1
+			if (self._holdWrites == 0 and self._heldCells is not None):
+				cells, self._heldCells = self._heldCells, None
+				self._writeCells(cells)
+
 	# This method emulates the existing Braille driver "display" method, but adds in
 	# the register displays prior to feeding data back to the actual display driver.
 	# A class working with this driver can call this method with the same data it has been
@@ -59,23 +198,27 @@ class SPIMBrailleDisplayDriver(braille.BrailleDisplayDriver):
 		
 		# Now, we append the register cells...
 		if (self.hasSPIM == True):
-			for r in self.registers:
+			if (self.registerCells is None):
+				self.registerCells = [encodeRegister(r, self.slotMode(i)) for i, r in enumerate(self.registers)]
+			for r in self.registerCells:
 				if (noSeparators == False): cells.extend([255])
-				if (type(r) is str):
-					cells.extend([ord(x) for x in r[0:8]])
-				elif (r is None):
-					# Default to a list of 8 blank cells
-					cells.extend([0]*8)
-				else:
-					# If a number is contained in the variable, display it.
-					cells.extend( numToBraille(r) )
+				cells.extend(r)
 			if (noSeparators == False):  cells.extend([255])
+			layout = (len(self.lastCells), len(self.registers), noSeparators)
+			if (layout != self.regionLayout):
+				self.regionMap = regionMap(*layout)
+				self.regionLayout = layout
 
-		# Extremely verbose logging. Don't use debug level with this unless you need to.
-		log.debug("Displaying %d cells: %s" % (len(cells),[str(x) for x in cells]))
+		# Extremely verbose tracing. Nothing is built here unless tracing is on.
+		if spim_trace.enabled: spim_trace.record(spim_trace.EV_COMPOSE, len(cells), cells)
 
 		return cells
 
+	def registerAt(self, index):
+		"""Returns the register slot shown at a cell of the display (as a routing key gives it), or None if the cell isn't in a register block."""
+		if (0 <= index < len(self.regionMap)): return self.regionMap[index]
+		return None
+
 	def setAllRegisters(self, regs):
 		"""Sets all registers at the same time. Accepts a list which must be the same length as the number of registers for this display."""
 
@@ -105,7 +248,7 @@ class SPIMBrailleDisplayDriver(braille.BrailleDisplayDriver):
 		if (data is None): 
 			self.registers[regNum] = None
 
-		elif (type(data) is int): # We only process ints here; use setRegister_raw for actual cell bytes.
+		elif (isinstance(data, (int, long))): # We only process numbers here; use setRegister_raw for actual cell bytes.
 			# Set register data to a value
 
 			# If we can't set this register, log a warning.
@@ -128,34 +271,197 @@ class SPIMBrailleDisplayDriver(braille.BrailleDisplayDriver):
 			# Set the register
 			self.registers[regNum] = data 
 		
+		self.registerCells = None # encode again on the next display
+
 		# Call a display to update the display with a new register.
 		if (updateNow==True):
 			self.display(self.lastCells)
+
+	def setBanks(self, banks, names):
+		"""Sets the registers of every bank. banks is a list with, for each bank, a list of registers as setAllRegisters takes them."""
+
+		if (self.hasSPIM == False): return
+
+		oldValues, oldCells = self.bankValues, self.bankCells
+		self.bankNames = list(names)
+		self.bankValues = [[registerData(r) for r in bank[:len(self.registers)]] + [None] * (len(self.registers) - len(bank)) for bank in banks]
+		cells = []
+		for i, bank in enumerate(self.bankValues):
+			# Most banks are unchanged from one update to the next; keep their cells.
+			if (i < len(oldValues) and oldValues[i] == bank): cells.append(oldCells[i])
+			else: cells.append([encodeRegister(r, self.slotMode(slot)) for slot, r in enumerate(bank)])
+		self.bankCells = cells
+		self.currentBank = max(0, min(self.currentBank, len(banks) - 1))
+		self.showBank()
+
+	def selectBank(self, index):
+		"""Shows bank number index (wrapping around). Returns the bank's name, or None if there are no banks."""
+
+		if (self.hasSPIM == False or len(self.bankCells) == 0): return None
+		self.currentBank = index % len(self.bankCells)
+		self.showBank()
+		return self.bankNames[self.currentBank]
+
+	def slotMode(self, slot):
+		"""The rendering used for numbers in a slot."""
+		if (slot < len(self.slotModes)): return self.slotModes[slot]
+		return "hex"
+
+	def setSlotModes(self, modes):
+		"""Sets how each slot shows numbers: a list with one of the RENDERINGS names (or None for hex) per slot."""
+
+		if (self.hasSPIM == False): return
+		modes = [(m if m in encoders else "hex") for m in modes]
+		if (modes == list(self.slotModes)): return
+		changed = [slot for slot in range(len(self.registers)) if self.slotMode(slot) != (modes[slot] if slot < len(modes) else "hex")]
+		self.slotModes = modes
+		# Only the slots whose rendering changed are encoded again, in every bank.
+		for bank, cells in zip(self.bankValues, self.bankCells):
+			for slot in changed:
+				cells[slot] = encodeRegister(bank[slot], self.slotMode(slot))
+		self.registerCells = None
+		if (hasattr(self, "lastCells")): self.display(self.lastCells)
+
+	def showBank(self):
+		if (len(self.bankCells) == 0): return
+		self.registers = list(self.bankValues[self.currentBank])
+		self.registerCells = self.bankCells[self.currentBank]
+		if (hasattr(self, "lastCells")): self.display(self.lastCells)
 	
+def regionMap(mainCells, registerCount, noSeparators=False):
+	"""The register slot of each cell in a frame laid out by display, or None for main cells and separators."""
+	regions = [None] * mainCells
+	for slot in range(registerCount):
+		if (noSeparators == False): regions.append(None)
+		regions.extend([slot] * 8)
+	if (noSeparators == False): regions.append(None)
+	return regions
+
+def registerData(data):
+	"""What a slot holds for data as setRegister takes it: None, a number, or exactly 8 raw cells as a string."""
+	if (data is None or isinstance(data, (int, long))): return data
+	return str(data)[:8].ljust(8, '\x00')
+
+def encodeRegister(data, mode="hex"):
+	"""The 8 cells showing a register: raw cells given as a string, a number in the given rendering, or blank for None."""
+	if (data is None): return [0]*8
+	if (isinstance(data, str)): return [ord(x) for x in data[0:8]]
+	if (mode == "hex"): return numToBraille(data)
+	return encoders[mode](data & 0xffffffff)
+
+# Braille map...
+numMap = { '1': 0x02, '2': 0x06, '3': 0x12, '4': 0x32, 
+		   '5': 0x22, '6': 0x16, '7': 0x36, '8': 0x26,
+		   '9': 0x14, '0': 0x34, 'a': 0x01, 'b': 0x03, 
+		   'c': 0x09, 'd': 0x19, 'e': 0x11, 'f': 0x0b}
+
+# The two cells for each byte value, so a 32-bit number is four lookups.
+byteCells = [[numMap[c] for c in "%02x" % b] for b in range(256)]
+
 def numToBraille(num,desiredLength=8):
 	"""Convenience method to translate an integer into a set of characters representing Braille cells"""
 
-	# Convert number to hex
-	num = hex(num)[2:]
-	
-	# Create a string by taking only up to 8 characters and then padding on the left out with 0's.
-	s = num[0:8].zfill(8)
-
-	# Braille map...
-	numMap = { '1': 0x02, '2': 0x06, '3': 0x12, '4': 0x32, 
-			   '5': 0x22, '6': 0x16, '7': 0x36, '8': 0x26,
-			   '9': 0x14, '0': 0x34, 'a': 0x01, 'b': 0x03, 
-			   'c': 0x09, 'd': 0x19, 'e': 0x11, 'f': 0x0b}
-	out = []
-
-	# Iterate through the string and apply the Braille map to get the desired output characters.	
-	for c in s:
-		if (c in numMap.keys()):
-			out.append(numMap[c])
-		else:
-			out.append(252) # A Braille "for" sign will be used for invalid characters.
+	if (0 <= num <= 0xffffffff):
+		out = byteCells[num >> 24] + byteCells[(num >> 16) & 0xff] + byteCells[(num >> 8) & 0xff] + byteCells[num & 0xff]
+	else:
+		# Convert number to hex
+		digits = "%x" % num # not hex(), which adds an L to longs
+		# As hex() did, a negative number's '-0x' loses its first two characters, so it's shown with a for sign after the zeros.
+		if (num < 0): digits = "x" + digits[1:]
+
+		# Create a string by taking only up to 8 characters and then padding on the left out with 0's.
+		s = digits[0:8].zfill(8)
+
+		# Iterate through the string and apply the Braille map to get the desired output characters.	
+		# A Braille "for" sign will be used for invalid characters.
+		out = [numMap.get(c, 252) for c in s]
 
-	# VERBOSE - debug  is only for the faint of heart.
-	log.debug("Converted '%s' to: %s" % (s, " ".join([str(hex(x)) for x in [ord(y) for y in out]]) ) ) 		
+	# VERBOSE - tracing is only for the faint of heart.
+	if spim_trace.enabled: spim_trace.record(spim_trace.EV_NUM_TO_BRAILLE, num, out)
 
 	return out
+
+# Other renderings of a 32-bit number, each made of table lookups so a slot
+# can change rendering without slowing down the display.
+
+# Cells for the characters of a decimal or floating point number. The digits
+# are those numToBraille uses.
+numberMap = dict(numMap)
+numberMap.update({'-': 0x24, '+': 0x2c, '.': 0x28, 'n': 0x1d, 'i': 0x0a})
+
+def numberCells(text):
+	"""The cells of a number's text, right aligned in 8 cells. Unknown characters are shown as a for sign."""
+	return [0] * (8 - len(text)) + [numberMap.get(c, 252) for c in text]
+
+def shortNumber(value):
+	"""A number's text in at most 8 characters, in exponent form if it is too long."""
+	text = str(value) if (isinstance(value, (int, long))) else "%g" % value
+	for precision in range(7, 0, -1):
+		if (len(text) <= 8): break
+		text = "%.*g" % (precision, value)
+	return text[:8]
+
+def bitCells(value, dots):
+	"""A cell with dots[i] raised for each bit i set in value, highest bit first in dots."""
+	cell = 0
+	for i, dot in enumerate(dots):
+		if (value & (1 << (len(dots) - 1 - i))): cell |= 1 << (dot - 1)
+	return cell
+
+# One cell per byte, its bits read across the rows: dots 1 4, 2 5, 3 6, 7 8.
+byteDots = [bitCells(b, (1, 4, 2, 5, 3, 6, 7, 8)) for b in range(256)]
+# One cell per four bits, in the top two rows: dots 1 4, 2 5.
+nibbleDots = [bitCells(n, (1, 4, 2, 5)) for n in range(16)]
+
+letterMap = {
+	'a': 0x01, 'b': 0x03, 'c': 0x09, 'd': 0x19, 'e': 0x11,
+	'f': 0x0b, 'g': 0x1b, 'h': 0x13, 'i': 0x0a, 'j': 0x1a,
+	'k': 0x05, 'l': 0x07, 'm': 0x0d, 'n': 0x1d, 'o': 0x15,
+	'p': 0x0f, 'q': 0x1f, 'r': 0x17, 's': 0x0e, 't': 0x1e,
+	'u': 0x25, 'v': 0x27, 'w': 0x3a, 'x': 0x2d, 'y': 0x3d,
+	'z': 0x35}
+
+def asciiPair(b):
+	"""Two cells for a byte shown as a character: the letter (dot 7 for capitals), digit or space and a blank, otherwise the byte in hex."""
+	c = chr(b)
+	if (c in letterMap): return [letterMap[c], 0]
+	if (c.lower() in letterMap): return [letterMap[c.lower()] | 0x40, 0]
+	if (c.isdigit()): return [numMap[c], 0]
+	if (c == ' '): return [0, 0]
+	return [numMap[d] for d in "%02x" % b]
+
+asciiCells = [asciiPair(b) for b in range(256)]
+
+def signedCells(num):
+	return numberCells(shortNumber(num - 0x100000000 if (num & 0x80000000) else num))
+
+def unsignedCells(num):
+	return numberCells(shortNumber(num))
+
+def byteCellsOf(num):
+	return [byteDots[num >> 24], 0, byteDots[(num >> 16) & 0xff], 0, byteDots[(num >> 8) & 0xff], 0, byteDots[num & 0xff], 0]
+
+def halfwordCells(num):
+	out = [nibbleDots[(num >> shift) & 0xf] for shift in range(28, -4, -4)]
+	# Dot 7 marks the first cell of each halfword.
+	out[0] |= 0x40
+	out[4] |= 0x40
+	return out
+
+def asciiText(num):
+	# Memory order: PCSpim's MIPS is little endian, so the low byte is the first character.
+	return asciiCells[num & 0xff] + asciiCells[(num >> 8) & 0xff] + asciiCells[(num >> 16) & 0xff] + asciiCells[num >> 24]
+
+def floatCells(num):
+	# The bits as a single precision floating point number, as mfc1 and mtc1 move them.
+	return numberCells(shortNumber(struct.unpack("<f", struct.pack("<I", num))[0]))
+
+encoders = {
+	"hex": numToBraille,
+	"signed": signedCells,
+	"unsigned": unsignedCells,
+	"bytes": byteCellsOf,
+	"halfwords": halfwordCells,
+	"ascii": asciiText,
+	"float": floatCells,
+}
@@ -10,19 +10,19 @@
 # A CSV file will be created in %AppData%\Roaming\NVDA\Research for the study.
 
 # Python system imports
-import re, time, random, os.path, threading, tempfile, subprocess
-
-# WXWidgets
-import wx
-
-# Win32
-import win32clipboard, win32con
+# wx, win32clipboard, subprocess, tempfile, random and the settings dialog are
+# imported by the scripts that use them, to keep loading the app module fast.
+import re, time, os.path, threading, types, logging
 
 # NVDA-specific imports
 from NVDAObjects.IAccessible import IAccessible, ContentGenericClient
-import appModuleHandler, ui, api, tones, braille, config, gui, textInfos
+import appModuleHandler, ui, api, tones, braille, config, gui, textInfos, queueHandler
+import textInfos.offsets
 from logHandler import log
-from gui import settingsDialogs
+
+# PC Spim support modules. Those used by a single feature (spim_export, spim_stack,
+# spim_watch and spim_session) are imported when the feature is first used.
+import spim_mips, spim_jobs, spim_cache, spim_source, spim_symbols, spim_memory, spim_registers, spim_trace, spim_status
 
 # Static variables
 
@@ -41,11 +41,20 @@ R - Reveal mode. Displays in each region of the display what register is being d
 
 Braille configuration
 
-C - Open Display Configuration. Allows you to set which registers will be displayed in which regions of the Braille display.
+C - Open Display Configuration. Allows you to set which registers will be displayed in which regions of the Braille display. Any register in the Registers window can be chosen: the general registers, PC, EPC, Cause, BadVAddr, Status, HI and LO, and the floating point registers (f0 to f31 single, d0 to d30 double, shown as decimal numbers). A watch expression can be typed instead, such as $sp+8, mem[$a0] (the memory word at the address in a0), $t0-$t1 or label+4. Watch expressions are worked out again on every update.
+B - Show the next register bank on the Braille display. The first bank holds the registers chosen with C; the others are args (a0 to a3, v0 and v1), temps (t0 to t9) and saved (s0 to s7), split into pages that fit the display. Control+B shows the previous bank. (Press NVDA+Control+Shift+B.) On a Focus display, banks can also be put on a WizWheel: press the wheel until it says register banks.
+
+Register Blocks
+
+Press a routing key over a register block on the Braille display to hear that register: its name, its value in hex and in signed decimal, and the label it points to. Press the routing key twice quickly to pin the register as a watch, or to unpin it.
+W - Recite the pinned watches. They are also recited after each step or run.
+N - Change how the numbers in the register block last chosen with a routing key are shown (the first block if none was chosen): hex, signed decimal, unsigned decimal, binary by byte, binary by halfword, ASCII, or float. Control+N goes back. (Press NVDA+Control+Shift+N.) Each block's rendering can also be set in the configuration dialog.
 
 Code Readability
 
-I - Recite (and provide in Braille) information about the current line of code. Note: you should be focused on the Code window when you use this command.
+I - Recite (and provide in Braille) information about the current line of code, including the source line it came from. Note: you should be focused on the Code window when you use this command.
+E - Recite the instruction fields of the current line of code: its format (R, I or J), the rs, rt, rd, shamt, immediate and target fields, and where a branch or jump goes.
+J - Jump to Source Line. Asks for a line number in your program, then moves the Code window caret to the first instruction made from that line.
 X - Make All Code Readable. Produces and opens a text file displaying all of the code in the Code window, processed for easy readability.
 Z - Make All Code Readable (Verbose). Produces and opens a text file displaying all of the code in the Code window, processed for easy readability with verbose output. More details are given for each instruction.
 
@@ -57,6 +66,21 @@ User Interface
 4 - Set focus to the Status window.
 5 - Set focus to the Console.
 P - Copy the contents of the Console to the system clipboard.
+T - Recite the latest exceptions, errors and breakpoints from the Status window. New ones are also recited as they appear: after a step or run, and every second in live mode.
+
+Memory and Stack
+
+M - Recite the memory words changed since memory was last read: where they are (by label when there is one), and their old and new values. Memory is read when you press M, and after each step or run only if changed words are recited automatically or a watch reads memory.
+Control+M - Turn on or off reciting changed memory words automatically after each step or run. (Press NVDA+Control+Shift+M.)
+K - Recite the functions on the stack, innermost first, and the innermost stack frame: its size, where its return address is saved and the words saved in it.
+O - Move out to the stack frame of the calling function, and recite it.
+U - Move back in to the stack frame of the called function, and recite it.
+To show the saved return address of the selected stack frame on the Braille display, choose "frame" for a register in the configuration dialog.
+
+Research
+
+S - Start or stop recording a session. The session file is saved in %AppData%\Roaming\NVDA\Research and can be played back with tools/spim_replay.py.
+Control+V - Start or stop sharing what the Braille display shows with viewers on this computer, such as tools/spim_viewer.py, which shows it as Unicode braille. (Press NVDA+Control+Shift+V.)
 
 Braille Commands
 
@@ -67,6 +91,8 @@ The following additional commands are available in Braille:
 
 R-Chord (Dots 1-2-3-5) - Run the code. (Same as the F5 key)
 ST-Chord (Dots 3-4) - Step to the next statement of code. (Same as the F10 key)
+
+After a step (F10 or the ST-Chord), the statement that was executed is recited along with the registers it changed. After a run (F5 or the R-Chord), the place the program stopped is recited. If the registers haven't changed after a moment (half a second for a step, a second for a run), any new Status window messages, such as an assembly error, are recited instead; if the program has already exited, that is said; otherwise "Still running" is said, and the result is recited if it comes within 30 seconds. While a dialog such as Run Parameters is open, nothing is said until it is closed.
 FOR+7 Chord (Dots 1-2-3-4-5-6-7) - Randomize the display in the register cells. (Debug option only)
 app++"""
 
@@ -78,12 +104,23 @@ EF_MEMORY = 3
 EF_STATUS = 4
 EF_CONSOLE = 5
 
+# A register slot set to this shows the saved return address of the selected stack frame.
+FRAME_REGISTER = "frame"
+
+# Register banks, besides the registers chosen in the configuration dialog.
+# Banks with more registers than the display has slots are split into pages.
+REGISTER_BANKS = (
+	("args", ("a0", "a1", "a2", "a3", "v0", "v1")),
+	("temps", ("t0", "t1", "t2", "t3", "t4", "t5", "t6", "t7", "t8", "t9")),
+	("saved", ("s0", "s1", "s2", "s3", "s4", "s5", "s6", "s7")),
+)
+
 # BRAILLE TRANSLATOR CODE
 
 # In NVDA, braille is represented as 8-bit bytes. This turns out to work very well since Braille cells on a Braille display
 # are 8 dots. Therefore, each bit in an 8 bit byte specifies whether one dot is on or off.
 
-# This is a very basic Braille output translation table. It contains only the 26 lowercase letters, numbers, space and period.
+# This is a very basic Braille output translation table. It contains only the 26 lowercase letters, numbers, space, period and the signs.
 # We *could* use something like liblouis, but that's a bit overkill for our purposes.
 simpleBrailleMap = {
 	'a': 0x01, 'b': 0x03, 'c': 0x09, 'd': 0x19, 'e': 0x11,
@@ -95,7 +132,7 @@ simpleBrailleMap = {
 	'1': 0x02, '2': 0x06, '3': 0x12, '4': 0x32,
 	'5': 0x22, '6': 0x16, '7': 0x36, '8': 0x26,
 	'9': 0x14, '0': 0x34,
-	' ': 0x00, '.': 0x28 }
+	' ': 0x00, '.': 0x28, '-': 0x24, '+': 0x2c }
 
 def simpleTranslateToBrl(text):
 	"""Use the simple Braille translation map to translate a string into equivalent Braille bytes"""
@@ -126,7 +163,124 @@ def error_tone():
 	
 def toHex(num,length=8):
 	"""Convert integer to length-position hex string"""
-	return hex(num)[2:].lower()[-length:].zfill(length)
+	return ("%0*x" % (length, num))[-length:]
+
+# Bump this when the exporters' output changes, so cached exports are redone.
+EXPORT_FORMAT_VERSION = 3
+
+exportCache = None
+
+def getExportCache():
+	"""The cache of readable code files, in the temp directory."""
+	global exportCache
+	if (exportCache is None):
+		import tempfile
+		exportCache = spim_cache.ExportCache(tempfile.gettempdir())
+	return exportCache
+
+def showTextFile(fileName):
+	"""Open a text file in Notepad."""
+	import subprocess
+	subprocess.Popen(["notepad", fileName])
+
+WM_GETTEXTLENGTH = 0x000E
+
+def textLength(obj):
+	"""Length of a window's text, without fetching the text when the window can be asked directly."""
+	try:
+		import winUser
+		return winUser.sendMessage(obj.windowHandle, WM_GETTEXTLENGTH, 0, 0)
+	except:
+		return len(obj.value or "")
+
+def windowExists(obj):
+	"""Whether a window is still there, without fetching its text when the window can be asked directly."""
+	try:
+		import winUser
+		return bool(winUser.isWindow(obj.windowHandle))
+	except:
+		return obj.value is not None
+
+def sameWindow(a, b):
+	"""Whether two objects are the same window, compared by handle rather than by their text."""
+	try:
+		return a.windowHandle == b.windowHandle
+	except:
+		return False
+
+def isDialog(obj):
+	"""Whether a foreground object is a dialog box."""
+	try:
+		return obj.windowClassName == DIALOG_CLASS
+	except:
+		return False
+
+def sendKey(name):
+	"""Send a key press to the focused application."""
+	import keyboardHandler
+	keyboardHandler.KeyboardInputGesture.fromName(name).send()
+
+# How often F10 and F5 look for their result, in milliseconds: at first, and once the program is said to be still running
+STEP_POLL_INTERVAL = 10
+STEP_SLOW_POLL_INTERVAL = 250
+# Seconds after which F10 and F5 stop looking for their result
+STEP_WAIT_LIMIT = 30
+# Window class of dialog boxes, such as the Run Parameters dialog F5 can open
+DIALOG_CLASS = "#32770"
+
+class PendingStep(object):
+	"""A step or run whose result hasn't been announced yet."""
+
+	def __init__(self, edit, before, messages, step, timeout):
+		self.edit = edit # the Registers window
+		self.before = before # its text before the key was sent
+		self.messages = messages # Status window messages not yet announced
+		self.step = step
+		self.timeout = timeout
+		self.stillRunningAt = time.time() + timeout # when to say the program is still running
+		self.giveUpAt = time.time() + STEP_WAIT_LIMIT
+		self.stillRunning = False
+		self.dialog = False # whether a dialog has been open meanwhile
+
+def speakValue(value, symbols):
+	"""A register value for speech: by symbol if it points at one, in decimal if small, otherwise in hex digits."""
+	if (isinstance(value, float)): return "%g" % value
+	symbol = symbols.speak(value)
+	if (symbol is not None): return symbol
+	if (value < 0x10000): return str(value)
+	if (value > 0xffff0000): return str(value - 0x100000000) # small negative number
+	return " ".join(toHex(value).lstrip("0").upper())
+
+def formatFloat(value, width=8):
+	"""A floating point register value in at most width characters."""
+	for precision in range(width - 1, 0, -1):
+		text = "%.*g" % (precision, value)
+		if (len(text) <= width): return text
+	return text[:width]
+
+def brailleValue(value):
+	"""A register value for the display driver: integers as they are, floating point values as text."""
+	if (isinstance(value, float)): return simpleTranslateToBrl(formatFloat(value).rjust(8))
+	return value
+
+def queueCall(func, *args):
+	"""Run func on NVDA's main thread. Used for the results of background jobs."""
+	queueHandler.queueFunction(queueHandler.eventQueue, func, *args)
+
+def progressTone(fraction):
+	"""Tone for a background job's progress, rising as it nears completion."""
+	tones.beep(440 + int(440 * fraction), 20)
+
+# Whether each Braille driver class supports SPIM Braille, so the check is only done once per driver.
+driverSupport = {}
+
+def spimSupport(display):
+	"""Return None if the driver is not a SPIM Braille driver, otherwise its hasSPIM flag."""
+	cls = type(display)
+	if (cls not in driverSupport):
+		driverSupport[cls] = hasattr(display, "hasSPIM")
+	if (not driverSupport[cls]): return None
+	return display.hasSPIM
 
 def getTempPath():
 	"""Get a string containing the path to the user's temp directory."""
@@ -143,6 +297,28 @@ class AppModule(appModuleHandler.AppModule):
 	# This holds the handle to the research study log file.
 	researchFileHandle = None
 
+	# This holds the session recorder while a session is being recorded.
+	sessionRecorder = None
+
+	# Source line index for the program in the Code window. Rebuilt when the Code window changes.
+	sourceIndex = None
+	sourceSignature = None
+	# Symbol table built from the source index, and the index it was built from.
+	symbols = None
+	symbolsSource = None
+
+	# Register banks for the display's slot count, as last worked out by registerBanks
+	banks = None
+	# The registers as last put on the display, so routing keys can speak them without reading the window again
+	registerFile = None
+	# The slot last chosen with a routing key, which N changes the rendering of
+	routedSlot = 0
+
+	# Whether changed memory words are announced after each step or run
+	announceMemory = False
+	# The memory words changed as of the last reading of the Memory window that found changes, or None before the first reading
+	lastMemoryChanges = None
+
 	viewMode = 0 # default to freeze mode
 	updateThreadDieFlag = 0 # this gets set when the update thread should stop
 	updateThread = None # this will hold the actual update thread object
@@ -156,17 +332,42 @@ class AppModule(appModuleHandler.AppModule):
 		# Provide local access to the braille display instance
 		self.brl = braille.handler.display
 
+		# Edit fields found so far, by EF_* identifier
+		self.editFieldCache = {}
+
+		# Simulated memory, as last read from the Memory window. Live mode reads it on its own thread.
+		self.memoryModel = spim_memory.MemoryModel()
+		self.memoryLock = threading.Lock()
+		# Whether the memory model has been read since the last step or run
+		self.memoryCurrent = False
+		# The call stack, worked out from memory; created by getStackView()
+		self.stackView = None
+		# Exceptions and errors from the Status window, read as they are added
+		self.statusReader = spim_status.StatusReader()
+
+		# The step or run whose result F10 or F5 is waiting for, or None
+		self.pendingStep = None
+
+		# Registers pinned as watches with the routing keys, in the order they were pinned
+		self.watches = []
+		# Watch expressions compiled so far: slot text -> Watch, or None for anything that isn't an expression
+		self.compiledWatches = {}
+
+		# Worker threads for slow scripts. They are only started when first needed.
+		self.jobs = spim_jobs.JobPool(workers=2, callAfter=queueCall)
+
 		log.info("PCSpim: Loaded the PC Spim access driver.")
 
 		# Call superclass init handler
 		appModuleHandler.AppModule.__init__(self, processID, appName)
 
 		# Check braille driver
-		if ("hasSPIM" not in dir( self.brl )):
+		support = spimSupport(self.brl)
+		if (support is None):
 			self.clearGestureBindings() # destroy all gestures
 			log.warn("PCSpim ERROR: Not using a supported Braille driver!")
 			ui.message("PC Spim access support cannot be enabled because a SPIM Braille compliant driver is not being used. Please switch to a SPIM Braille driver and restart PC Spim.")
-		elif (braille.handler.display.hasSPIM == False):
+		elif (support == False):
 			# If an error occurred with SpimBraille, DO NOT proceed with loading the module.
 			# Instead unload everything - PCSpim will work as if it has no app module since all the bindings are being cleared.
 			error_tone()
@@ -177,44 +378,27 @@ class AppModule(appModuleHandler.AppModule):
 			log.info("PCSpim: Using supported Braille output device %s with %d registers." % ( self.brl.name, self.brl.getRegisterCount() ) )
 
 		# DEBUG: display a list of all registered gestures to the debug log
-		gMap = "%d gesture mappings, as follows:\n"%len(self._gestureMap)
-		for g in sorted(self._gestureMap.keys()):
-			gMap += "%s: function %s\n" % (g, self._gestureMap[g].__name__)
-		log.debug(gMap)
+		if (log.isEnabledFor(logging.DEBUG)):
+			gMap = ["%d gesture mappings, as follows:" % len(self._gestureMap)]
+			for g in sorted(self._gestureMap.keys()):
+				gMap.append("%s: function %s" % (g, self._gestureMap[g].__name__))
+			log.debug("\n".join(gMap))
 		
 	# Notify on module unload (mostly for debug purpose at this point)
 	def __del__(self):
 		self.updateThreadDieFlag = 1 # close the thread if it's cycling
+		self.jobs.terminate() # cancel any background tasks
 		log.info("Closing PC Spim access driver.")
 
 	# Parsers
-	def parseGPRegisters(self, text):
-		"""Parse general purpose registers from SPIM raw window content"""
-		gpRegisters = dict ( re.findall(r"R[0-9]{1,2} {1,2}\(([a-z0-9]{2})\) = ([0-9a-f]{8})", text) )
-		gpRegisters.update((x, int(y,16)) for x, y in gpRegisters.items())
-		return gpRegisters
+	def parseRegisters(self, text):
+		"""Parse every register (general, special and floating point) from SPIM raw window content"""
+		return spim_registers.RegisterFile(text)
 
 	def parseCodeLine(self, text):
 		"""Parse a line of code from PCSpim's Code window and organize into logical components"""
-		codeRegex = re.compile(r"^\[0x([0-9a-f]{8})\]\t0x([0-9a-f]{8})  (.+)$")
-		# attempt to match the code
-		m = codeRegex.match(text)
-		# If no match found, return None.
-		if (m is None): return None
-		result = {}
-		result['encoded_instruction'] = int(m.group(2),16)
-		result['address'] = int(m.group(1),16)
-		# Do we have a comment?
-		instr = m.group(3)
-		if (";" in instr):
-			pos = instr.index(";")
-			comment = instr[pos+1:].strip()
-			instr = instr[:pos].strip()
-		else:
-			instr = instr.strip()
-			comment = ""
-		result['comment'], result['instruction'] = comment, instr
-		return result
+		import spim_export
+		return spim_export.parseCodeLine(text)
 
 	# UI control functions
 	def getSpimThreadID(self):
@@ -239,7 +423,20 @@ class AppModule(appModuleHandler.AppModule):
 		# This technically isn't even supposed to happen, but, it does. So we have to work with it.
 		
 		# When all else fails, look for patterns and use regex. That's what we're doing here.
-		
+		# The four panes last as long as PCSpim does, so once found they are remembered.
+		ef = self.editFieldCache.get(whichField)
+		if (ef is not None):
+			try:
+				if (windowExists(ef)): return ef
+			except:
+				pass
+			del self.editFieldCache[whichField]
+		ef = self._findEditField(whichField)
+		if (ef is not None and whichField != EF_CONSOLE):
+			self.editFieldCache[whichField] = ef
+		return ef
+
+	def _findEditField(self, whichField):
 		if (whichField == EF_REGISTERS):
 
 			# The registers field is populated with the contents of the simulation's registers.
@@ -318,6 +515,54 @@ class AppModule(appModuleHandler.AppModule):
 		else:
 			return None # placeholder
 
+	def readPanes(self):
+		"""Read the text of all five PCSpim panes, keyed by EF_* identifier. Panes that can't be found are left out."""
+		panes = {}
+		for which in (EF_CODE, EF_REGISTERS, EF_MEMORY, EF_STATUS, EF_CONSOLE):
+			ef = self.findEditField(which)
+			if (ef is not None and ef.value is not None):
+				panes[which] = ef.value
+		return panes
+
+	def getSourceIndex(self):
+		"""Return the source line index for the loaded program, building it if the program changed. None if there is no Code window."""
+		e = self.findEditField(EF_CODE)
+		if (e is None): return None
+		status = self.findEditField(EF_STATUS)
+		# Loading a program adds to the Status window and changes the length of the Code window,
+		# so while neither length changes neither window's text needs to be fetched.
+		signature = (textLength(e), textLength(status) if (status is not None) else 0)
+		if (self.sourceIndex is not None and self.sourceSignature == signature):
+			return self.sourceIndex
+		statusText = (status.value or "") if (status is not None) else ""
+		code = e.value
+		if (code is None): return None
+		if (self.sourceIndex is not None and self.sourceIndex.codeText == code):
+			self.sourceSignature = signature
+			return self.sourceIndex
+		sources = {}
+		programFile = None
+		for fileName in spim_status.loadedFiles(statusText):
+			try:
+				sources[fileName] = open(fileName).read()
+			except IOError:
+				log.info("PCSpim: can't read source file %s" % fileName)
+				continue
+			if (os.path.basename(fileName).lower() != "exceptions.s"):
+				programFile = fileName
+		self.sourceIndex = spim_source.SourceIndex(code, sources, programFile)
+		self.sourceSignature = signature
+		return self.sourceIndex
+
+	def getSymbols(self):
+		"""Return the symbol table for the loaded program. It is empty if there is no Code window."""
+		index = self.getSourceIndex()
+		if (index is None): return spim_symbols.SymbolTable()
+		if (self.symbolsSource is not index):
+			self.symbols = spim_symbols.build(index)
+			self.symbolsSource = index
+		return self.symbols
+
 	def getEditFields(self):
 		"""Navigate system API to locate the PCSpim window and access its four edit regions"""
 
@@ -354,33 +599,98 @@ class AppModule(appModuleHandler.AppModule):
 		"""Parse the Registers window and get a list of all registers available for display"""
 
 		ef = self.findEditField(EF_REGISTERS).value
-		if (ef is None):  return {}
-		regs = self.parseGPRegisters(ef)
+		if (ef is None):  return spim_registers.RegisterFile()
+		regs = self.parseRegisters(ef)
 		if (len(regs) == 0):
 			error_tone()
 			log.warn("PCSpim Interface ERROR: Found edit fields, but could not find registers.")
-			return {}
 		return regs
 
 	def updateRegisters(self):
 		"""Actually perform an update of the registers to the Braille device"""
 		# This is the payload function - it is what actually handles displaying registers on the Braille display.
 		# Each time it is called, registers will be parsed and sent to the display driver for display.
+		# Every bank is encoded at once, so switching banks needs no update of its own.
 		
 		if (self.revealMode == True): return # do not execute if reveal mode is on.
-		regs = self.getAvailableRegisters()
-		outRegs = [None]*self.brl.getRegisterCount()
-		for r in range(len(outRegs)):
+		regs = self.registerFile = self.getAvailableRegisters()
+		banks = self.registerBanks()
+		start = time.time()
+		# Watch expressions are only chosen in the configuration dialog, so only the first bank has them.
+		watches = [watch for watch in map(self.watch, banks[0][1]) if watch is not None] if (banks) else []
+		if (watches): self.getSymbols() # once per update, rather than once per expression
+		if (any(watch.usesMemory for watch in watches)): self.updateMemory()
+		self.brl.setSlotModes([self.chosenRendering(r) for r in range(self.brl.getRegisterCount())])
+		self.brl.setBanks([[self.registerValue(regs, whichReg) for whichReg in bank] for name, bank in banks], [name for name, bank in banks])
+		if (watches and spim_trace.enabled): spim_trace.record(spim_trace.EV_WATCH_UPDATE, int((time.time() - start) * 1000000), [len(watches)])
+
+	def registerValue(self, regs, whichReg):
+		"""The value to show for a register slot, or None."""
+		if (whichReg is None): return None # this is OK, it just means we have no value at this register.
+		try:
+			if (whichReg == FRAME_REGISTER):
+				frame = self.updateStack()
+				return frame.returnAddress if (frame is not None) else None
+			if (whichReg in regs): return brailleValue(regs[whichReg])
+			watch = self.watch(whichReg)
+			return self.evaluate(watch, regs) if (watch is not None) else None
+		except KeyError:
+			return None
+		except:
+			log.warn("Exception updating register.",exc_info=True)
+			return None
+
+	def watch(self, text):
+		"""The compiled watch expression for a slot's text, or None if the text is a register, empty, or not a valid expression."""
+		try:
+			return self.compiledWatches[text]
+		except KeyError:
+			pass
+		watch = None
+		if (text is not None and text != FRAME_REGISTER and text not in spim_registers.INTEGER_SLOTS and text not in spim_registers.FLOAT_SLOTS):
+			import spim_watch
 			try:
-				whichReg = config.conf['pcspim']['r%d' % r]
-				outRegs[r] = regs[whichReg]
-			except KeyError:
-				pass # this is OK, it just means we have no value at this register.
-				outRegs[r] = None
-			except:
-				log.warn("Exception updating register.",exc_info=True)
-				outRegs[r] = None
-		self.brl.setAllRegisters(outRegs)
+				watch = spim_watch.compileExpression(text)
+			except spim_watch.WatchError, e:
+				log.warn("PCSpim: watch expression %r isn't valid: %s" % (text, e))
+		self.compiledWatches[text] = watch
+		return watch
+
+	def evaluate(self, watch, regs):
+		"""The value of a watch expression, or None if it names a label the program doesn't have.
+
+		Labels are looked up in the symbol table as getSymbols last brought it up to date."""
+		symbols = self.symbols if (self.symbols is not None) else self.getSymbols()
+		with self.memoryLock:
+			return watch.value(regs, self.memoryModel, symbols)
+
+	def registerBanks(self):
+		"""The register banks, as (name, registers) with one register (or None) per slot. The first bank is the one chosen in the configuration dialog."""
+		count = self.brl.getRegisterCount()
+		if (count == 0): return []
+		chosen = [self.chosenRegister(r) for r in range(count)]
+		if (self.banks is None or self.banks[0][1] != chosen):
+			banks = [("chosen", chosen)]
+			for name, regs in REGISTER_BANKS:
+				pages = [list(regs[i:i + count]) for i in range(0, len(regs), count)]
+				for n, page in enumerate(pages):
+					banks.append((name if (len(pages) == 1) else "%s %d" % (name, n + 1), page + [None] * (count - len(page))))
+			self.banks = banks
+		return self.banks
+
+	def chosenRegister(self, r):
+		"""The register chosen for slot r in the configuration dialog, or None."""
+		try:
+			return config.conf['pcspim']['r%d' % r]
+		except KeyError:
+			return None
+
+	def chosenRendering(self, r):
+		"""How slot r shows numbers, as chosen in the configuration dialog or with N."""
+		try:
+			return config.conf['pcspim']['m%d' % r]
+		except KeyError:
+			return "hex"
 
 	def _updateThread(self):
 		# This function will be started on another thread to update the display on a regular basis.
@@ -392,7 +702,10 @@ class AppModule(appModuleHandler.AppModule):
 				return # stop updating
 			time.sleep(1) # delay is 1 second between live register updates
 			#ui.message("x")
+			if (self.sessionRecorder is not None): self.sessionRecorder.tick()
 			self.updateRegisters()
+			messages = self.readStatus()
+			if (messages): queueCall(ui.message, self.describeStatus(messages))
 
 	def updateMode(self):
 		# This handles changes the display mode
@@ -424,13 +737,19 @@ class AppModule(appModuleHandler.AppModule):
 		else:
 			ui.message("Reveal mode")
 			self.revealMode = True
-			for r in range(self.brl.getRegisterCount()):
-				try:
-					whichReg = config.conf['pcspim']['r%d' % r]
-				except KeyError:
-					# No register is assigned to this field - simply display it as "none"
-					whichReg = "none"
-				self.brl.setRegister(r,simpleTranslateToBrl(whichReg.strip().center(8,' ')))
+			# Show the names in every bank; no register assigned to a slot is shown as "none".
+			banks = self.registerBanks()
+			self.brl.setBanks([[simpleTranslateToBrl((whichReg or "none").strip().center(8,' ')) for whichReg in bank] for name, bank in banks], [name for name, bank in banks])
+			# Say which of the revealed registers point at a label.
+			regs = self.registerFile = self.getAvailableRegisters()
+			symbols = self.getSymbols()
+			pointers = []
+			for whichReg in (banks[self.brl.currentBank][1] if (banks) else []):
+				symbol = symbols.speak(regs[whichReg]) if (whichReg in regs and not regs.isFloat(whichReg)) else None
+				if (symbol is not None):
+					pointers.append("%s points to %s" % (whichReg, symbol))
+			if (pointers):
+				ui.message(". ".join(pointers))
 
 
 	## RESEARCH ##
@@ -461,6 +780,81 @@ class AppModule(appModuleHandler.AppModule):
 			self.researchFileHandle.close()
 			self.researchFlag=False
 
+	## SESSION RECORDING ##
+	def getScript(self, gesture):
+		script = super(AppModule, self).getScript(gesture)
+		if (script is None or self.sessionRecorder is None):
+			return script
+		import spim_session
+		if (script.__name__[7:] in spim_session.UNRECORDED_SCRIPTS):
+			return script
+		return self._recordingScript(script)
+
+	def _recordingScript(self, script):
+		"""Wrap a script so running it records the gesture and the panes it sees."""
+		# Wrappers are kept per script so NVDA's repeat detection still sees the same function each time.
+		name = script.__name__
+		try:
+			return self._recordingWrappers[name]
+		except AttributeError:
+			self._recordingWrappers = {}
+		except KeyError:
+			pass
+		def recorded(self, gesture):
+			if (self.sessionRecorder is not None):
+				self.sessionRecorder.gesture(name[7:], gesture, *self._focusedPane())
+			return script(gesture)
+		recorded.__name__ = name
+		recorded.__doc__ = script.__doc__
+		wrapper = self._recordingWrappers[name] = types.MethodType(recorded, self, self.__class__)
+		return wrapper
+
+	def _focusedPane(self):
+		"""Returns (EF_* identifier, caret offset) for the focused pane, or (None, None)."""
+		try:
+			focus = api.getFocusObject()
+			for which in (EF_CODE, EF_REGISTERS, EF_MEMORY, EF_STATUS, EF_CONSOLE):
+				if (sameWindow(focus, self.findEditField(which))):
+					return which, focus.makeTextInfo(textInfos.POSITION_CARET).bookmark.startOffset
+		except:
+			pass
+		return None, None
+
+	def script_togglePublishing(self, gesture):
+		"""Start or stop sharing the display's frames with viewers in other processes."""
+		self.research_log("togglePublishing",str(gesture._get_displayName()), "")
+		if (self.brl.publisher is None):
+			try:
+				path = self.brl.startPublishing()
+			except EnvironmentError:
+				log.warn("PCSpim: can't publish frames.", exc_info=True)
+				ui.message("Can't share the Braille display.")
+				return
+			ui.message("Sharing the Braille display in %s" % path)
+		else:
+			self.brl.stopPublishing()
+			ui.message("Stopped sharing the Braille display.")
+
+	def script_toggleSessionRecording(self, gesture):
+		if (self.sessionRecorder is None):
+			sessionFilename = os.path.join(os.path.expanduser("~"),"AppData","Roaming","nvda","research","session-" + str(int(time.time()))+".jsonl")
+			info = {'registers': self.brl.getRegisterCount(), 'driver': self.brl.name}
+			try:
+				info['config'] = dict(config.conf['pcspim'])
+			except KeyError:
+				pass
+			import spim_session
+			self.sessionRecorder = spim_session.SessionRecorder(sessionFilename, self.readPanes, info)
+			self.brl.addFrameListener(self.sessionRecorder.frame)
+			tones.beep(660,120)
+			ui.message("Session recording started.")
+		else:
+			recorder, self.sessionRecorder = self.sessionRecorder, None
+			self.brl.removeFrameListener(recorder.frame)
+			recorder.close()
+			tones.beep(440,120)
+			ui.message("Session recording stopped.")
+
 	## SCRIPTS ##
 	# This is the code that directly executes when a user presses various keystrokes.
 	# These scripts call into the other code provided.
@@ -470,9 +864,10 @@ class AppModule(appModuleHandler.AppModule):
 		self.research_log("configure",str(gesture._get_displayName()))
 
 		error_tone()
+		import spim_settings
 		try:
-			ssd = SpimSettingsDialog(gui.mainFrame, self.getAvailableRegisters().keys(), self.brl.getRegisterCount())
-		except gui.settingsDialogs.SettingsDialog.MultiInstanceError:
+			ssd = spim_settings.SpimSettingsDialog(gui.mainFrame, self.getAvailableRegisters().keys() + [FRAME_REGISTER], self.brl.getRegisterCount(), self.brl.renderings)
+		except spim_settings.settingsDialogs.SettingsDialog.MultiInstanceError:
 			ui.message("Config dialog already open.")
 			return
 		# Do everything possible to bring the settings dialog to the front.
@@ -480,6 +875,124 @@ class AppModule(appModuleHandler.AppModule):
 		ssd.SetFocus()
 		ssd.Raise()
 
+	def script_nextBank(self, gesture):
+		self.research_log("nextBank",str(gesture._get_displayName()))
+		self.switchBank(1)
+
+	def script_previousBank(self, gesture):
+		self.research_log("previousBank",str(gesture._get_displayName()))
+		self.switchBank(-1)
+
+	def switchBank(self, delta):
+		"""Show another register bank. The banks are already on the driver, so this is only a swap."""
+		if (len(self.brl.bankCells) == 0):
+			if (self.revealMode): self.updateMode()
+			else: self.updateRegisters()
+		name = self.brl.selectBank(self.brl.currentBank + delta)
+		if (name is None):
+			ui.message("No register banks")
+			return
+		bank = self.registerBanks()[self.brl.currentBank][1]
+		ui.message("%s: %s" % (name, ", ".join(whichReg for whichReg in bank if whichReg is not None) or "empty"))
+
+	def script_routeRegister(self, gesture):
+		"""Over a register block, speak the register shown there; press twice to pin or unpin it as a watch. Elsewhere, route to the cell as usual."""
+		slot = self.brl.registerAt(getattr(gesture, "routingIndex", -1))
+		if (slot is None):
+			import globalCommands
+			globalCommands.commands.script_braille_routeTo(gesture)
+			return
+		whichReg = self.registerBanks()[self.brl.currentBank][1][slot]
+		self.research_log("routeRegister",str(gesture._get_displayName()), whichReg or "")
+		self.routedSlot = slot
+		if (whichReg is None):
+			ui.message("No register here")
+			return
+		import scriptHandler
+		if (scriptHandler.getLastScriptRepeatCount() > 0):
+			self.toggleWatch(whichReg)
+		else:
+			ui.message(self.describeRegister(whichReg))
+
+	def describeRegister(self, whichReg):
+		"""Speech for one register: its name, its value in hex digits and signed decimal, and the symbol it points at."""
+		symbols = self.getSymbols()
+		if (whichReg == FRAME_REGISTER):
+			frame = self.getStackView().current() or self.updateStack()
+			if (frame is None or frame.returnAddress is None): return "frame: no return address"
+			return "frame: returns to %s" % speakValue(frame.returnAddress, symbols)
+		regs = self.registerFile
+		watch = self.watch(whichReg)
+		if (regs is None or (watch is None and whichReg not in regs)):
+			regs = self.registerFile = self.getAvailableRegisters()
+		if (watch is not None):
+			value = self.evaluate(watch, regs)
+			if (value is None): return "%s: unknown label" % whichReg
+		elif (whichReg not in regs):
+			return "%s: not found" % whichReg
+		else:
+			value = regs[whichReg]
+			if (regs.isFloat(whichReg)): return "%s: %s" % (whichReg, speakValue(value, symbols))
+		signed = value - 0x100000000 if (value & 0x80000000) else value
+		out = "%s: %s. %d." % (whichReg, " ".join(toHex(value).upper()), signed)
+		symbol = symbols.speak(value)
+		if (symbol is not None): out += " Points to %s." % symbol
+		return out
+
+	def script_nextRendering(self, gesture):
+		"""Show the numbers in the slot last chosen with a routing key in the next rendering: hex, decimal, binary, ASCII or float."""
+		self.research_log("nextRendering",str(gesture._get_displayName()), "")
+		self.switchRendering(1)
+
+	def script_previousRendering(self, gesture):
+		self.research_log("previousRendering",str(gesture._get_displayName()), "")
+		self.switchRendering(-1)
+
+	def switchRendering(self, delta):
+		count = self.brl.getRegisterCount()
+		if (count == 0): return
+		slot = min(self.routedSlot, count - 1)
+		names = [name for name, label in self.brl.renderings]
+		current = self.chosenRendering(slot)
+		mode = names[(names.index(current) + delta) % len(names) if (current in names) else 0]
+		if ("pcspim" not in config.conf.keys()):
+			config.conf["pcspim"] = {}
+		config.conf['pcspim']['m%d' % slot] = mode
+		# Only the slot's cells are encoded again; the registers aren't read.
+		self.brl.setSlotModes([self.chosenRendering(r) for r in range(count)])
+		ui.message("Slot %d: %s" % (slot + 1, dict(self.brl.renderings)[mode]))
+
+	def toggleWatch(self, whichReg):
+		if (whichReg in self.watches):
+			self.watches.remove(whichReg)
+			ui.message("%s unpinned" % whichReg)
+		else:
+			self.watches.append(whichReg)
+			ui.message("%s pinned as a watch" % whichReg)
+
+	def describeWatches(self, regs, readMemory=True):
+		"""Speech for the pinned watches, from a reading of the registers. Pass readMemory=False if the memory model is already current."""
+		symbols = self.getSymbols()
+		out = ""
+		for whichReg in self.watches:
+			if (whichReg == FRAME_REGISTER):
+				frame = self.updateStack(readMemory)
+				value = frame.returnAddress if (frame is not None) else None
+			elif (self.watch(whichReg) is not None):
+				value = self.evaluate(self.watch(whichReg), regs)
+			else:
+				value = regs.get(whichReg)
+			out += "%s is %s. " % (whichReg, "unknown" if (value is None) else speakValue(value, symbols))
+		return out
+
+	def script_watches(self, gesture):
+		"""Speak the registers pinned as watches."""
+		self.research_log("watches",str(gesture._get_displayName()), "")
+		if (not self.watches):
+			ui.message("No watches. Press a routing key over a register twice to pin it.")
+			return
+		ui.message(self.describeWatches(self.getAvailableRegisters()))
+
 	def script_setFreeze(self, gesture):
 
 		self.research_log("setFreeze",str(gesture._get_displayName()))
@@ -516,114 +1029,136 @@ class AppModule(appModuleHandler.AppModule):
 	def script_makeCodeReadable(self, gesture):
 
 		self.research_log("makeCodeReadable",str(gesture._get_displayName()))
+		self.exportCode("makeCodeReadable", self.formatReadableCode)
+
+	def script_makeCodeReadable2(self, gesture):
+
+		self.research_log("makeCodeReadable2",str(gesture._get_displayName()))
+		self.exportCode("makeCodeReadable2", self.formatReadableCodeVerbose)
 
+	def exportCode(self, key, formatter):
+		"""Read the Code window, then format and save it on a worker thread and open the result."""
 		tones.beep(440,50)
 
 		# test code: get the code box
 		e = self.findEditField(EF_CODE) # We have the edit field object.
 
 		if (e == None): return # can't do anything
-		
+
 		data = e.value
-		out = "PCSpim Instruction Output\r\n\r\n"
-		for l in data.split("\n"):
-			# try to parse the code
-			info = self.parseCodeLine(l.strip())
-			if (info is None):
-				out += l.strip("\r\n") + "\r\n"
-			else:
-				out += "%s %s (instruction %s at %s)\r\n" % (
-					info['instruction'],
-					"; " + info['comment'] if info['comment'] != "" else "",
-					"0x" + hex(info['encoded_instruction'])[2:].zfill(8).lower(),
-					"0x" + hex(info['address'])[2:].zfill(8).lower()
-					)
-
-		tempFileName = os.path.join(tempfile.gettempdir(), "PCSpim-code-%d.txt" % int(time.time()))
-		open(tempFileName,"w").write(out)
-		
-		subprocess.Popen(["notepad", tempFileName])
-		#os.system('notepad "%s"' % tempFileName)
+		symbols = self.getSymbols()
+		self.startJob(key, lambda job: self.exportFile(key, formatter, data, symbols, job), self.exportDone)
+
+	def exportFile(self, key, formatter, data, symbols, job):
+		"""Return the export file for the Code window text, reusing the cached one if the code hasn't changed."""
+		cache = getExportCache()
+		variant = "%s%d" % (key, EXPORT_FORMAT_VERSION)
+		fileName = cache.get(variant, data)
+		if (fileName is None):
+			fileName = cache.put(variant, data, formatter(data, symbols, job))
+		return fileName
+
+	def exportDone(self, fileName):
+		showTextFile(fileName)
 		tones.beep(880,50)
 
-	def script_makeCodeReadable2(self, gesture):
+	def formatReadableCode(self, data, symbols, job):
+		import spim_export
+		return spim_export.formatCode(data, symbols, False, job)
 
-		self.research_log("makeCodeReadable2",str(gesture._get_displayName()))
+	def formatReadableCodeVerbose(self, data, symbols, job):
+		import spim_export
+		return spim_export.formatCode(data, symbols, True, job)
 
-		tones.beep(440,50)
+	def startJob(self, key, func, onDone):
+		"""Run func(job) in the background, then onDone(result) on the main thread."""
+		job = self.jobs.submit(key, func, onDone, self.jobFailed, progressTone)
+		if (job is None):
+			ui.message("Too many tasks are running. Please try again in a moment.")
+		elif (job.requests > 1):
+			ui.message("Still working on that.")
 
-		# test code: get the code box
-		e = self.findEditField(EF_CODE) # We have the edit field object.
+	def jobFailed(self, excInfo):
+		error_tone()
+		log.warn("PCSpim: background task failed.", exc_info=excInfo)
+		ui.message("The task failed. See the NVDA log for details.")
 
-		if (e == None): return # can't do anything
-		
-		data = e.value
-		out = "PCSpim Instruction Output (Extended)\r\n\r\n"
-		for l in data.split("\n"):
-			# try to parse the code
-			info = self.parseCodeLine(l.strip())
-			if (info is None):
-				out += l.strip("\r\n") + "\r\n"
-			else:
-				out += "Actual Assembly instruction : %s\r\n" % info['instruction']
-				out += "Your Instruction (comment)  : %s\r\n" % info['comment'] if info['comment'] else "<none>"
-				out += "Encoded Instruction (hex)   : %s\r\n" % hex(info['encoded_instruction'])[2:].zfill(8).lower()
-				out += "Memory Address (hex)        : %s\r\n\r\n" % hex(info['address'])[2:].zfill(8).lower()
+	def script_getCodeInfo(self, gesture):
+		self.reportCodeLine(gesture, "getCodeInfo")
 
-		tempFileName = os.path.join(tempfile.gettempdir(), "PCSpim-code-%d.txt" % int(time.time()))
-		open(tempFileName,"w").write(out)
-		
-		subprocess.Popen(["notepad", tempFileName])
-		#os.system('notepad "%s"' % tempFileName)
-		tones.beep(880,50)
+	def script_getCodeFields(self, gesture):
+		self.reportCodeLine(gesture, "getCodeFields", fieldsView=True)
 
-	def script_getCodeInfo(self, gesture):
+	def reportCodeLine(self, gesture, action, fieldsView=False):
+		"""Speak the line of code at the Code window caret. The fields view speaks the decoded instruction fields instead of the encoded word."""
 
 		# test code: get the code box
 		# test code - are we in the edit box?
 
 		e = self.findEditField(EF_CODE) # We have the edit field object.
 
-		try:
-			if (api.getFocusObject().value != e.value):
-				log.warn("Code info requested but caret is not in code edit box.")
-				ui.message("Warning, focus is not on code edit box. Try n v d a plus shift plus 1.")
-				self.research_log("getCodeInfo","","Request made without being in the code edit field.")
-		except:
-			log.warn("Code info requested but focus object has no caret.")
+		# The focus is compared with the Code window by handle, so neither's text is fetched.
+		if (not sameWindow(api.getFocusObject(), e)):
+			log.warn("Code info requested but caret is not in code edit box.")
 			ui.message("Warning, focus is not on code edit box. Try n v d a plus shift plus 1.")
-			self.research_log("getCodeInfo","","Request made without being in the code edit field.")
+			self.research_log(action,"","Request made without being in the code edit field.")
 		
-		# Log cursor position for debug purposes
-		pos = e.makeTextInfo(textInfos.POSITION_CARET).bookmark.startOffset
+		# Read only the line at the caret.
+		caret = e.makeTextInfo(textInfos.POSITION_CARET)
+		pos = caret.bookmark.startOffset
 		log.info("Code caret is at position %d" % pos)
+		try:
+			caret.expand(textInfos.UNIT_LINE)
+			line = caret.text.strip()
+		except:
+			line = None
 
-		# Retrieve the current line of text
-		line = e.makeTextInfo(textInfos.POSITION_CARET)
-		line.expand(textInfos.UNIT_LINE)
-		line = line.text.strip()
-
-		self.research_log("getCodeInfo",str(gesture._get_displayName()), "Line parsed: '"+line+"'")
-
-		info = self.parseCodeLine(line)
+		if (line is not None):
+			self.research_log(action,str(gesture._get_displayName()), "Line parsed: '"+line+"'")
+			info = self.parseCodeLine(line)
+		else:
+			# The control can't give a line by itself; the source index knows where each instruction's line is.
+			info = self.codeLineAt(pos)
+			self.research_log(action,str(gesture._get_displayName()), "Line found in the index: %r" % info)
 
 		if (info is None):
 			ui.message("Not on a code line.")
-			self.research_log("getCodeInfo","", "Not on a code line.")
+			self.research_log(action,"", "Not on a code line.")
 			return
 
 		# Speak the instruction first.
 		out = "Instruction: %s. " % info['instruction']
-		# Comment, speak it.
-		if (info['comment'] != ""):
+		# Then the source statement it came from, or failing that the comment.
+		source = self.getSourceIndex().lookup(info['address'])
+		if (source is not None):
+			out += "Source line %d: %s. " % (source.number, source.statement)
+			if (source.labels): out += "Label %s. " % ", ".join(source.labels)
+			if (source.comment): out += "Comment: %s. " % source.comment
+		elif (info['comment'] != ""):
 			out += "Comment: %s. " % info['comment']
-		# Instruction encoded
-		out += "Encoded instruction: %s. " % " ".join(hex(info['encoded_instruction'])[2:].zfill(8).upper())
-		# Memory location
-		out += "Memory address: %s. " % " ".join(hex(info['address'])[2:].zfill(8).upper())
+		if (fieldsView):
+			# Decoded instruction fields
+			out += "Fields: %s. " % spim_mips.describeFields(spim_mips.decodeInstruction(info['encoded_instruction'], info['address']))
+		else:
+			# Instruction encoded
+			out += "Encoded instruction: %s. " % " ".join(hex(info['encoded_instruction'])[2:].zfill(8).upper())
+		# Memory location, by name when it has one
+		symbol = self.getSymbols().speak(info['address'])
+		if (symbol is not None):
+			out += "Memory address: %s, %s. " % (symbol, " ".join(hex(info['address'])[2:].zfill(8).upper()))
+		else:
+			out += "Memory address: %s. " % " ".join(hex(info['address'])[2:].zfill(8).upper())
 
 		ui.message(out)
 
+	def codeLineAt(self, offset):
+		"""The code line containing a Code window offset, as parseCodeLine gives it, from the source index. None if it isn't an instruction's line."""
+		index = self.getSourceIndex()
+		address = index.addressAt(offset) if (index is not None) else None
+		if (address is None): return None
+		word, instruction = index.instruction(address)
+		return {'address': address, 'encoded_instruction': word, 'instruction': instruction, 'comment': index.comment(address)}
+
 	def script_setFocusTo(self, gesture):
 		try:
 			gKey = int(gesture.mainKeyName)
@@ -651,6 +1186,322 @@ class AppModule(appModuleHandler.AppModule):
 				log.warn("Couldn't set focus!",exc_info=True)
 				self.research_log("setFocusTo",str(gesture._get_displayName()), "Failed to set focus!")
 
+	def script_jumpToSource(self, gesture):
+		"""Ask for a source line number, then move the Code window caret to the first instruction made from that line."""
+		self.research_log("jumpToSource",str(gesture._get_displayName()), "")
+		import wx
+		dialog = wx.TextEntryDialog(gui.mainFrame, "Source line number:", "Jump to Source Line")
+		def callback(result):
+			if (result == wx.ID_OK):
+				wx.CallLater(100, self.jumpToSourceLine, dialog.GetValue())
+		gui.runScriptModalDialog(dialog, callback)
+
+	def jumpToSourceLine(self, number):
+		try:
+			number = int(str(number).strip())
+		except ValueError:
+			ui.message("That is not a line number.")
+			return
+		index = self.getSourceIndex()
+		addresses = index.addresses(number) if (index is not None) else []
+		if (not addresses):
+			ui.message("No code for source line %d." % number)
+			self.research_log("jumpToSource","","No code for source line %d." % number)
+			return
+		e = self.findEditField(EF_CODE)
+		e.setFocus()
+		api.setFocusObject(e)
+		api.setNavigatorObject(e)
+		offset = index.offset(addresses[0])
+		caret = e.makeTextInfo(textInfos.offsets.Offsets(offset, offset))
+		caret.updateCaret()
+		source = index.lookup(addresses[0])
+		ui.message("Line %d: %s. %d instructions." % (number, source.statement, len(addresses)) if (len(addresses) > 1) else "Line %d: %s." % (number, source.statement))
+
+	def script_stepAnnounce(self, gesture):
+		"""Step PCSpim (F10), then say what was executed and which registers it changed."""
+		self.research_log("stepAnnounce",str(gesture._get_displayName()), "")
+		self.runAndAnnounce("f10", 0.5, True)
+
+	def script_runAnnounce(self, gesture):
+		"""Run the program (F5), then say where it stopped."""
+		self.research_log("runAnnounce",str(gesture._get_displayName()), "")
+		self.runAndAnnounce("f5", 1.0, False)
+
+	def runAndAnnounce(self, key, timeout, step):
+		"""Send a key to PCSpim, and announce the result once the registers change.
+
+		NVDA isn't held up meanwhile. If they haven't changed after timeout seconds, checkStep() works out whether the program is still running."""
+		e = self.findEditField(EF_REGISTERS)
+		if (e is None):
+			sendKey(key)
+			return
+		# Messages from before the key, such as assembly errors, are announced along with its result.
+		pending = PendingStep(e, e.value, self.readStatus(), step, timeout)
+		if (self.pendingStep is not None):
+			# Still waiting for an earlier key's result: announce it along with this one's.
+			pending.before = self.pendingStep.before
+			pending.messages = self.pendingStep.messages + pending.messages
+		# Starting point for memory changes, if they are needed. Memory read after the last step will do,
+		# unless in live mode, where the update thread may have read it since.
+		if (self.memoryWanted() and (not self.memoryCurrent or self.viewMode == 1)): self.updateMemory()
+		self.pendingStep = pending
+		sendKey(key)
+		self.memoryCurrent = False
+		import wx
+		wx.CallLater(STEP_POLL_INTERVAL, self.checkStep, pending)
+
+	def checkStep(self, pending):
+		"""Announce the result of a step or run if the registers have changed, or look again later."""
+		if (pending is not self.pendingStep): return # superseded by a later key
+		try:
+			after = pending.edit.value
+		except:
+			log.debug("PCSpim: can't read the Registers window.", exc_info=True)
+			after = None
+		if (after is None):
+			self.pendingStep = None
+			self.editFieldCache.pop(EF_REGISTERS, None)
+			return
+		if (after != pending.before):
+			self.pendingStep = None
+			self.announceStep(pending.before, after, pending.messages + self.readStatus(), pending.step)
+			return
+		now = time.time()
+		if (now >= pending.giveUpAt):
+			self.pendingStep = None
+			return
+		if (not pending.stillRunning and now >= pending.stillRunningAt):
+			# The registers haven't changed yet. Only say the program is still running if PCSpim can be running it.
+			if (isDialog(api.getForegroundObject())):
+				# F5 may have opened the Run Parameters dialog; the program only starts once it is closed.
+				pending.dialog = True
+				pending.stillRunningAt = now + pending.timeout
+				pending.giveUpAt = now + STEP_WAIT_LIMIT
+			else:
+				pending.messages += self.readStatus()
+				if (pending.messages):
+					# Such as an assembly error, or the program exiting with a message: nothing is running.
+					self.pendingStep = None
+					ui.message(self.describeStatus(pending.messages))
+					return
+				if (self.hasExited(pending.before)):
+					self.pendingStep = None
+					ui.message("The program has exited.")
+					return
+				pending.stillRunning = True
+				ui.message("Still running.")
+		import wx
+		wx.CallLater(STEP_SLOW_POLL_INTERVAL if (pending.stillRunning or pending.dialog) else STEP_POLL_INTERVAL, self.checkStep, pending)
+
+	def hasExited(self, registers):
+		"""Whether the program has exited, going by the Registers window text: the instruction before the PC is a syscall made with $v0 10 or 17."""
+		regs = self.parseRegisters(registers)
+		pc, v0 = regs.get('pc'), regs.get('v0')
+		index = self.getSourceIndex()
+		if (pc is None or index is None or v0 not in (10, 17)): return False
+		instruction = index.instruction(pc - 4)
+		return instruction is not None and spim_mips.lookup(instruction[0])[0] == "syscall"
+
+	def announceStep(self, before, after, messages, step):
+		"""Speak the result of a step or run: Status window messages, the step, watches and memory changes."""
+		out = self.describeStatus(messages) + self.describeStep(before, after, step)
+		# The Memory window can be megabytes, so it is only read if something here needs it. Otherwise NVDA+Shift+M reads it when asked.
+		memoryRead = self.memoryWanted()
+		changes = self.updateMemory() if (memoryRead) else []
+		if (self.watches): out += "Watches: " + self.describeWatches(self.parseRegisters(after), not memoryRead)
+		if (self.announceMemory and changes):
+			out += self.describeMemoryChanges(changes)
+		ui.message(out)
+
+	def memoryWanted(self):
+		"""Whether announcing a step or run needs the Memory window: memory changes are announced, or a pinned watch or the stack frame reads memory."""
+		if (self.announceMemory): return True
+		for whichReg in self.watches:
+			if (whichReg == FRAME_REGISTER): return True
+			watch = self.watch(whichReg)
+			if (watch is not None and watch.usesMemory): return True
+		return False
+
+	def readStatus(self):
+		"""The exceptions, errors and breakpoints added to the Status window since it was last read.
+
+		While the window's length is unchanged its text isn't fetched."""
+		e = self.editFieldCache.get(EF_STATUS) or self.findEditField(EF_STATUS)
+		if (e is None): return []
+		try:
+			if (self.statusReader.unchanged(textLength(e))): return []
+			return self.statusReader.update(e.value)
+		except:
+			log.debug("PCSpim: can't read the Status window.", exc_info=True)
+			self.editFieldCache.pop(EF_STATUS, None)
+			return []
+
+	def describeStatus(self, messages):
+		"""Speech for Status window messages, with the label of any PC they give."""
+		symbols = self.getSymbols()
+		out = ""
+		for message in messages:
+			out += message.text
+			m = re.search(r"PC=0x([0-9a-f]{8})", message.text)
+			where = symbols.speak(int(m.group(1), 16)) if (m is not None) else None
+			if (where is not None): out += ", in %s" % where
+			out += ". "
+		return out
+
+	def script_statusMessages(self, gesture):
+		"""Recite the latest exceptions, errors and breakpoints from the Status window."""
+		self.research_log("statusMessages",str(gesture._get_displayName()), "")
+		self.readStatus()
+		history = self.statusReader.history[-5:]
+		if (not history):
+			ui.message("No exceptions or errors.")
+			return
+		ui.message(self.describeStatus(history))
+
+	def updateMemory(self):
+		"""Read the Memory window into the memory model. Returns the words that changed since it was last read."""
+		e = self.findEditField(EF_MEMORY)
+		text = e.value if (e is not None) else None
+		if (text is None): return []
+		with self.memoryLock:
+			changes = self.memoryModel.update(text)
+		self.memoryCurrent = True
+		if (changes or self.lastMemoryChanges is None):
+			self.lastMemoryChanges = changes
+		return changes
+
+	def describeMemoryChanges(self, changes, limit=5):
+		"""Speech for changed memory words: where, and old and new values."""
+		if (not changes): return "No memory changed. "
+		symbols = self.getSymbols()
+		out = "%d memory %s changed. " % (len(changes), "word" if len(changes) == 1 else "words")
+		for change in changes[:limit]:
+			where = symbols.speak(change.address) or " ".join(toHex(change.address).upper())
+			out += "%s from %s to %s. " % (where, speakValue(change.old, symbols), speakValue(change.new, symbols))
+		if (len(changes) > limit):
+			out += "And %d more. " % (len(changes) - limit)
+		return out
+
+	def script_memoryChanges(self, gesture):
+		"""Speak the memory words changed since memory was last read."""
+		self.research_log("memoryChanges",str(gesture._get_displayName()), "")
+		self.updateMemory()
+		if (self.lastMemoryChanges is None):
+			ui.message("Memory window not found.")
+			return
+		ui.message(self.describeMemoryChanges(self.lastMemoryChanges))
+
+	def script_toggleMemoryAnnouncements(self, gesture):
+		self.research_log("toggleMemoryAnnouncements",str(gesture._get_displayName()), "")
+		self.announceMemory = not self.announceMemory
+		ui.message("Memory changes announced after each step" if self.announceMemory else "Memory changes not announced")
+
+	def updateStack(self, readMemory=True):
+		"""Bring the stack view up to date with the Registers and Memory windows. Returns the selected frame, or None.
+
+		Pass readMemory=False if the memory model is already current."""
+		e = self.findEditField(EF_REGISTERS)
+		if (e is None or e.value is None): return None
+		regs = self.parseRegisters(e.value)
+		if ("sp" not in regs): return None
+		if (readMemory): self.updateMemory()
+		view = self.getStackView()
+		with self.memoryLock:
+			view.update(self.memoryModel, regs["sp"], regs.get("s8", 0), regs.get("pc", 0), self.getSymbols(), self.getSourceIndex())
+		return view.current()
+
+	def getStackView(self):
+		"""Return the stack view, creating it the first time."""
+		if (self.stackView is None):
+			import spim_stack
+			self.stackView = spim_stack.StackView()
+		return self.stackView
+
+	def describeFrame(self):
+		"""Speech for the selected stack frame."""
+		view = self.getStackView()
+		frame = view.current()
+		symbols = self.getSymbols()
+		sp = view.sp
+		out = "Frame %d of %d: %s. " % (view.selected + 1, len(view), frame.function or "unknown function")
+		if (frame.raSlot is None):
+			out += "Bottom of the stack, at sp plus %d. " % (frame.start - sp)
+			return out
+		out += "%d bytes at sp plus %d. " % (frame.size, frame.start - sp)
+		out += "Returns to %s, saved at sp plus %d. " % (speakValue(frame.returnAddress, symbols), frame.raSlot - sp)
+		if (frame.framePointer): out += "Frame pointer. "
+		with self.memoryLock:
+			words = self.memoryModel.readRange(frame.start, frame.raSlot)
+		if (words):
+			out += "Words: %s. " % ", ".join(speakValue(word, symbols) for word in words[:8])
+			if (len(words) > 8): out += "And %d more. " % (len(words) - 8)
+		return out
+
+	def script_stackFrames(self, gesture):
+		"""Speak the stack from the innermost frame out."""
+		self.research_log("stackFrames",str(gesture._get_displayName()), "")
+		view = self.getStackView()
+		view.selected = 0
+		if (self.updateStack() is None):
+			ui.message("Registers window not found.")
+			return
+		count = len(view)
+		names = [view.frame(i).function or "unknown" for i in range(min(count, 10))]
+		out = "%d %s: %s. " % (count, "frame" if count == 1 else "frames", ", ".join(names))
+		if (count > 10): out += "And %d more. " % (count - 10)
+		ui.message(out + self.describeFrame())
+		if (self.viewMode != 2): self.updateRegisters()
+
+	def moveFrame(self, gesture, delta):
+		if (self.updateStack() is None):
+			ui.message("Registers window not found.")
+			return
+		if (not self.getStackView().move(delta)):
+			ui.message("Outermost frame" if delta > 0 else "Innermost frame")
+			return
+		ui.message(self.describeFrame())
+		if (self.viewMode != 2): self.updateRegisters()
+
+	def script_outerFrame(self, gesture):
+		"""Move to the calling function's stack frame."""
+		self.research_log("outerFrame",str(gesture._get_displayName()), "")
+		self.moveFrame(gesture, 1)
+
+	def script_innerFrame(self, gesture):
+		"""Move to the called function's stack frame."""
+		self.research_log("innerFrame",str(gesture._get_displayName()), "")
+		self.moveFrame(gesture, -1)
+
+	def describeStep(self, before, after, step):
+		"""Describe a step from the Registers window text before and after it.
+
+		After a step the instruction executed is the one at the old PC. After a run, the one at the new PC is next."""
+		old, new = self.parseRegisters(before), self.parseRegisters(after)
+		pc = old.get('pc') if (step) else new.get('pc')
+		if (pc is None): return "Registers changed."
+		symbols = self.getSymbols()
+		index = self.getSourceIndex()
+		out = ""
+		source = index.lookup(pc) if (index is not None) else None
+		instruction = index.instruction(pc) if (index is not None) else None
+		if (source is not None):
+			out += "%s. " % source.statement
+		elif (instruction is not None):
+			out += "%s. " % instruction[1]
+		if (not step):
+			where = symbols.speak(pc) or " ".join(toHex(pc).upper())
+			out = "Stopped at %s. %s" % (where, "Next: " + out if out else "")
+		# Registers written, including HI, LO and the floating point registers
+		changed = new.changed(old)
+		if (step):
+			for r in changed:
+				out += "%s is %s. " % (r, speakValue(new[r], symbols))
+			if (not changed): out += "No registers changed. "
+		else:
+			out += "%d registers changed. " % len(changed)
+		return out
+
 	def script_copyConsoleToClipboard(self, gesture):
 
 		self.research_log("copyConsoleToClipboard",str(gesture._get_displayName()), "")
@@ -663,8 +1514,15 @@ class AppModule(appModuleHandler.AppModule):
 		if (ef.value == None):
 			ui.message("There is nothing on the console to copy to the clipboard.")
 			return
-		theText = ef.value.replace("\r","\r\n")
-		log.info([str(ord(c)) for c in theText])		
+		value = ef.value
+		def convert(job):
+			theText = value.replace("\r","\r\n")
+			log.info([str(ord(c)) for c in theText])
+			return theText
+		self.startJob("copyConsoleToClipboard", convert, self.copyToClipboard)
+
+	def copyToClipboard(self, theText):
+		import win32clipboard
 		win32clipboard.OpenClipboard()
 		win32clipboard.EmptyClipboard()
 		win32clipboard.SetClipboardText(theText)
@@ -677,6 +1535,7 @@ class AppModule(appModuleHandler.AppModule):
 		print str( gesture.dots )
 
 	def script_debug_randomizeRegisters(self, gesture):
+		import random
 		self.script_setFreeze(None)
 		ui.message("Randomizing")
 		for i in range(self.brl.getRegisterCount()):
@@ -711,14 +1570,50 @@ class AppModule(appModuleHandler.AppModule):
 		"kb:NVDA+shift+r": "setReveal",
 		"br(spim_focus):dot1+dot2+dot3+dot5+dot7+brailleSpaceBar": "setReveal",
 
+		"kb:NVDA+shift+b": "nextBank",
+		"br(spim_focus):dot1+dot2+dot7+brailleSpaceBar": "nextBank",
+		"kb:NVDA+control+shift+b": "previousBank",
+
+		"br(spim_focus):routing": "routeRegister",
+		"kb:NVDA+shift+n": "nextRendering",
+		"br(spim_focus):dot1+dot3+dot4+dot5+dot7+brailleSpaceBar": "nextRendering",
+		"kb:NVDA+control+shift+n": "previousRendering",
+		"kb:NVDA+shift+w": "watches",
+		"br(spim_focus):dot2+dot4+dot5+dot6+dot7+brailleSpaceBar": "watches",
+
 		"kb:NVDA+shift+i": "getCodeInfo",
 		"br(spim_focus):dot2+dot4+dot7+brailleSpaceBar": "getCodeInfo",
+
+		"kb:NVDA+shift+e": "getCodeFields",
+		"br(spim_focus):dot1+dot5+dot7+brailleSpaceBar": "getCodeFields",
 		
+		"kb:NVDA+shift+j": "jumpToSource",
+		"br(spim_focus):dot2+dot4+dot5+dot7+brailleSpaceBar": "jumpToSource",
+
 		"kb:NVDA+shift+x": "makeCodeReadable",
 		"kb:NVDA+shift+z": "makeCodeReadable2",
 		"br(spim_focus):dot1+dot3+dot4+dot6+dot7+brailleSpaceBar": "makeCodeReadable",
 		"br(spim_focus):dot1+dot3+dot5+dot6+dot7+brailleSpaceBar": "makeCodeReadable2",
 
+		"kb:f10": "stepAnnounce",
+		"br(spim_focus):dot3+dot4+brailleSpaceBar": "stepAnnounce",
+		"kb:f5": "runAnnounce",
+		"br(spim_focus):dot1+dot2+dot3+dot5+brailleSpaceBar": "runAnnounce",
+
+		"kb:NVDA+shift+m": "memoryChanges",
+		"br(spim_focus):dot1+dot3+dot4+dot7+brailleSpaceBar": "memoryChanges",
+		"kb:NVDA+control+shift+m": "toggleMemoryAnnouncements",
+
+		"kb:NVDA+shift+k": "stackFrames",
+		"br(spim_focus):dot1+dot3+dot7+brailleSpaceBar": "stackFrames",
+		"kb:NVDA+shift+o": "outerFrame",
+		"br(spim_focus):dot1+dot3+dot5+dot7+brailleSpaceBar": "outerFrame",
+		"kb:NVDA+shift+u": "innerFrame",
+		"br(spim_focus):dot1+dot3+dot6+dot7+brailleSpaceBar": "innerFrame",
+
+		"kb:NVDA+shift+t": "statusMessages",
+		"br(spim_focus):dot2+dot3+dot4+dot5+dot7+brailleSpaceBar": "statusMessages",
+
 		"kb:NVDA+shift+p": "copyConsoleToClipboard",
 		"br(spim_focus):dot1+dot2+dot3+dot4+dot7+brailleSpaceBar": "copyConsoleToClipboard",
 		
@@ -729,6 +1624,8 @@ class AppModule(appModuleHandler.AppModule):
 		"kb:NVDA+shift+5": "setFocusTo",
 
 		"kb:NVDA+shift+=": "toggleStudy",
+		"kb:NVDA+shift+s": "toggleSessionRecording",
+		"kb:NVDA+control+shift+v": "togglePublishing",
 
 		"br(spim_focus):dot7+dot2+brailleSpaceBar": "setFocusBrl",
 		"br(spim_focus):dot7+dot1+brailleSpaceBar": "setFocusBrl",
@@ -742,60 +1639,6 @@ class AppModule(appModuleHandler.AppModule):
 		
 
 
-# Configuration dialog
-class SpimSettingsDialog(settingsDialogs.SettingsDialog):
-	# Translators: This is the label for the synthesizer dialog.
-	title = _("PCSpim Access Configuration")
-
-	def __init__(self, parent, regs, numOfRegs):
-
-		self.numOfRegs = numOfRegs
-		self.Regs = ['none']
-		self.Regs.extend( sorted(regs) )
-
-		super(SpimSettingsDialog, self).__init__(parent)
-
-	def makeSettings(self, settingsSizer):
-		# Translators: This is a label for the select
-		# synthesizer combobox in the synthesizer dialog.
-		regs = {}
-		self.lists = {}
-		for r in range(self.numOfRegs):
-			# create dictionary subdir
-			regs[r] = {}
-
-			# create sizer for register line
-			regs[r]['ListSizer']=wx.BoxSizer(wx.HORIZONTAL)
-			regs[r]['Label']=wx.StaticText(self,-1,label=_("Register #&%d:" % r))
-			regs[r]['ListID']=wx.NewId()
-			self.lists[r]=wx.Choice(self,regs[r]['ListID'],choices=self.Regs)
-			try:
-				index=self.Regs.index(config.conf['pcspim']["r%d" % r])
-				self.lists[r].SetSelection(index)
-			except:
-				pass
-			regs[r]['ListSizer'].Add(regs[r]['Label'])
-			regs[r]['ListSizer'].Add(self.lists[r])
-			settingsSizer.Add(regs[r]['ListSizer'],border=10,flag=wx.BOTTOM)
-
-	def postInit(self):
-		try:
-			self.lists[0].SetFocus()
-		except:
-			pass
-
-	def onOk(self,evt):
-		#Does the config file contain SPIM data already?
-		if ("pcspim" not in config.conf.keys()):
-			config.conf["pcspim"] = {}
-
-		for r in range(self.numOfRegs):
-			config.conf["pcspim"]["r%d" % r]=self.lists[r].GetStringSelection()
-			if (self.lists[r].GetStringSelection() in ('none','')):
-				del config.conf['pcspim']["r%d" % r]
-
-		super(SpimSettingsDialog, self).onOk(evt)
-
 # CONSOLE EDITBOX MODULE
 
 class ConsoleEditBox(IAccessible):
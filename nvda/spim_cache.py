@@ -0,0 +1,87 @@
+# PC Spim Export Cache
+# Support module for the PC Spim App Module
+# by Flint Million <flint.million@mnsu.edu>
+
+# The readable code files made by NVDA+Shift+X and NVDA+Shift+Z are kept in
+# the temp directory, named after a hash of the Code window's text and the
+# kind of export. Exporting an unchanged program again just reopens the file
+# made last time. Files are evicted least recently used first, whenever there
+# are more than maxFiles of them or together they take more than maxBytes.
+#
+# This module has no NVDA dependencies.
+
+import os, hashlib, threading
+
+class ExportCache(object):
+	"""A size and count bounded cache of export files in one directory."""
+
+	def __init__(self, directory, prefix="PCSpim-code-", maxFiles=20, maxBytes=20*1024*1024):
+		self.directory = directory
+		# Every file in the directory starting with prefix belongs to the cache,
+		# including ones from versions of the add-on that didn't cache.
+		self.prefix = prefix
+		self.maxFiles = maxFiles
+		self.maxBytes = maxBytes
+		self.lock = threading.Lock()
+
+	def fileName(self, variant, content):
+		"""The file an export of content would be cached in."""
+		if (isinstance(content, unicode)): content = content.encode("utf-8")
+		digest = hashlib.sha1(variant + "\0" + content).hexdigest()
+		return os.path.join(self.directory, "%s%s-%s.txt" % (self.prefix, variant, digest[:20]))
+
+	def get(self, variant, content):
+		"""Return the cached file for content, or None."""
+		fileName = self.fileName(variant, content)
+		try:
+			os.utime(fileName, None) # mark as recently used
+		except OSError:
+			return None
+		return fileName
+
+	def put(self, variant, content, text):
+		"""Store the export text for content, evict old files, and return the file name. text may be a string or strings to write in order."""
+		fileName = self.fileName(variant, content)
+		tempName = "%s.%d.tmp" % (fileName, threading.current_thread().ident)
+		if (isinstance(text, basestring)): text = [text]
+		try:
+			with open(tempName, "wb") as f:
+				for part in text: f.write(part)
+		except:
+			# The parts may be made as they are written, and making them can be cancelled.
+			if (os.path.exists(tempName)): os.remove(tempName)
+			raise
+		with self.lock:
+			if (os.path.exists(fileName)): os.remove(fileName)
+			os.rename(tempName, fileName)
+			self.evict(keep=fileName)
+		return fileName
+
+	def files(self):
+		"""The cached files as (last used, size, file name), least recently used first."""
+		out = []
+		for name in os.listdir(self.directory):
+			if (not name.startswith(self.prefix) or not name.endswith(".txt")): continue
+			path = os.path.join(self.directory, name)
+			try:
+				st = os.stat(path)
+			except OSError:
+				continue
+			out.append((st.st_mtime, st.st_size, path))
+		out.sort()
+		return out
+
+	def evict(self, keep=None):
+		"""Remove least recently used files until the cache is within its limits."""
+		files = self.files()
+		total = sum(size for mtime, size, path in files)
+		count = len(files)
+		for mtime, size, path in files:
+			if (count <= self.maxFiles and total <= self.maxBytes): break
+			if (path == keep): continue
+			try:
+				os.remove(path)
+			except OSError:
+				continue # in use, or already gone
+			count -= 1
+			total -= size
@@ -0,0 +1,107 @@
+# PC Spim Code Export
+# Support module for the PC Spim App Module
+# by Flint Million <flint.million@mnsu.edu>
+
+# Formats the Code window as the readable code files NVDA+Shift+X and
+# NVDA+Shift+Z open. Both formats work a line at a time, so the window is cut
+# into chunks of whole lines that are formatted one after another and written
+# out as they are done. The whole file is never held as one string, and the
+# export can be cancelled between chunks.
+#
+# The chunks are formatted in-process. A pool of worker processes would need
+# a Python that can start copies of itself, and NVDA is a frozen executable,
+# which can't.
+#
+# This module has no NVDA dependencies.
+
+import re
+from array import array
+
+import spim_mips
+
+# Lines per chunk
+CHUNK_LINES = 5000
+
+HEADINGS = {
+	False: "PCSpim Instruction Output\r\n\r\n",
+	True: "PCSpim Instruction Output (Extended)\r\n\r\n",
+}
+
+CODE_LINE = re.compile(r"^\[0x([0-9a-f]{8})\]\t0x([0-9a-f]{8})  (.+)$")
+
+def parseCodeLine(text):
+	"""Parse a line of code from PCSpim's Code window and organize into logical components"""
+	# attempt to match the code
+	m = CODE_LINE.match(text)
+	# If no match found, return None.
+	if (m is None): return None
+	result = {}
+	result['encoded_instruction'] = int(m.group(2),16)
+	result['address'] = int(m.group(1),16)
+	# Do we have a comment?
+	instr = m.group(3)
+	if (";" in instr):
+		pos = instr.index(";")
+		comment = instr[pos+1:].strip()
+		instr = instr[:pos].strip()
+	else:
+		instr = instr.strip()
+		comment = ""
+	result['comment'], result['instruction'] = comment, instr
+	return result
+
+def withSymbol(text, symbol):
+	"""Append a symbol name in angle brackets, if there is one."""
+	return text if (symbol is None) else "%s <%s>" % (text, symbol)
+
+def describeLines(infos):
+	"""The field descriptions for some parsed lines of code, decoded in one pass.
+
+	Returns a list parallel to infos, with None for lines that aren't code."""
+	code = [info for info in infos if info is not None]
+	fields = spim_mips.decodeProgram(array('I', [info['encoded_instruction'] for info in code]), [info['address'] for info in code])
+	descriptions = iter(spim_mips.describeProgram(fields))
+	return [None if (info is None) else next(descriptions) for info in infos]
+
+def formatLines(lines, symbols, verbose=False):
+	"""The export text for some whole lines of the Code window."""
+	if (verbose): return formatLinesVerbose(lines, symbols)
+	infos = [parseCodeLine(l.strip()) for l in lines]
+	out = []
+	for l, info, fields in zip(lines, infos, describeLines(infos)):
+		if (info is None):
+			out.append(l.strip("\r\n") + "\r\n")
+		else:
+			out.append("%s %s (instruction %s at %s), fields: %s\r\n" % (
+				info['instruction'],
+				"; " + info['comment'] if info['comment'] != "" else "",
+				"0x" + hex(info['encoded_instruction'])[2:].zfill(8).lower(),
+				withSymbol("0x" + hex(info['address'])[2:].zfill(8).lower(), symbols.describe(info['address'])),
+				fields
+				))
+	return "".join(out)
+
+def formatLinesVerbose(lines, symbols):
+	infos = [parseCodeLine(l.strip()) for l in lines]
+	out = []
+	for l, info, fields in zip(lines, infos, describeLines(infos)):
+		if (info is None):
+			out.append(l.strip("\r\n") + "\r\n")
+		else:
+			out.append("Actual Assembly instruction : %s\r\n" % info['instruction'])
+			out.append("Your Instruction (comment)  : %s\r\n" % info['comment'] if info['comment'] else "<none>")
+			out.append("Encoded Instruction (hex)   : %s\r\n" % hex(info['encoded_instruction'])[2:].zfill(8).lower())
+			out.append("Instruction Fields          : %s\r\n" % fields)
+			out.append("Memory Address (hex)        : %s\r\n\r\n" % withSymbol(hex(info['address'])[2:].zfill(8).lower(), symbols.describe(info['address'])))
+	return "".join(out)
+
+def formatCode(data, symbols, verbose=False, job=None):
+	"""The export text for the Code window's text, as strings to be written out in order.
+
+	job, if given, is told the progress and can cancel the export."""
+	lines = data.split("\n")
+	starts = range(0, len(lines), CHUNK_LINES)
+	yield HEADINGS[verbose]
+	for n, start in enumerate(starts):
+		if (job is not None): job.progress(float(n) / len(starts))
+		yield formatLines(lines[start:start + CHUNK_LINES], symbols, verbose)
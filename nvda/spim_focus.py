@@ -29,53 +29,14 @@ import brailleInput
 #ADDED (fmillion) Bring in the SPIM Braille support
 import SPIMBraille
 
-import re, socket
+#ADDED(fmillion) Structured tracing replaces the old UDP debugger.
+# See spim_trace.py to turn tracing on and to choose where records are streamed.
+import spim_trace
 
-#ADDED(fmillion) ---UDP DEBUGGER---
+#ADDED(fmillion) Frames can be shared with viewers; see spim_publish.py.
+import spim_publish
 
-# This flag will enable or disable UDP debgging of SPIM Braille.
-# The UDP debugger is a separate Python script. 
-# In ALL enduser cases, this should be OFF.
-enableUdp = False
-
-# Stores socket for local use
-udpSock = None
-
-# Debug function - has to go here so it's defined first.
-def _spimDebug(st,warn=False):
-
-	# If we are using the UDP debugger, send the message to the UDP socket.
-	global udpSock
-	global enableUdp
-	if (enableUdp == True):
-		try:
-			if (warn == True):
-				log.warn(st)
-			udpSock.sendto(st, ('127.0.0.1',6287))
-		except:
-			# If we got some kind of error logging to UDP, stop using UDP and instead fallback to the standard NVDA logger.
-			enableUdp = False
-			udpSock.close()
-			_spimDebug("ERROR - couldn't send data to socket! Falling back to NVDA logging.")
-	# Otherwise, log to the standard NVDA logging facility.
-	else:
-		if (warn == True):
-			log.warn(st)
-		else:
-			log.debug("SPIMBraille: " + st)
-
-# Procedural code
-
-log.debug("Testing udp socket enable set to %s." % str(enableUdp))
-if (enableUdp == True):
-
-	log.debug("UDP is on. Trying to create a socket.")
-	try:
-		udpSock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_UDP)
-		_spimDebug("SPIM Braille UDP socket opened and running.")
-	except Exception, e:
-		enableUdp = False
-		_spimDebug("Could not start the SPIM Braille debug socket! Reverting to NVDA log debugging.")
+import re
 
 #Original code.
 
@@ -111,6 +72,13 @@ inputType_keys=3
 inputType_routing=4
 inputType_wizWheel=5
 
+#ADDED(fmillion) WizWheel burst coalescing.
+# WizWheel messages arriving within this many milliseconds of each other are
+# folded into a single gesture carrying the total unit count.
+WM_TIMER=0x0113
+WIZWHEEL_TIMER_ID=1
+WIZWHEEL_BURST_MS=30
+
 # Names of freedom scientific bluetooth devices
 bluetoothNames = (
 	"F14", "Focus 14 BT",
@@ -120,9 +88,26 @@ bluetoothNames = (
 
 keysPressed=0
 extendedKeysPressed=0
+# The burst currently being collected, as [isDown, isRight, units], or None.
+wizWheelBurst=None
+
+def flushWizWheelBurst(hwnd):
+	"""Execute the pending WizWheel burst, if any, as one gesture."""
+	global wizWheelBurst
+	windll.user32.KillTimer(hwnd,WIZWHEEL_TIMER_ID)
+	if wizWheelBurst is None:
+		return
+	isDown,isRight,units=wizWheelBurst
+	wizWheelBurst=None
+	gesture=WizWheelGesture(isDown,isRight,units)
+	try:
+		inputCore.manager.executeGesture(gesture)
+	except inputCore.NoInputGestureAction:
+		pass
+
 @WNDPROC
 def nvdaFsBrlWndProc(hwnd,msg,wParam,lParam):
-	global keysPressed, extendedKeysPressed
+	global keysPressed, extendedKeysPressed, wizWheelBurst
 	keysDown=0
 	extendedKeysDown=0
 	if msg==nvdaFsBrlWm and wParam in (FB_INPUT, FB_EXT_KEY):
@@ -137,6 +122,9 @@ def nvdaFsBrlWndProc(hwnd,msg,wParam,lParam):
 				isRoutingPressed=bool((lParam>>16)&0xff)
 				isTopRoutingRow=bool((lParam>>24)&0xff)
 				if isRoutingPressed:
+					#ADDED(fmillion) A pending WizWheel burst goes first, so input runs in the order it came.
+					if wizWheelBurst is not None:
+						flushWizWheelBurst(hwnd)
 					gesture=RoutingGesture(routingIndex,isTopRoutingRow)
 					try:
 						inputCore.manager.executeGesture(gesture)
@@ -148,17 +136,20 @@ def nvdaFsBrlWndProc(hwnd,msg,wParam,lParam):
 				isDown=bool((lParam>>11)&1)
 				#Right's up and down are rversed, but NVDA does not want this
 				if isRight: isDown=not isDown
-				for unit in xrange(numUnits):
-					gesture=WizWheelGesture(isDown,isRight)
-					try:
-						inputCore.manager.executeGesture(gesture)
-					except inputCore.NoInputGestureAction:
-						pass
+				# Turning the other way or using the other wheel ends the current burst.
+				if wizWheelBurst is not None and wizWheelBurst[:2]!=[isDown,isRight]:
+					flushWizWheelBurst(hwnd)
+				if wizWheelBurst is None:
+					wizWheelBurst=[isDown,isRight,0]
+				wizWheelBurst[2]+=numUnits
+				windll.user32.SetTimer(hwnd,WIZWHEEL_TIMER_ID,WIZWHEEL_BURST_MS,None)
 		elif wParam==FB_EXT_KEY:
 			keyBits=lParam>>4
 			extendedKeysDown=keyBits
 			extendedKeysPressed|=keyBits
 		if keysDown==0 and extendedKeysDown==0 and (keysPressed!=0 or extendedKeysPressed!=0):
+			if wizWheelBurst is not None:
+				flushWizWheelBurst(hwnd)
 			gesture=KeyGesture(keysPressed,extendedKeysPressed)
 			#log.info(str(keysPressed) +" "+ str(extendedKeysPressed))
 			keysPressed=extendedKeysPressed=0
@@ -167,6 +158,9 @@ def nvdaFsBrlWndProc(hwnd,msg,wParam,lParam):
 			except inputCore.NoInputGestureAction:
 				pass
 		return 0
+	elif msg==WM_TIMER and wParam==WIZWHEEL_TIMER_ID:
+		flushWizWheelBurst(hwnd)
+		return 0
 	else:
 		return windll.user32.DefWindowProcW(hwnd,msg,wParam,lParam)
 
@@ -217,22 +211,12 @@ class BrailleDisplayDriver(SPIMBraille.SPIMBrailleDisplayDriver,ScriptableObject
 				continue
 			yield p["port"].encode("mbcs")
 
-	wizWheelActions=[
-		# Translators: The name of a key on a braille display, that scrolls the display to show previous/next part of a long line.
-		(_("display scroll"),("globalCommands","GlobalCommands","braille_scrollBack"),("globalCommands","GlobalCommands","braille_scrollForward")),
-		# Translators: The name of a key on a braille display, that scrolls the display to show the next/previous line.
-		(_("line scroll"),("globalCommands","GlobalCommands","braille_previousLine"),("globalCommands","GlobalCommands","braille_nextLine")),
-	]
+	#ADDED(fmillion) The WizWheel actions, including register banks, are in SPIMBraille.
 
 	def __init__(self, port="auto"):
-		self.leftWizWheelActionCycle=itertools.cycle(self.wizWheelActions)
-		action=self.leftWizWheelActionCycle.next()
-		self.gestureMap.add("br(spim_focus):leftWizWheelUp",*action[1])
-		self.gestureMap.add("br(spim_focus):leftWizWheelDown",*action[2])
-		self.rightWizWheelActionCycle=itertools.cycle(self.wizWheelActions)
-		action=self.rightWizWheelActionCycle.next()
-		self.gestureMap.add("br(spim_focus):rightWizWheelUp",*action[1])
-		self.gestureMap.add("br(spim_focus):rightWizWheelDown",*action[2])
+		#ADDED(fmillion) WizWheel gestures are bound to script_wizWheelScroll (in
+		# SPIMBraille), which runs the current action once per unit of the burst.
+		self.initWizWheels()
 		super(BrailleDisplayDriver,self).__init__()
 		self._messageWindowClassAtom=windll.user32.RegisterClassExW(byref(nvdaFsBrlWndCls))
 		self._messageWindow=windll.user32.CreateWindowExW(0,self._messageWindowClassAtom,u"nvdaFsBrlWndCls window",0,0,0,0,0,None,None,appInstance,None)
@@ -297,7 +281,15 @@ class BrailleDisplayDriver(SPIMBraille.SPIMBrailleDisplayDriver,ScriptableObject
 		self.gestureMap.add("br(spim_focus):topRouting1","globalCommands","GlobalCommands","braille_scrollBack")
 		self.gestureMap.add("br(spim_focus):topRouting%d"%self.actualNumCells,"globalCommands","GlobalCommands","braille_scrollForward")
 
+		if spim_publish.PUBLISH_ON_LOAD and self.hasSPIM:
+			# Sharing frames is an extra; the display works without it.
+			try:
+				self.startPublishing()
+			except EnvironmentError:
+				log.warn("SPIM Braille: can't publish frames.", exc_info=True)
+
 	def terminate(self):
+		self.stopPublishing()
 		super(BrailleDisplayDriver,self).terminate()
 		fbClose(self.fbHandle)
 		windll.user32.DestroyWindow(self._messageWindow)
@@ -307,17 +299,25 @@ class BrailleDisplayDriver(SPIMBraille.SPIMBrailleDisplayDriver,ScriptableObject
 		return fbGetCellCount(self.fbHandle)
 
 	def display(self,cells):
-		_spimDebug("Got %d cells to write from NVDA." % len(cells))
+		if spim_trace.enabled: spim_trace.record(spim_trace.EV_NVDA_CELLS, len(cells))
 
 		# Call up to the superclass to append the registers to the cells we're displaying
 		cells = super(BrailleDisplayDriver,self).display(cells, True if self.actualNumCells < 15 else False)
-		
+
 		# Convert from list to string
-		cells="".join([chr(x) for x in cells]) 
+		cells="".join([chr(x) for x in cells])
+
+		# During a WizWheel burst, keep only the latest frame; it is written once the burst is done.
+		if self.holdFrame(cells):
+			return
 
 		# Go ahead and actually display the cells!
-		_spimDebug("Writing %d cells: %s" % (len(cells)," ".join([str(ord(cell)) for cell in cells])))
+		self._writeCells(cells)
+
+	def _writeCells(self,cells):
+		if spim_trace.enabled: spim_trace.record(spim_trace.EV_WRITE, len(cells), cells)
 		fbWrite(self.fbHandle,0,len(cells),cells)
+		self.frameWritten(cells)
 
 	# Back to original code.
 	# Everything from here on to the end is original.
@@ -336,20 +336,20 @@ class BrailleDisplayDriver(SPIMBraille.SPIMBrailleDisplayDriver,ScriptableObject
 			fbConfigure(self.fbHandle, 0x02)
 
 	def script_toggleLeftWizWheelAction(self,gesture):
-		action=self.leftWizWheelActionCycle.next()
-		self.gestureMap.add("br(spim_focus):leftWizWheelUp",*action[1],replace=True)
-		self.gestureMap.add("br(spim_focus):leftWizWheelDown",*action[2],replace=True)
+		action=self.leftWizWheelAction=self.leftWizWheelActionCycle.next()
 		braille.handler.message(action[0])
 
 	def script_toggleRightWizWheelAction(self,gesture):
-		action=self.rightWizWheelActionCycle.next()
-		self.gestureMap.add("br(spim_focus):rightWizWheelUp",*action[1],replace=True)
-		self.gestureMap.add("br(spim_focus):rightWizWheelDown",*action[2],replace=True)
+		action=self.rightWizWheelAction=self.rightWizWheelActionCycle.next()
 		braille.handler.message(action[0])
 
 	__gestures={
 		"br(spim_focus):leftWizWheelPress":"toggleLeftWizWheelAction",
 		"br(spim_focus):rightWizWheelPress":"toggleRightWizWheelAction",
+		"br(spim_focus):leftWizWheelUp":"wizWheelScroll",
+		"br(spim_focus):leftWizWheelDown":"wizWheelScroll",
+		"br(spim_focus):rightWizWheelUp":"wizWheelScroll",
+		"br(spim_focus):rightWizWheelDown":"wizWheelScroll",
 	}
 
 	gestureMap=inputCore.GlobalGestureMap({
@@ -408,21 +408,43 @@ class KeyGesture(InputGesture, brailleInput.BrailleInputGesture):
 	"leftRockerBarUp", "leftRockerBarDown", "rightRockerBarUp", "rightRockerBarDown",
 	]
 
+	#ADDED(fmillion) Decoded chords, keyed by (keyBits, extendedKeyBits).
+	# Chord users press the same handful of combinations over and over, so each
+	# decode is kept and reused. The least recently used entry is dropped once
+	# the cache holds decodeCacheSize chords.
+	decodeCacheSize=256
+	_decodeCache=OrderedDict()
+
+	@classmethod
+	def decode(cls,keyBits,extendedKeyBits):
+		"""Returns (id, dots, space) for a chord. dots is None if this is not a dots gesture."""
+		bits=(keyBits,extendedKeyBits)
+		try:
+			decoded=cls._decodeCache.pop(bits)
+		except KeyError:
+			keys=[cls.keyLabels[num] for num in xrange(24) if (keyBits>>num)&1]
+			extendedKeys=[cls.extendedKeyLabels[num] for num in xrange(4) if (extendedKeyBits>>num)&1]
+			allKeys = keys + extendedKeys
+			allKeys=frozenset(allKeys)
+			dots=None
+			space=False
+			# Don't say is this a dots gesture if some keys either from dots and space are pressed.
+			if not extendedKeyBits and not keyBits & ~(0xff | (1 << 0xf)):
+				dots = keyBits & 0xff
+				# Is space?
+				space = bool(keyBits & (1 << 0xf))
+			decoded=("+".join(allKeys),dots,space)
+			if len(cls._decodeCache)>=cls.decodeCacheSize:
+				cls._decodeCache.popitem(last=False)
+		cls._decodeCache[bits]=decoded
+		return decoded
+
 	def __init__(self,keyBits, extendedKeyBits):
 		super(KeyGesture,self).__init__()
-		keys=[self.keyLabels[num] for num in xrange(24) if (keyBits>>num)&1]
-		extendedKeys=[self.extendedKeyLabels[num] for num in xrange(4) if (extendedKeyBits>>num)&1]
-		allKeys = keys + extendedKeys
-		#log.info("gesture parts: %s, %s" % (keys, extendedKeys))
-		#log.info("All gesture parts: %s" % allKeys)
-		allKeys=frozenset(allKeys)
-		#log.info("Frozenset: %s" % str(allKeys))
-		self.id="+".join(allKeys)
-		# Don't say is this a dots gesture if some keys either from dots and space are pressed.
-		if not extendedKeyBits and not keyBits & ~(0xff | (1 << 0xf)):
-			self.dots = keyBits & 0xff
-			# Is space?
-			if keyBits & (1 << 0xf):
+		self.id,dots,space=self.decode(keyBits,extendedKeyBits)
+		if dots is not None:
+			self.dots = dots
+			if space:
 				self.space = True
 		#log.info(self.id)
 		
@@ -438,9 +460,14 @@ class RoutingGesture(InputGesture):
 
 class WizWheelGesture(InputGesture):
 
-	def __init__(self,isDown,isRight):
+	def __init__(self,isDown,isRight,count=1):
 		which="right" if isRight else "left"
 		direction="Down" if isDown else "Up"
 		self.id="%sWizWheel%s"%(which,direction)
+		#ADDED(fmillion) Keep the details so script_wizWheelScroll can repeat the action.
+		self.isDown=isDown
+		self.isRight=isRight
+		# Number of wheel units coalesced into this gesture.
+		self.count=count
 		super(WizWheelGesture,self).__init__()
 
@@ -0,0 +1,152 @@
+# PC Spim Background Jobs
+# Support module for the PC Spim App Module
+# by Flint Million <flint.million@mnsu.edu>
+
+# A small, bounded pool of worker threads for the add-on's slow scripts
+# (the code exporters and copying the console). NVDA's speech and Braille
+# run on the main thread, so work done there freezes them; a script instead
+# reads what it needs from PCSpim, hands the rest of the work to the pool and
+# returns at once.
+#
+# Each job has a key. Submitting a job while another with the same key is
+# still queued or running returns the job already in flight instead of
+# starting a second one. Jobs receive a Job object, which is their
+# cancellation token: long jobs call job.progress(fraction) now and then,
+# which raises JobCancelled if the job was cancelled and reports progress at
+# most every progressInterval seconds.
+#
+# Completion, error and progress callbacks are never run on a worker thread.
+# They are passed to callAfter, which the app module sets to queue them on
+# NVDA's main thread, where ui.message, the clipboard and starting programs
+# are safe.
+#
+# This module has no NVDA dependencies.
+
+import threading, Queue, time, sys
+
+class JobCancelled(Exception):
+	"""Raised inside a job that has been cancelled."""
+
+class Job(object):
+	"""One unit of background work, and its cancellation token."""
+
+	def __init__(self, pool, key, func, onDone=None, onError=None, onProgress=None):
+		self.pool = pool
+		self.key = key
+		self.func = func
+		self.onDone = onDone
+		self.onError = onError
+		self.onProgress = onProgress
+		self.requests = 1 # how many submissions this job is serving
+		self.result = None
+		self.error = None
+		self._cancelled = threading.Event()
+		self._finished = threading.Event()
+		self._lastProgress = time.time()
+
+	@property
+	def cancelled(self):
+		return self._cancelled.is_set()
+
+	@property
+	def finished(self):
+		return self._finished.is_set()
+
+	def cancel(self):
+		self._cancelled.set()
+
+	def check(self):
+		"""Raise JobCancelled if the job has been cancelled."""
+		if (self._cancelled.is_set()): raise JobCancelled()
+
+	def progress(self, fraction):
+		"""Note how far along the job is (0 to 1). Also checks for cancellation."""
+		self.check()
+		now = time.time()
+		if (self.onProgress is not None and now - self._lastProgress >= self.pool.progressInterval):
+			self._lastProgress = now
+			self.pool.callAfter(self.onProgress, fraction)
+
+	def wait(self, timeout=None):
+		"""Wait for the job to finish. Returns True if it did."""
+		return self._finished.wait(timeout)
+
+class JobPool(object):
+	"""A bounded pool of worker threads. Threads are started on first use."""
+
+	def __init__(self, workers=2, maxPending=8, callAfter=None, progressInterval=0.5):
+		self.workers = workers
+		self.maxPending = maxPending
+		self.callAfter = callAfter or (lambda func, *args: func(*args))
+		self.progressInterval = progressInterval
+		self.queue = Queue.Queue()
+		self.jobs = {} # key -> job queued or running
+		self.lock = threading.Lock()
+		self.threads = []
+		self.idle = threading.Condition(self.lock)
+
+	def submit(self, key, func, onDone=None, onError=None, onProgress=None):
+		"""Run func(job) on a worker thread.
+
+		onDone(result) or onError(exc_info) is then run through callAfter.
+		Returns the new job, or the job already in flight for key, or None if
+		too many jobs are pending."""
+		with self.lock:
+			job = self.jobs.get(key)
+			if (job is not None and not job.cancelled):
+				job.requests += 1
+				return job
+			if (len(self.jobs) >= self.maxPending):
+				return None
+			job = Job(self, key, func, onDone, onError, onProgress)
+			self.jobs[key] = job
+			if (len(self.threads) < self.workers):
+				thread = threading.Thread(target=self._worker, name="PCSpim job worker %d" % len(self.threads))
+				thread.daemon = True
+				self.threads.append(thread)
+				thread.start()
+		self.queue.put(job)
+		return job
+
+	def _worker(self):
+		while (True):
+			job = self.queue.get()
+			if (job is None): return
+			try:
+				job.check()
+				job.result = job.func(job)
+				job.check()
+				if (job.onDone is not None): self.callAfter(job.onDone, job.result)
+			except JobCancelled:
+				pass
+			except:
+				job.error = sys.exc_info()
+				if (job.onError is not None): self.callAfter(job.onError, job.error)
+			finally:
+				with self.lock:
+					if (self.jobs.get(job.key) is job): del self.jobs[job.key]
+					job._finished.set()
+					self.idle.notify_all()
+
+	def join(self, timeout=None):
+		"""Wait until no jobs are queued or running."""
+		end = None if (timeout is None) else time.time() + timeout
+		with self.lock:
+			while (self.jobs):
+				remaining = None if (end is None) else end - time.time()
+				if (remaining is not None and remaining <= 0): return False
+				self.idle.wait(remaining)
+		return True
+
+	def cancelAll(self):
+		with self.lock:
+			for job in self.jobs.values():
+				job.cancel()
+
+	def terminate(self):
+		"""Cancel every job and stop the worker threads."""
+		self.cancelAll()
+		with self.lock:
+			threads, self.threads = self.threads, []
+		for thread in threads:
+			self.queue.put(None)
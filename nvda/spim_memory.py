@@ -0,0 +1,140 @@
+# PC Spim Memory Model
+# Support module for the PC Spim App Module
+# by Flint Million <flint.million@mnsu.edu>
+
+# A model of simulated memory, kept up to date from the text of PCSpim's Data
+# (Memory) window, which looks like this:
+#
+#    User data segment [10000000]..[10040000]
+#   [0x10000000]...[0x1000fffc]	0x00000000
+#   [0x10010000]    0x636e4f20  0x70752065  0x61206e6f  0x656d6974
+#   [0x10010010]    0x65687420  0x77206572  0x61207361  0x6f727020
+#   [0x10010020]...[0x1003fffc]	0x00000000
+#
+# Rows hold four words. Runs of zero words are collapsed into a range, so
+# any address not shown on a row holds zero.
+#
+# The window is cut into pages at the lines starting on a 4 KB boundary, and
+# each page gets a checksum of its text. An update compares the checksums
+# with the previous ones, and only the rows that differ within pages that
+# changed are parsed, so the window can be several megabytes and still be
+# diffed in a few milliseconds. Words are otherwise parsed a page at a time, the first time
+# something reads them.
+#
+# This module has no NVDA dependencies.
+
+import re, zlib, operator
+from bisect import bisect_left, bisect_right
+
+ROW = re.compile(r"^\[0x([0-9a-f]{8})\]\s+0x([0-9a-f]{8})\s+0x([0-9a-f]{8})\s+0x([0-9a-f]{8})\s+0x([0-9a-f]{8})", re.M)
+ADDRESS = re.compile(r"\[0x([0-9a-f]{8})\]")
+
+def splitPages(text):
+	"""Cut the window's text into pages. Returns a list of (first address, checksum, text), in address order."""
+	cuts = [0]
+	i = text.find("000]")
+	while (i >= 0):
+		# A line starting "[0x?????000]"
+		start = i - 8
+		if (start > 0 and text[start - 1] == "\n" and text[start] == "["): cuts.append(start)
+		i = text.find("000]", i + 4)
+	cuts.append(len(text))
+	pages = []
+	for start, end in zip(cuts, cuts[1:]):
+		chunk = text[start:end]
+		m = ADDRESS.search(chunk)
+		if (m is None): continue # headings only
+		pages.append((int(m.group(1), 16), zlib.crc32(chunk), chunk))
+	return pages
+
+def parsePage(chunk):
+	"""The nonzero words on a page's rows, as a dictionary of address to value."""
+	words = {}
+	for m in ROW.finditer(chunk):
+		address = int(m.group(1), 16)
+		for i in range(4):
+			value = int(m.group(i + 2), 16)
+			if (value): words[address + 4 * i] = value
+	return words
+
+class MemoryChange(object):
+	"""One word that changed."""
+
+	def __init__(self, address, old, new):
+		self.address = address
+		self.old = old
+		self.new = new
+
+	def __repr__(self):
+		return "<MemoryChange 0x%08x: 0x%08x -> 0x%08x>" % (self.address, self.old, self.new)
+
+class MemoryModel(object):
+	"""Simulated memory as shown in the Data window."""
+
+	def __init__(self):
+		self.starts = [] # first address of each page, in order
+		self.pages = {} # first address -> (checksum, text)
+		self.words = {} # first address -> {address: value}, for pages parsed so far
+		self.text = None
+
+	def update(self, text):
+		"""Take in new Data window text. Returns the list of words that changed, in address order.
+
+		The first update only records the memory, and returns an empty list."""
+		if (text == self.text): return []
+		first = self.text is None
+		newPages = splitPages(text)
+		pages = dict((start, (checksum, chunk)) for start, checksum, chunk in newPages)
+		changes = []
+		if (not first):
+			# Only rows that differ are parsed. A word can move to a neighbouring
+			# page when a run of zeros is split or joined, so the rows of all
+			# dirty pages are compared together.
+			oldRows, newRows = set(), set()
+			for start in self.pages:
+				if (pages.get(start, (None,))[0] != self.pages[start][0]):
+					oldRows.update(self.pages[start][1].split("\n"))
+					self.words.pop(start, None)
+			for start in pages:
+				if (self.pages.get(start, (None,))[0] != pages[start][0]):
+					newRows.update(pages[start][1].split("\n"))
+			old = parsePage("\n".join(oldRows - newRows))
+			new = parsePage("\n".join(newRows - oldRows))
+			for address in set(old) | set(new):
+				if (old.get(address, 0) != new.get(address, 0)):
+					changes.append(MemoryChange(address, old.get(address, 0), new.get(address, 0)))
+			changes.sort(key=operator.attrgetter('address'))
+		else:
+			self.words = {}
+		self.starts = [start for start, checksum, chunk in newPages]
+		self.pages = pages
+		self.text = text
+		return changes
+
+	def pagesBetween(self, start, end):
+		"""The first addresses of the pages holding words from start up to end."""
+		first = max(bisect_right(self.starts, start) - 1, 0)
+		return self.starts[first:bisect_left(self.starts, end)]
+
+	def checksum(self, start):
+		"""The checksum of the page starting at start. It changes whenever the page's text does."""
+		return self.pages[start][0]
+
+	def pageWords(self, start):
+		"""The nonzero words on the page starting at start, as a dictionary of address to value."""
+		words = self.words.get(start)
+		if (words is None):
+			words = self.words[start] = parsePage(self.pages[start][1])
+		return words
+
+	def read(self, address):
+		"""The word at an address (rounded down to a word boundary). Zero if it isn't shown."""
+		address &= ~3
+		i = bisect_right(self.starts, address) - 1
+		if (i < 0): return 0
+		return self.pageWords(self.starts[i]).get(address, 0)
+
+	def readRange(self, start, end):
+		"""The words from start up to end, as a list."""
+		start &= ~3
+		return [self.read(start + 4 * i) for i in xrange((end - start + 3) // 4)]
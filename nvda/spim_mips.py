@@ -0,0 +1,327 @@
+# MIPS32 Instruction Decoder
+# Support module for the PC Spim App Module
+# by Flint Million <flint.million@mnsu.edu>
+
+# Decodes the encoded instruction words shown in PCSpim's Code window into
+# their format and fields. Decoding is table driven: the opcode indexes
+# OPCODES, and the SPECIAL, REGIMM, SPECIAL2 and coprocessor opcodes index
+# their own tables by funct, rt or rs.
+#
+# NumPy is optional. decodeProgram() decodes NumPy arrays with vector
+# operations, but NumPy is slow to import, so this module leaves importing it
+# to callers that have NumPy arrays.
+#
+# This module has no NVDA dependencies so it can be used by tools as well.
+
+from array import array
+from itertools import repeat
+import operator
+import sys
+
+# Register names, indexed by register number
+REGISTER_NAMES = [
+	"zero", "at", "v0", "v1", "a0", "a1", "a2", "a3",
+	"t0", "t1", "t2", "t3", "t4", "t5", "t6", "t7",
+	"s0", "s1", "s2", "s3", "s4", "s5", "s6", "s7",
+	"t8", "t9", "k0", "k1", "gp", "sp", "fp", "ra" ]
+
+# Formats
+FMT_R = "R"
+FMT_I = "I"
+FMT_J = "J"
+
+# Operand kinds. These decide which fields are meaningful and whether the
+# immediate is a branch offset.
+OP_NONE = 0     # no operands (syscall, break, eret)
+OP_RD_RS_RT = 1 # add rd, rs, rt
+OP_RD_RT_SA = 2 # sll rd, rt, shamt
+OP_RD_RT_RS = 3 # sllv rd, rt, rs
+OP_RS = 4       # jr rs, mthi rs
+OP_RD = 5       # mfhi rd
+OP_RS_RT = 6    # mult rs, rt
+OP_RD_RS = 7    # jalr rd, rs / clz rd, rs
+OP_RT_RS_IMM = 8  # addi rt, rs, imm
+OP_RT_IMM = 9     # lui rt, imm
+OP_RT_OFF_RS = 10 # lw rt, offset(rs)
+OP_RS_RT_BR = 11  # beq rs, rt, label
+OP_RS_BR = 12     # bgtz rs, label
+OP_TARGET = 13    # j target
+OP_RT_RD = 14     # mfc0 rt, rd
+OP_BR = 15        # bc1t label
+
+# Opcode table (bits 31-26). None means the opcode is decoded through a sub-table.
+OPCODES = [None] * 64
+for _op, _entry in {
+	0x02: ("j", FMT_J, OP_TARGET), 0x03: ("jal", FMT_J, OP_TARGET),
+	0x04: ("beq", FMT_I, OP_RS_RT_BR), 0x05: ("bne", FMT_I, OP_RS_RT_BR),
+	0x06: ("blez", FMT_I, OP_RS_BR), 0x07: ("bgtz", FMT_I, OP_RS_BR),
+	0x08: ("addi", FMT_I, OP_RT_RS_IMM), 0x09: ("addiu", FMT_I, OP_RT_RS_IMM),
+	0x0a: ("slti", FMT_I, OP_RT_RS_IMM), 0x0b: ("sltiu", FMT_I, OP_RT_RS_IMM),
+	0x0c: ("andi", FMT_I, OP_RT_RS_IMM), 0x0d: ("ori", FMT_I, OP_RT_RS_IMM),
+	0x0e: ("xori", FMT_I, OP_RT_RS_IMM), 0x0f: ("lui", FMT_I, OP_RT_IMM),
+	0x20: ("lb", FMT_I, OP_RT_OFF_RS), 0x21: ("lh", FMT_I, OP_RT_OFF_RS),
+	0x22: ("lwl", FMT_I, OP_RT_OFF_RS), 0x23: ("lw", FMT_I, OP_RT_OFF_RS),
+	0x24: ("lbu", FMT_I, OP_RT_OFF_RS), 0x25: ("lhu", FMT_I, OP_RT_OFF_RS),
+	0x26: ("lwr", FMT_I, OP_RT_OFF_RS), 0x28: ("sb", FMT_I, OP_RT_OFF_RS),
+	0x29: ("sh", FMT_I, OP_RT_OFF_RS), 0x2a: ("swl", FMT_I, OP_RT_OFF_RS),
+	0x2b: ("sw", FMT_I, OP_RT_OFF_RS), 0x2e: ("swr", FMT_I, OP_RT_OFF_RS),
+	0x30: ("ll", FMT_I, OP_RT_OFF_RS), 0x31: ("lwc1", FMT_I, OP_RT_OFF_RS),
+	0x35: ("ldc1", FMT_I, OP_RT_OFF_RS), 0x38: ("sc", FMT_I, OP_RT_OFF_RS),
+	0x39: ("swc1", FMT_I, OP_RT_OFF_RS), 0x3d: ("sdc1", FMT_I, OP_RT_OFF_RS),
+	}.items():
+	OPCODES[_op] = _entry
+
+OPCODE_SPECIAL = 0x00
+OPCODE_REGIMM = 0x01
+OPCODE_COP0 = 0x10
+OPCODE_COP1 = 0x11
+OPCODE_SPECIAL2 = 0x1c
+
+# SPECIAL table (opcode 0), indexed by funct (bits 5-0)
+SPECIAL = [None] * 64
+for _funct, _entry in {
+	0x00: ("sll", FMT_R, OP_RD_RT_SA), 0x02: ("srl", FMT_R, OP_RD_RT_SA),
+	0x03: ("sra", FMT_R, OP_RD_RT_SA), 0x04: ("sllv", FMT_R, OP_RD_RT_RS),
+	0x06: ("srlv", FMT_R, OP_RD_RT_RS), 0x07: ("srav", FMT_R, OP_RD_RT_RS),
+	0x08: ("jr", FMT_R, OP_RS), 0x09: ("jalr", FMT_R, OP_RD_RS),
+	0x0c: ("syscall", FMT_R, OP_NONE), 0x0d: ("break", FMT_R, OP_NONE),
+	0x10: ("mfhi", FMT_R, OP_RD), 0x11: ("mthi", FMT_R, OP_RS),
+	0x12: ("mflo", FMT_R, OP_RD), 0x13: ("mtlo", FMT_R, OP_RS),
+	0x18: ("mult", FMT_R, OP_RS_RT), 0x19: ("multu", FMT_R, OP_RS_RT),
+	0x1a: ("div", FMT_R, OP_RS_RT), 0x1b: ("divu", FMT_R, OP_RS_RT),
+	0x20: ("add", FMT_R, OP_RD_RS_RT), 0x21: ("addu", FMT_R, OP_RD_RS_RT),
+	0x22: ("sub", FMT_R, OP_RD_RS_RT), 0x23: ("subu", FMT_R, OP_RD_RS_RT),
+	0x24: ("and", FMT_R, OP_RD_RS_RT), 0x25: ("or", FMT_R, OP_RD_RS_RT),
+	0x26: ("xor", FMT_R, OP_RD_RS_RT), 0x27: ("nor", FMT_R, OP_RD_RS_RT),
+	0x2a: ("slt", FMT_R, OP_RD_RS_RT), 0x2b: ("sltu", FMT_R, OP_RD_RS_RT),
+	}.items():
+	SPECIAL[_funct] = _entry
+
+# REGIMM table (opcode 1), indexed by rt (bits 20-16)
+REGIMM = [None] * 32
+for _rt, _entry in {
+	0x00: ("bltz", FMT_I, OP_RS_BR), 0x01: ("bgez", FMT_I, OP_RS_BR),
+	0x10: ("bltzal", FMT_I, OP_RS_BR), 0x11: ("bgezal", FMT_I, OP_RS_BR),
+	}.items():
+	REGIMM[_rt] = _entry
+
+# SPECIAL2 table (opcode 0x1c), indexed by funct
+SPECIAL2 = [None] * 64
+for _funct, _entry in {
+	0x00: ("madd", FMT_R, OP_RS_RT), 0x01: ("maddu", FMT_R, OP_RS_RT),
+	0x02: ("mul", FMT_R, OP_RD_RS_RT), 0x04: ("msub", FMT_R, OP_RS_RT),
+	0x05: ("msubu", FMT_R, OP_RS_RT), 0x20: ("clz", FMT_R, OP_RD_RS),
+	0x21: ("clo", FMT_R, OP_RD_RS),
+	}.items():
+	SPECIAL2[_funct] = _entry
+
+# Coprocessor 0 table (opcode 0x10), indexed by rs. rs 0x10 (CO) holds eret.
+COP0 = [None] * 32
+COP0[0x00] = ("mfc0", FMT_R, OP_RT_RD)
+COP0[0x04] = ("mtc0", FMT_R, OP_RT_RD)
+COP0[0x10] = ("eret", FMT_R, OP_NONE)
+
+# Coprocessor 1 table (opcode 0x11), indexed by rs. The floating point
+# arithmetic formats (rs 0x10 single, 0x11 double, 0x14 word) are all
+# reported as "cop1" R format instructions with their fmt in rs.
+COP1 = [None] * 32
+COP1[0x00] = ("mfc1", FMT_R, OP_RT_RD)
+COP1[0x04] = ("mtc1", FMT_R, OP_RT_RD)
+COP1[0x08] = ("bc1", FMT_I, OP_BR)
+for _fmt, _name in ((0x10, "cop1.s"), (0x11, "cop1.d"), (0x14, "cop1.w")):
+	COP1[_fmt] = (_name, FMT_R, OP_NONE)
+
+# Sub-tables, and how to find the index for each. Used by lookup() and decodeProgram().
+SUBTABLES = {
+	OPCODE_SPECIAL: (SPECIAL, 0, 0x3f),
+	OPCODE_REGIMM: (REGIMM, 16, 0x1f),
+	OPCODE_COP0: (COP0, 21, 0x1f),
+	OPCODE_COP1: (COP1, 21, 0x1f),
+	OPCODE_SPECIAL2: (SPECIAL2, 0, 0x3f),
+}
+
+# Entry used for words that don't decode to a known instruction.
+UNKNOWN = ("unknown", FMT_R, OP_NONE)
+
+def lookup(word):
+	"""Find the (mnemonic, format, operand kind) table entry for an instruction word."""
+	op = word >> 26
+	entry = OPCODES[op]
+	if (entry is None):
+		try:
+			table, shift, mask = SUBTABLES[op]
+			entry = table[(word >> shift) & mask]
+		except KeyError:
+			pass
+	return UNKNOWN if (entry is None) else entry
+
+def signExtend16(value):
+	"""Sign extend a 16-bit immediate."""
+	return value - 0x10000 if (value & 0x8000) else value
+
+def decodeInstruction(word, address=None):
+	"""Decode an instruction word into a dictionary of its format and fields.
+	If the address of the word is known, branch and jump targets are resolved."""
+	word &= 0xffffffff
+	mnemonic, fmt, kind = lookup(word)
+	result = {
+		'mnemonic': mnemonic, 'format': fmt, 'opcode': word >> 26,
+		'rs': (word >> 21) & 0x1f, 'rt': (word >> 16) & 0x1f,
+		'rd': (word >> 11) & 0x1f, 'shamt': (word >> 6) & 0x1f,
+		'funct': word & 0x3f, 'imm': signExtend16(word & 0xffff),
+		'target': word & 0x3ffffff, 'branch_target': None, 'jump_target': None,
+		}
+	if (address is not None):
+		if (kind in (OP_RS_RT_BR, OP_RS_BR, OP_BR)):
+			result['branch_target'] = (address + 4 + (result['imm'] << 2)) & 0xffffffff
+		elif (kind == OP_TARGET):
+			result['jump_target'] = ((address + 4) & 0xf0000000) | (result['target'] << 2)
+	return result
+
+def describeFields(info):
+	"""Produce a readable description of a decoded instruction's fields, for speech and the exporters."""
+	return _describe(*[info[k] for k in DESCRIBED_FIELDS])
+
+def describeProgram(fields):
+	"""describeFields() for every instruction in a decodeProgram() result. Returns a list of descriptions."""
+	return map(_describe, *[fields[k] for k in DESCRIBED_FIELDS])
+
+# The fields _describe() takes, in order
+DESCRIBED_FIELDS = ('format', 'mnemonic', 'rs', 'rt', 'rd', 'shamt', 'funct', 'imm', 'target', 'branch_target', 'jump_target')
+
+def _describe(fmt, mnemonic, rs, rt, rd, shamt, funct, imm, target, branchTarget, jumpTarget):
+	out = "%s format %s" % (fmt, mnemonic)
+	if (fmt == FMT_J):
+		out += ", target 0x%07x" % target
+	else:
+		out += ", rs $%s, rt $%s" % (REGISTER_NAMES[rs], REGISTER_NAMES[rt])
+		if (fmt == FMT_R):
+			out += ", rd $%s, shamt %d, funct 0x%02x" % (REGISTER_NAMES[rd], shamt, funct)
+		else:
+			out += ", imm %d" % imm
+	if (branchTarget is not None):
+		out += ", branches to 0x%08x" % branchTarget
+	if (jumpTarget is not None):
+		out += ", jumps to 0x%08x" % jumpTarget
+	return out
+
+# Field tables for decodeProgram(), indexed by the high or low halfword of an
+# instruction word. Each is built from repeated strings, so they cost nothing
+# at import time and take 64 KB each.
+_OPCODE_OF = array('B', "".join(chr(i) * 1024 for i in range(64)))
+_RS_OF = array('B', "".join(chr(i) * 32 for i in range(32)) * 64)
+_RT_OF = array('B', "".join(map(chr, range(32))) * 2048)
+_RD_OF = array('B', "".join(chr(i) * 2048 for i in range(32)))
+_SHAMT_OF = array('B', "".join(chr(i) * 64 for i in range(32)) * 32)
+_FUNCT_OF = array('B', "".join(map(chr, range(64))) * 1024)
+
+# OPCODES with UNKNOWN filled in, leaving None only for opcodes that have a sub-table.
+_DIRECT = [UNKNOWN if (e is None and op not in SUBTABLES) else e for op, e in enumerate(OPCODES)]
+
+_BRANCH_KINDS = frozenset((OP_RS_RT_BR, OP_RS_BR, OP_BR))
+_TARGET_KINDS = _BRANCH_KINDS | frozenset((OP_TARGET,))
+
+def decodeProgram(words, baseAddress=None):
+	"""Decode a whole program at once.
+
+	words may be any sequence of instruction words; an array('I') or a NumPy
+	array avoids per-word conversion. baseAddress is either the address of
+	the first word, with the rest following consecutively, or a sequence
+	giving the address of every word. Returns a dictionary of parallel lists with the
+	same keys as decodeInstruction(). For a NumPy array the values are NumPy
+	arrays, and missing branch or jump targets are -1 rather than None."""
+	numpy = sys.modules.get("numpy")
+	if (numpy is not None and isinstance(words, numpy.ndarray)):
+		return _decodeProgramNumpy(words, baseAddress)
+	if (not isinstance(words, array) or words.itemsize != 4):
+		words = array('I', words)
+	# Reread the words as halfwords so every field is a table lookup done by map().
+	raw = words.tostring()
+	halves = array('H', raw)
+	signed = array('h', raw)
+	if (sys.byteorder == "little"):
+		low, high, imm = halves[0::2], halves[1::2], signed[0::2].tolist()
+	else:
+		low, high, imm = halves[1::2], halves[0::2], signed[1::2].tolist()
+	ops = map(_OPCODE_OF.__getitem__, high)
+	fields = {
+		'opcode': ops, 'rs': map(_RS_OF.__getitem__, high), 'rt': map(_RT_OF.__getitem__, high),
+		'rd': map(_RD_OF.__getitem__, low), 'shamt': map(_SHAMT_OF.__getitem__, low),
+		'funct': map(_FUNCT_OF.__getitem__, low), 'imm': imm,
+		'target': map(operator.and_, words, repeat(0x3ffffff, len(words))),
+		}
+	# Most words are found directly; only those with a sub-table opcode need a second lookup.
+	entries = map(_DIRECT.__getitem__, ops)
+	subIndex = {
+		OPCODE_SPECIAL: (SPECIAL, fields['funct']), OPCODE_REGIMM: (REGIMM, fields['rt']),
+		OPCODE_COP0: (COP0, fields['rs']), OPCODE_COP1: (COP1, fields['rs']),
+		OPCODE_SPECIAL2: (SPECIAL2, fields['funct']),
+		}
+	for i in [i for i, e in enumerate(entries) if e is None]:
+		table, index = subIndex[ops[i]]
+		entries[i] = table[index[i]] or UNKNOWN
+	fields['mnemonic'] = map(operator.itemgetter(0), entries)
+	fields['format'] = map(operator.itemgetter(1), entries)
+	fields['branch_target'], fields['jump_target'] = _resolveTargets(entries, imm, fields['target'], baseAddress)
+	return fields
+
+def _resolveTargets(entries, imm, target, baseAddress):
+	"""Work out branch and jump targets for decodeProgram(). Returns two lists."""
+	count = len(entries)
+	branches = [None] * count
+	jumps = [None] * count
+	if (baseAddress is None): return branches, jumps
+	if (isinstance(baseAddress, (int, long))):
+		first = baseAddress
+		addressOf = lambda i: first + 4*i
+	else:
+		addressOf = list(baseAddress).__getitem__
+	# Only branches and jumps have targets, so visit just those words.
+	kinds = map(operator.itemgetter(2), entries)
+	for i in [i for i, kind in enumerate(kinds) if kind in _TARGET_KINDS]:
+		if (kinds[i] == OP_TARGET):
+			jumps[i] = ((addressOf(i) + 4) & 0xf0000000) | (target[i] << 2)
+		else:
+			branches[i] = (addressOf(i) + 4 + (imm[i] << 2)) & 0xffffffff
+	return branches, jumps
+
+def _decodeProgramNumpy(words, baseAddress):
+	"""decodeProgram() for NumPy arrays. Every field is computed with vector operations,
+	and the tables are consulted once per distinct (opcode, sub-table index) pair."""
+	import numpy
+	words = words.astype(numpy.int64) & 0xffffffff
+	ops = words >> 26
+	imm = ((words & 0xffff) ^ 0x8000) - 0x8000
+	target = words & 0x3ffffff
+	fields = {
+		'opcode': ops, 'rs': (words >> 21) & 0x1f, 'rt': (words >> 16) & 0x1f,
+		'rd': (words >> 11) & 0x1f, 'shamt': (words >> 6) & 0x1f,
+		'funct': words & 0x3f, 'imm': imm, 'target': target,
+		}
+	subIndex = numpy.zeros(len(words), numpy.int64)
+	for op, (table, shift, mask) in SUBTABLES.items():
+		sel = (ops == op)
+		subIndex[sel] = (words[sel] >> shift) & mask
+	uniqueKeys, inverse = numpy.unique((ops << 6) | subIndex, return_inverse=True)
+	uniqueEntries = [_entryForKey(int(k) >> 6, int(k) & 0x3f) for k in uniqueKeys]
+	fields['mnemonic'] = numpy.array([e[0] for e in uniqueEntries], dtype=object)[inverse]
+	fields['format'] = numpy.array([e[1] for e in uniqueEntries], dtype=object)[inverse]
+	# Targets use -1 where an instruction has none.
+	fields['branch_target'] = fields['jump_target'] = numpy.full(len(words), -1, numpy.int64)
+	if (baseAddress is not None):
+		kinds = numpy.array([e[2] for e in uniqueEntries])[inverse]
+		if (isinstance(baseAddress, (int, long))):
+			nextAddress = baseAddress + 4 + 4 * numpy.arange(len(words), dtype=numpy.int64)
+		else:
+			nextAddress = numpy.asarray(baseAddress, dtype=numpy.int64) + 4
+		isBranch = numpy.in1d(kinds, (OP_RS_RT_BR, OP_RS_BR, OP_BR))
+		fields['branch_target'] = numpy.where(isBranch, (nextAddress + (imm << 2)) & 0xffffffff, -1)
+		fields['jump_target'] = numpy.where(kinds == OP_TARGET, (nextAddress & 0xf0000000) | (target << 2), -1)
+	return fields
+
+def _entryForKey(op, index):
+	"""Find the table entry for an opcode and its sub-table index."""
+	entry = OPCODES[op]
+	if (entry is None and op in SUBTABLES):
+		entry = SUBTABLES[op][0][index]
+	return UNKNOWN if (entry is None) else entry
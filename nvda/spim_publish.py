@@ -0,0 +1,149 @@
+# SPIM Braille Frame Publishing
+# Shares the frames written to the display with viewers in other processes.
+# by Flint Million <flint.million@mnsu.edu>
+
+# An instructor or a sighted partner can't see what a student's Braille
+# display shows. While publishing is on, the driver copies every frame it
+# writes (NVDA's cells followed by the register blocks) into a ring of slots
+# in a memory-mapped file. Any number of viewers on the same machine, such
+# as tools/spim_viewer.py, map the same file and read frames from it; they
+# never talk to the driver, so they can't slow the display down.
+#
+# File layout, all little endian:
+#
+#   header   magic "SPFR", version, slot count, slot size, latest sequence number
+#   slots    sequence number, timestamp, cell count, cells (slot size bytes)
+#
+# Frame n goes in slot n % slot count. The writer sets a slot's sequence
+# number to 0 while it writes the slot and to n once the slot is complete, and
+# then stores n in the header. A reader copies a slot and checks its sequence
+# number before and after; if they differ the slot was rewritten meanwhile.
+#
+# A publisher reopens an existing frame file with the same layout rather than
+# truncating it, and carries on from its latest sequence number, so viewers
+# that have it mapped keep following it when publishing is turned off and on
+# or NVDA restarts. (Windows won't truncate a file another process has
+# mapped.) If the latest sequence number ever goes backwards, because the
+# file was made afresh, readers start again from the newest frame.
+#
+# This module has no NVDA dependencies, so the viewer can import it.
+
+import os, mmap, struct, time, threading, tempfile
+
+# Set to True to publish frames as soon as a SPIM Braille driver loads.
+PUBLISH_ON_LOAD = False
+
+# Where frames are published unless another file is given.
+DEFAULT_PATH = os.path.join(tempfile.gettempdir(), "spim-frames.bin")
+
+MAGIC = "SPFR"
+VERSION = 1
+HEADER_FORMAT = "<4sHHHxxQ"
+HEADER_SIZE = struct.calcsize(HEADER_FORMAT)
+SLOT_HEADER_FORMAT = "<QdH6x"
+SLOT_HEADER_SIZE = struct.calcsize(SLOT_HEADER_FORMAT)
+# Offset of the latest sequence number in the header
+LATEST_OFFSET = HEADER_SIZE - 8
+
+# 16 slots of 128 cells hold the last 16 frames of an 80 cell display with its separators.
+DEFAULT_SLOTS = 16
+DEFAULT_SLOT_SIZE = 128
+
+class FramePublisher(object):
+	"""Writes frames into the ring file. Give publish to the driver's addFrameListener."""
+
+	def __init__(self, path=DEFAULT_PATH, slots=DEFAULT_SLOTS, slotSize=DEFAULT_SLOT_SIZE):
+		self.path = path
+		self.slots = slots
+		self.slotSize = slotSize
+		self.slotStride = SLOT_HEADER_SIZE + slotSize
+		size = HEADER_SIZE + slots * self.slotStride
+		self.sequence = reusableSequence(path, slots, slotSize, size)
+		if (self.sequence is None):
+			self.file = open(path, "w+b")
+			self.file.write("\0" * size)
+			self.file.flush()
+			self.sequence = 0
+		else:
+			self.file = open(path, "r+b")
+		self.map = mmap.mmap(self.file.fileno(), size)
+		struct.pack_into(HEADER_FORMAT, self.map, 0, MAGIC, VERSION, slots, slotSize, self.sequence)
+		# Frames can be written from NVDA's main thread and the live update thread.
+		self.lock = threading.Lock()
+
+	def publish(self, cells):
+		"""Publish one frame: a string of cells, or a list of cell values."""
+		if (not isinstance(cells, str)): cells = "".join([chr(x & 0xff) for x in cells])
+		cells = cells[:self.slotSize]
+		with self.lock:
+			self.sequence += 1
+			offset = HEADER_SIZE + (self.sequence % self.slots) * self.slotStride
+			struct.pack_into(SLOT_HEADER_FORMAT, self.map, offset, 0, time.time(), len(cells))
+			self.map[offset + SLOT_HEADER_SIZE:offset + SLOT_HEADER_SIZE + len(cells)] = cells
+			struct.pack_into("<Q", self.map, offset, self.sequence)
+			struct.pack_into("<Q", self.map, LATEST_OFFSET, self.sequence)
+
+	def close(self):
+		self.map.close()
+		self.file.close()
+
+def reusableSequence(path, slots, slotSize, size):
+	"""The latest sequence number in an existing frame file with this layout, or None if there isn't one to reuse."""
+	try:
+		f = open(path, "rb")
+	except IOError:
+		return None
+	try:
+		header = f.read(HEADER_SIZE)
+		f.seek(0, os.SEEK_END)
+		if (len(header) != HEADER_SIZE or f.tell() != size): return None
+	finally:
+		f.close()
+	magic, version, fileSlots, fileSlotSize, latest = struct.unpack(HEADER_FORMAT, header)
+	if ((magic, version, fileSlots, fileSlotSize) != (MAGIC, VERSION, slots, slotSize)): return None
+	return latest
+
+class FrameReader(object):
+	"""Reads frames from a ring file written by a FramePublisher."""
+
+	def __init__(self, path=DEFAULT_PATH):
+		self.file = open(path, "rb")
+		header = self.file.read(HEADER_SIZE)
+		magic, version, self.slots, self.slotSize, latest = struct.unpack(HEADER_FORMAT, header)
+		if (magic != MAGIC or version != VERSION):
+			raise ValueError("%s is not a SPIM Braille frame file" % path)
+		self.slotStride = SLOT_HEADER_SIZE + self.slotSize
+		self.map = mmap.mmap(self.file.fileno(), HEADER_SIZE + self.slots * self.slotStride, access=mmap.ACCESS_READ)
+
+	def latest(self):
+		"""The sequence number of the latest frame, or 0 if none has been published."""
+		return struct.unpack_from("<Q", self.map, LATEST_OFFSET)[0]
+
+	def frame(self, sequence):
+		"""Frame number sequence as (sequence, timestamp, cells string), or None if it has been overwritten or torn."""
+		offset = HEADER_SIZE + (sequence % self.slots) * self.slotStride
+		before, timestamp, length = struct.unpack_from(SLOT_HEADER_FORMAT, self.map, offset)
+		cells = self.map[offset + SLOT_HEADER_SIZE:offset + SLOT_HEADER_SIZE + min(length, self.slotSize)]
+		after = struct.unpack_from("<Q", self.map, offset)[0]
+		if (before != sequence or after != sequence): return None
+		return (sequence, timestamp, cells)
+
+	def framesAfter(self, sequence):
+		"""The frames published after frame number sequence that can still be read, oldest first.
+
+		If sequence is past the latest frame, the file was made afresh, and the newest frames are given."""
+		latest = self.latest()
+		if (sequence > latest): sequence = 0
+		out = []
+		for n in xrange(max(sequence + 1, latest - self.slots + 1, 1), latest + 1):
+			frame = self.frame(n)
+			if (frame is not None): out.append(frame)
+		return out
+
+	def close(self):
+		self.map.close()
+		self.file.close()
+
+def toUnicodeBraille(cells):
+	"""A frame's cells as Unicode braille characters. Cell bits are dots 1 to 8, as in the Unicode braille block."""
+	return u"".join([unichr(0x2800 + ord(c)) for c in cells])
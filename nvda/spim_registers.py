@@ -0,0 +1,181 @@
+# PC Spim Register File
+# Support module for the PC Spim App Module
+# by Flint Million <flint.million@mnsu.edu>
+
+# Every register PCSpim's Registers window shows, parsed in one pass:
+#
+#   PC      = 00400024    EPC     = 00000000    Cause   = 00000000    BadVAddr= 00000000
+#   Status  = 3000ff10    HI      = 00000000    LO      = 00000000
+#                                  General Registers
+#   R0  (r0) = 00000000  R8  (t0) = 00000000  R16 (s0) = 00000000  R24 (t8) = 00000000
+#   ...
+#                               Double Floating Point Registers
+#   FP0     = 0.000000    FP8     = 0.000000    FP16    = 0.000000    FP24    = 0.000000
+#   ...
+#                               Single Floating Point Registers
+#   FP0     = 0.000000    FP8     = 0.000000    FP16    = 0.000000    FP24    = 0.000000
+#
+# Integer registers are kept in an array of unsigned 32-bit words and
+# floating point registers in an array of doubles. Each register has a fixed
+# slot in its array, so code can look a register up once and index it after.
+# General registers are named as the window names them ("t0", "s8"), the
+# others in lower case ("pc", "hi", "badvaddr"). Double registers are "d0",
+# "d2" and so on, and single registers "f0" to "f31".
+#
+# Parsing has to be cheap, since live mode reads the window every second and
+# F10 reads it twice per step. The integer registers are found with one
+# regular expression and decoded together; their order in the window is
+# worked out once and remembered. The floating point registers rarely
+# change, so their part of the window is only converted when its text is
+# new.
+#
+# This module has no NVDA dependencies.
+
+import re, sys, operator
+from array import array
+from binascii import unhexlify
+
+GENERAL_NAMES = ["r0", "at", "v0", "v1", "a0", "a1", "a2", "a3",
+	"t0", "t1", "t2", "t3", "t4", "t5", "t6", "t7",
+	"s0", "s1", "s2", "s3", "s4", "s5", "s6", "s7",
+	"t8", "t9", "k0", "k1", "gp", "sp", "s8", "ra"]
+SPECIAL_NAMES = ["pc", "epc", "cause", "badvaddr", "status", "hi", "lo"]
+INTEGER_NAMES = GENERAL_NAMES + SPECIAL_NAMES
+FLOAT_NAMES = ["f%d" % n for n in range(32)] + ["d%d" % n for n in range(0, 32, 2)]
+
+INTEGER_SLOTS = dict((name, slot) for slot, name in enumerate(INTEGER_NAMES))
+FLOAT_SLOTS = dict((name, slot) for slot, name in enumerate(FLOAT_NAMES))
+
+NAMED_VALUE = re.compile(r"(\w+)\)? *= ?([0-9a-f]{8})")
+HEX_VALUE = re.compile(r"= ?([0-9a-f]{8})")
+DOUBLE_HEADING = "Double Floating Point"
+SINGLE_HEADING = "Single Floating Point"
+
+class RegisterFile(object):
+	"""The registers from one reading of the Registers window."""
+
+	# Integer register layouts seen so far: (end of the integer part, count) -> (names, reorder, check)
+	layouts = {}
+	# Floating point parts of the window seen lately: text -> (names, array of values)
+	floatCache = {}
+	floatCacheSize = 32
+
+	def __init__(self, text=None):
+		self.ints = array('I', [0] * len(INTEGER_NAMES))
+		self.floats = array('d', [0.0] * len(FLOAT_NAMES))
+		self.names = () # names of the registers the window showed, in slot order
+		self.floatText = None
+		if (text is not None): self.parse(text)
+
+	def parse(self, text):
+		"""Read the Registers window text. Returns the number of registers found."""
+		double = text.find(DOUBLE_HEADING)
+		if (double < 0): double = len(text)
+		words = HEX_VALUE.findall(text, 0, double)
+		key = (double, len(words))
+		layout = self.layouts.get(key)
+		# A layout is only used again if its registers are where they were; texts of the same length can differ.
+		if (layout is None or layout[2].match(text) is None):
+			layout = intLayout(text, double, len(words))
+			if (layout[1] is not None): self.layouts[key] = layout
+		intNames, reorder = layout[:2]
+		if (reorder is not None):
+			# Every integer register is there: put them in slot order and decode them together.
+			self.ints = array('I')
+			self.ints.fromstring(unhexlify("".join(reorder(words))))
+			if (sys.byteorder == "little"): self.ints.byteswap()
+		else:
+			self.ints = array('I', [0] * len(INTEGER_NAMES))
+			for name, word in NAMED_VALUE.findall(text, 0, double):
+				slot = INTEGER_SLOTS.get(name.lower())
+				if (slot is not None): self.ints[slot] = int(word, 16)
+		floatText = text[double:]
+		floatNames = ()
+		if (floatText):
+			found = self.floatCache.get(floatText)
+			if (found is None):
+				if (len(self.floatCache) >= self.floatCacheSize): self.floatCache.clear()
+				found = self.floatCache[floatText] = parseFloats(floatText)
+			floatNames, floats = found
+			self.floats = array('d', floats)
+		self.floatText = floatText
+		self.names = intNames + floatNames
+		return len(self.names)
+
+	def __len__(self):
+		return len(self.names)
+
+	def __contains__(self, name):
+		return name in self.names
+
+	def __getitem__(self, name):
+		if (name not in self.names): raise KeyError(name)
+		slot = INTEGER_SLOTS.get(name)
+		if (slot is not None): return self.ints[slot]
+		return self.floats[FLOAT_SLOTS[name]]
+
+	def get(self, name, default=None):
+		try:
+			return self[name]
+		except KeyError:
+			return default
+
+	def keys(self):
+		return list(self.names)
+
+	def isFloat(self, name):
+		return name in FLOAT_SLOTS
+
+	def changed(self, other):
+		"""Names of the registers, other than the PC, whose values differ from those in other."""
+		out = []
+		sameFloats = self.floatText == other.floatText
+		for name in self.names:
+			if (name == "pc" or (sameFloats and name in FLOAT_SLOTS)): continue
+			if (name not in other or self[name] != other[name]):
+				out.append(name)
+		return out
+
+def intLayout(text, double, wordCount):
+	"""Work out the slots of the integer registers from the window's text, up to offset double.
+
+	Returns (names in slot order, reorder, check). When every register is
+	there once, with no other values, reorder takes the values in window
+	order and returns them in slot order, and check is a pattern matching
+	the texts it holds for: those with every name and value at the same
+	place. Otherwise reorder and check are None. Names that aren't registers
+	are skipped."""
+	matches = list(NAMED_VALUE.finditer(text, 0, double))
+	slots = [INTEGER_SLOTS.get(m.group(1).lower()) for m in matches]
+	found = sorted(set(slot for slot in slots if slot is not None))
+	names = tuple(INTEGER_NAMES[slot] for slot in found)
+	if (len(slots) != len(found) or len(found) != len(INTEGER_NAMES) or wordCount != len(found)):
+		return names, None, None
+	reorder = operator.itemgetter(*[slots.index(slot) for slot in range(len(INTEGER_NAMES))])
+	parts = []
+	end = 0
+	for m in matches:
+		parts.append(".{%d}%s[0-9a-f]{8}" % (m.start(1) - end, re.escape(text[m.start(1):m.start(2)])))
+		end = m.end(2)
+	return names, reorder, re.compile("".join(parts), re.DOTALL)
+
+def parseFloats(text):
+	"""Parse the floating point part of the window. Returns (names in slot order, array of values for every slot)."""
+	floats = array('d', [0.0] * len(FLOAT_NAMES))
+	names = []
+	single = text.find(SINGLE_HEADING)
+	if (single < 0): single = len(text)
+	for start, end, form in ((0, single, "d%d"), (single, len(text), "f%d")):
+		# Skip the heading. Each register is then three words: "FPn", "=" and the value.
+		words = text[text.find("\n", start, end) + 1:end].split()
+		for name, value in zip(words[0::3], words[2::3]):
+			if (not name.startswith("FP") or not name[2:].isdigit()): continue
+			name = form % int(name[2:])
+			if (name not in FLOAT_SLOTS): continue
+			try:
+				floats[FLOAT_SLOTS[name]] = float(value)
+			except ValueError:
+				continue
+			names.append(name)
+	names.sort(key=FLOAT_SLOTS.get)
+	return tuple(names), floats
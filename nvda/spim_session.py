@@ -0,0 +1,172 @@
+# PC Spim Session Recording
+# Support module for the PC Spim App Module
+# by Flint Million <flint.million@mnsu.edu>
+
+# A session file is a timeline of everything the add-on saw and did: snapshots
+# of the five PCSpim panes, the gestures that ran add-on scripts, live mode
+# update ticks, and the frames written to the Braille display. Each line of the
+# file is one JSON event:
+#
+#   {"t": 1.25, "event": "panes", "panes": {"1": "...code...", "2": "...registers..."}}
+#   {"t": 1.25, "event": "gesture", "script": "getCodeInfo", "gesture": {...}, "focus": {"pane": 1, "caret": 120}}
+#   {"t": 2.00, "event": "tick"}
+#   {"t": 1.26, "event": "frame", "cells": [1, 3, 255, ...]}
+#
+# "t" is seconds since recording started. Pane snapshots are keyed by the EF_*
+# identifiers from the app module and only contain panes that changed since the
+# previous snapshot. "focus" says which pane had the focus, and where its caret was.
+#
+# tools/spim_replay.py plays a session back against the app module on any
+# machine, for comparing the cost of the add-on's paths run to run.
+#
+# This module has no NVDA dependencies.
+
+import os, json, time, threading
+
+# Scripts that start or stop recording. They aren't recorded, and are skipped
+# when a session is played back.
+UNRECORDED_SCRIPTS = frozenset(("toggleSessionRecording", "toggleStudy"))
+
+class SessionRecorder(object):
+	"""Writes a session file. Safe to use from the main thread and the live update thread at once."""
+
+	def __init__(self, fileName, readPanes, info=None):
+		# readPanes is a callable returning a dictionary of EF_* identifier to pane text.
+		self.readPanes = readPanes
+		self.lastPanes = {}
+		# Held while writing, and while a snapshot compares and records the panes,
+		# so the two threads' snapshots can't interleave.
+		self.lock = threading.RLock()
+		self.file = open(fileName, "w")
+		self.start = time.time()
+		self.write("start", info=info or {})
+
+	def write(self, event, **data):
+		data['t'] = round(time.time() - self.start, 4)
+		data['event'] = event
+		line = json.dumps(data) + "\n"
+		with self.lock:
+			if (self.file is not None):
+				self.file.write(line)
+
+	def snapshot(self):
+		"""Record the panes that changed since the last snapshot."""
+		with self.lock:
+			panes = self.readPanes()
+			changed = {}
+			for which, text in panes.items():
+				if (self.lastPanes.get(which) != text):
+					changed[str(which)] = text
+			self.lastPanes = panes
+			if (changed):
+				self.write("panes", panes=changed)
+
+	def gesture(self, scriptName, gesture, focusPane=None, caret=None):
+		"""Record a gesture, along with the panes and focus as the script is about to see them."""
+		with self.lock:
+			self.snapshot()
+			self.write("gesture", script=scriptName, gesture=describeGesture(gesture), focus={'pane': focusPane, 'caret': caret})
+
+	def tick(self):
+		"""Record a live mode update."""
+		with self.lock:
+			self.snapshot()
+			self.write("tick")
+
+	def frame(self, cells):
+		"""Record a frame written to the Braille display. Suitable as a frame listener."""
+		if (isinstance(cells, str)):
+			cells = [ord(c) for c in cells]
+		self.write("frame", cells=list(cells))
+
+	def close(self):
+		self.write("stop")
+		with self.lock:
+			self.file.close()
+			self.file = None
+
+def describeGesture(gesture):
+	"""Capture the parts of a gesture the add-on's scripts look at."""
+	if (gesture is None): return None
+	out = {}
+	try:
+		out['displayName'] = gesture._get_displayName()
+	except:
+		out['displayName'] = ""
+	for attr in ("mainKeyName", "dots", "space"):
+		value = getattr(gesture, attr, None)
+		if (value is not None):
+			out[attr] = value
+	return out
+
+def readSession(fileName):
+	"""Load a session file as a list of events."""
+	return [json.loads(line) for line in open(fileName) if line.strip()]
+
+class ReplayGesture(object):
+	"""Stands in for a recorded gesture when a session is played back."""
+
+	keyLabels = []
+
+	def __init__(self, recorded):
+		recorded = recorded or {}
+		self.displayName = recorded.get('displayName', "")
+		self.mainKeyName = recorded.get('mainKeyName')
+		self.dots = recorded.get('dots', 0)
+		self.space = recorded.get('space', False)
+
+	def _get_displayName(self):
+		return self.displayName
+
+	def send(self):
+		pass
+
+class SessionReplayer(object):
+	"""Plays a session back against an app module.
+
+	desktop must make the recorded panes visible to the app module: it needs
+	setPanes(panes), taking a dictionary of EF_* identifier to pane text, and
+	setFocus(pane, caret). countFrames is a callable returning how many frames
+	the display driver has written so far. If given, settle is called after
+	each gesture and waits for any work the script left running in the
+	background, so that work is included in the gesture's time."""
+
+	def __init__(self, events, appModule, desktop, countFrames, settle=None):
+		self.events = events
+		self.appModule = appModule
+		self.desktop = desktop
+		self.countFrames = countFrames
+		self.settle = settle
+
+	def run(self, realTime=False):
+		"""Replay every event. Returns a list of (event, script, wall seconds, CPU seconds, frames written)."""
+		results = []
+		start = time.time()
+		for ev in self.events:
+			if (realTime):
+				delay = ev['t'] - (time.time() - start)
+				if (delay > 0): time.sleep(delay)
+			kind = ev['event']
+			if (kind == "panes"):
+				self.desktop.setPanes(dict((int(k), v) for k, v in ev['panes'].items()))
+			elif (kind == "gesture" and ev['script'] not in UNRECORDED_SCRIPTS):
+				focus = ev.get('focus') or {}
+				self.desktop.setFocus(focus.get('pane'), focus.get('caret'))
+				script = getattr(self.appModule, "script_" + ev['script'])
+				results.append(("gesture", ev['script']) + self.measure(script, ReplayGesture(ev['gesture'])))
+			elif (kind == "tick"):
+				results.append(("tick", "updateRegisters") + self.measure(self.appModule.updateRegisters))
+		return results
+
+	def measure(self, func, *args):
+		frames = self.countFrames()
+		cpu = cpuTime()
+		wall = time.time()
+		func(*args)
+		if (self.settle is not None): self.settle()
+		return (time.time() - wall, cpuTime() - cpu, self.countFrames() - frames)
+
+def cpuTime():
+	"""User plus system CPU time of this process, in seconds."""
+	t = os.times()
+	return t[0] + t[1]
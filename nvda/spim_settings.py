@@ -0,0 +1,89 @@
+# PC Spim Configuration Dialog
+# Support module for the PC Spim App Module
+# by Flint Million <flint.million@mnsu.edu>
+
+# The register configuration dialog. It lives in its own module so that wx and
+# NVDA's settings dialog machinery are only imported when the dialog is opened.
+
+import wx
+import config
+from gui import settingsDialogs
+import spim_watch
+
+class SpimSettingsDialog(settingsDialogs.SettingsDialog):
+	# Translators: This is the label for the synthesizer dialog.
+	title = _("PCSpim Access Configuration")
+
+	def __init__(self, parent, regs, numOfRegs, renderings=(("hex", "hex"),)):
+
+		self.numOfRegs = numOfRegs
+		self.Regs = ['none']
+		self.Regs.extend(regs) # in the Registers window's order
+		# (name, label) for each way a slot can show numbers; the first is the default
+		self.renderings = list(renderings)
+
+		super(SpimSettingsDialog, self).__init__(parent)
+
+	def makeSettings(self, settingsSizer):
+		# Translators: This is a label for the select
+		# synthesizer combobox in the synthesizer dialog.
+		regs = {}
+		self.lists = {}
+		self.modeLists = {}
+		for r in range(self.numOfRegs):
+			# create dictionary subdir
+			regs[r] = {}
+
+			# create sizer for register line
+			regs[r]['ListSizer']=wx.BoxSizer(wx.HORIZONTAL)
+			regs[r]['Label']=wx.StaticText(self,-1,label=_("Register #&%d:" % r))
+			regs[r]['ListID']=wx.NewId()
+			# A register can be picked, or a watch expression typed.
+			self.lists[r]=wx.ComboBox(self,regs[r]['ListID'],choices=self.Regs,style=wx.CB_DROPDOWN)
+			try:
+				self.lists[r].SetValue(config.conf['pcspim']["r%d" % r])
+			except:
+				self.lists[r].SetValue(self.Regs[0])
+			regs[r]['ModeLabel']=wx.StaticText(self,-1,label=_("Shown as:"))
+			self.modeLists[r]=wx.Choice(self,wx.NewId(),choices=[label for name, label in self.renderings])
+			names=[name for name, label in self.renderings]
+			try:
+				self.modeLists[r].SetSelection(names.index(config.conf['pcspim']["m%d" % r]))
+			except:
+				self.modeLists[r].SetSelection(0)
+			regs[r]['ListSizer'].Add(regs[r]['Label'])
+			regs[r]['ListSizer'].Add(self.lists[r])
+			regs[r]['ListSizer'].Add(regs[r]['ModeLabel'])
+			regs[r]['ListSizer'].Add(self.modeLists[r])
+			settingsSizer.Add(regs[r]['ListSizer'],border=10,flag=wx.BOTTOM)
+
+	def postInit(self):
+		try:
+			self.lists[0].SetFocus()
+		except:
+			pass
+
+	def onOk(self,evt):
+		#Does the config file contain SPIM data already?
+		if ("pcspim" not in config.conf.keys()):
+			config.conf["pcspim"] = {}
+
+		# Check typed watch expressions before saving anything.
+		for r in range(self.numOfRegs):
+			value=self.lists[r].GetValue().strip()
+			if (value in self.Regs or value==''): continue
+			try:
+				spim_watch.compileExpression(value)
+			except spim_watch.WatchError, e:
+				wx.MessageBox(_("Register #%d: %s is not a register or a watch expression (%s).") % (r, value, e), _("Error"), wx.OK|wx.ICON_ERROR, self)
+				self.lists[r].SetFocus()
+				return
+
+		for r in range(self.numOfRegs):
+			value=self.lists[r].GetValue().strip()
+			config.conf["pcspim"]["r%d" % r]=value
+			if (value in ('none','')):
+				del config.conf['pcspim']["r%d" % r]
+			config.conf["pcspim"]["m%d" % r]=self.renderings[max(self.modeLists[r].GetSelection(), 0)][0]
+
+		super(SpimSettingsDialog, self).onOk(evt)
@@ -0,0 +1,170 @@
+# PC Spim Source Index
+# Support module for the PC Spim App Module
+# by Flint Million <flint.million@mnsu.edu>
+
+# Links the instructions in PCSpim's Code window back to the lines of the .s
+# files they came from. PCSpim ends the first instruction made from each
+# source statement with a comment giving the statement's line number and text:
+#
+#   [0x00400024]	0x3c011001  lui $1, 4097 [starting]             ; 17: la $a0, starting
+#   [0x00400028]	0x34240000  ori $4, $1, 0 [starting]
+#
+# Lines without a comment, like the ori above, are the rest of a
+# pseudo-instruction's expansion and belong to the same statement. Since the
+# Code window mixes the trap file with the user's program, each comment is
+# matched against the source files to find which one it came from.
+#
+# The index is built once per loaded program and answers, in constant time,
+# which source line an address came from and which addresses a source line
+# became.
+#
+# This module has no NVDA dependencies.
+
+import re, bisect
+
+CODE_LINE = re.compile(r"^\[0x([0-9a-f]{8})\]\t0x([0-9a-f]{8})  ([^;]*?)\s*(?:;\s*(\d+):\s?(.*))?$")
+LABEL = re.compile(r"^\s*([A-Za-z_.$][\w.$]*)\s*:")
+
+# Directives that lay out data. Labels on them name data, not the code below.
+DATA_DIRECTIVES = (".ascii", ".asciiz", ".byte", ".half", ".word", ".float", ".double", ".space")
+
+def normalize(text):
+	"""Collapse runs of white space, for comparing source lines."""
+	return " ".join(text.split())
+
+def splitComment(text):
+	"""Split a source line into its statement and its '#' comment, leaving '#' inside strings alone."""
+	inString = False
+	for i, c in enumerate(text):
+		if (c == '"' and (i == 0 or text[i-1] != "\\")):
+			inString = not inString
+		elif (c == "#" and not inString):
+			return text[:i].strip(), text[i+1:].strip()
+	return text.strip(), ""
+
+def splitLabels(statement):
+	"""Split the labels off the front of a statement. Returns (labels, rest)."""
+	labels = []
+	while (True):
+		m = LABEL.match(statement)
+		if (m is None): return labels, statement.strip()
+		labels.append(m.group(1))
+		statement = statement[m.end():]
+
+class SourceLine(object):
+	"""One line of a source file, as it relates to the code."""
+
+	def __init__(self, fileName, number, text, labels, directives):
+		self.fileName = fileName # None if the source file couldn't be found
+		self.number = number
+		self.text = text
+		statement, self.comment = splitComment(text)
+		ownLabels, self.statement = splitLabels(statement)
+		# Labels naming this statement, including those on lines of their own just above it
+		self.labels = labels + ownLabels
+		# Directives just above the statement, such as ".text" or ".globl main"
+		self.directives = directives
+
+class SourceIndex(object):
+	"""Maps addresses in the Code window to source lines and back."""
+
+	def __init__(self, codeText, sources=None, programFile=None):
+		# sources is a dictionary of file name to source text. programFile is the
+		# user's program, preferred when a line number is given without a file.
+		self.codeText = codeText
+		self.programFile = programFile
+		self.sources = dict((name, text.replace("\r\n", "\n").split("\n")) for name, text in (sources or {}).items())
+		self.byAddress = {} # address -> (file name, line number)
+		self.byLine = {} # (file name, line number) -> [addresses]
+		self.offsets = {} # address -> offset of its line in the Code window text
+		self.instructions = {} # address -> (encoded word, instruction text)
+		self.comments = {} # address -> Code window comment ("17: la $a0, starting"), for lines that have one
+		self.lineStarts = [] # offsets of the instruction lines, in order
+		self.lineEnds = []
+		self.lineAddresses = []
+		self.commentText = {} # (None, line number) -> text, for lines from unknown files
+		self.lines = {} # (file name, line number) -> SourceLine, built on demand
+		self.build()
+
+	def build(self):
+		current = None
+		offset = 0
+		for line in self.codeText.split("\n"):
+			m = CODE_LINE.match(line.rstrip("\r"))
+			if (m is None):
+				current = None # segment heading or blank line
+			else:
+				address = int(m.group(1), 16)
+				if (m.group(4) is not None):
+					current = self.findSource(int(m.group(4)), m.group(5))
+				if (current is not None):
+					self.byAddress[address] = current
+					self.byLine.setdefault(current, []).append(address)
+				self.offsets[address] = offset
+				self.instructions[address] = (int(m.group(2), 16), m.group(3))
+				if (m.group(4) is not None): self.comments[address] = "%s: %s" % (m.group(4), m.group(5).strip())
+				self.lineStarts.append(offset)
+				self.lineEnds.append(offset + len(line))
+				self.lineAddresses.append(address)
+			offset += len(line) + 1
+
+	def findSource(self, number, text):
+		"""Work out which source file a Code window comment came from."""
+		wanted = normalize(text)
+		for name, lines in self.sources.items():
+			if (number <= len(lines) and normalize(lines[number - 1]) == wanted):
+				return (name, number)
+		self.commentText[(None, number)] = text.strip()
+		return (None, number)
+
+	def lookup(self, address):
+		"""The SourceLine an address came from, or None."""
+		key = self.byAddress.get(address)
+		if (key is None): return None
+		line = self.lines.get(key)
+		if (line is None):
+			line = self.lines[key] = self.makeLine(*key)
+		return line
+
+	def makeLine(self, fileName, number):
+		if (fileName is None):
+			return SourceLine(None, number, self.commentText[(None, number)], [], [])
+		lines = self.sources[fileName]
+		labels, directives = [], []
+		# Walk up through label-only, directive, comment and blank lines.
+		n = number - 2
+		while (n >= 0):
+			statement = splitComment(lines[n])[0]
+			ownLabels, rest = splitLabels(statement)
+			if (rest and (not rest.startswith(".") or rest.split()[0] in DATA_DIRECTIVES)): break
+			labels[0:0] = ownLabels
+			if (rest): directives.insert(0, rest)
+			n -= 1
+		return SourceLine(fileName, number, lines[number - 1].strip(), labels, directives)
+
+	def addresses(self, number, fileName=None):
+		"""The addresses of the instructions a source line became. Empty if none."""
+		if (fileName is not None):
+			return self.byLine.get((fileName, number), [])
+		for name in (self.programFile, None):
+			found = self.byLine.get((name, number))
+			if (found): return found
+		return []
+
+	def instruction(self, address):
+		"""(encoded word, instruction text) at an address, or None."""
+		return self.instructions.get(address)
+
+	def offset(self, address):
+		"""Offset of the address's line in the Code window text, or None."""
+		return self.offsets.get(address)
+
+	def comment(self, address):
+		"""The Code window comment on an address's line, or an empty string."""
+		return self.comments.get(address, "")
+
+	def addressAt(self, offset):
+		"""The address of the instruction whose line holds an offset in the Code window text, or None."""
+		n = bisect.bisect_right(self.lineStarts, offset) - 1
+		if (n < 0 or offset > self.lineEnds[n]): return None
+		return self.lineAddresses[n]
@@ -0,0 +1,132 @@
+# PC Spim Stack Frames
+# Support module for the PC Spim App Module
+# by Flint Million <flint.million@mnsu.edu>
+
+# Works out the frames on the stack from $sp, the PC and the stack words in
+# the memory model. Programs for spim rarely keep a frame pointer, so frames
+# are found by their saved return addresses instead: a word on the stack is
+# taken to be a saved $ra if it points just past a jal or jalr in the Code
+# window. Each saved $ra ends the frame of the function it was saved by, and
+# names the function below it on the stack, the caller.
+#
+# The return address slots found on each page of the stack are remembered
+# along with the page's checksum, so after a step only the stack pages that
+# changed are looked at again. That keeps the view cheap to update in live
+# mode even with thousands of frames of recursion.
+#
+# This module has no NVDA dependencies.
+
+# The stack grows down from here.
+STACK_TOP = 0x80000000
+# User code lies in this range; anything else can't be a return address.
+TEXT_BASE = 0x00400000
+TEXT_LIMIT = 0x10000000
+
+class StackFrame(object):
+	"""One function's part of the stack, from start up to (not including) end."""
+
+	def __init__(self, function, start, end, raSlot, returnAddress):
+		self.function = function # name of the function, or None if there is no symbol for it
+		self.start = start
+		self.end = end
+		self.raSlot = raSlot # where the return address is saved, or None for the outermost frame
+		self.returnAddress = returnAddress
+		self.framePointer = False # whether $fp points into this frame
+
+	@property
+	def size(self):
+		return self.end - self.start
+
+	def __repr__(self):
+		return "<StackFrame %s 0x%08x..0x%08x ra=%s>" % (self.function, self.start, self.end, None if self.returnAddress is None else "0x%08x" % self.returnAddress)
+
+class StackView(object):
+	"""The stack frames of the running program, and which one the user is looking at.
+
+	Only the return address slots are kept; frames are made from them as
+	they are asked for."""
+
+	def __init__(self):
+		self.selected = 0 # frame index, 0 being the innermost
+		self.code = None # the source index return addresses were checked against
+		self.pages = {} # page start -> (checksum, [(address, saved return address)])
+		self.returnSlots = [] # (address, saved return address) from $sp up, in order
+		self.sp = self.fp = 0
+		self.symbols = None
+		self.function = None # the function the PC is in
+		self.signature = None
+
+	def isReturnAddress(self, value):
+		"""Whether value could be a return address: just past a jal or jalr."""
+		if (value & 3 or not TEXT_BASE <= value < TEXT_LIMIT): return False
+		if (self.code is None): return True
+		found = self.code.instruction(value - 4)
+		return found is not None and found[1].startswith("jal")
+
+	def update(self, memory, sp, fp, pc, symbols, code=None):
+		"""Bring the frames up to date with the memory model and registers. Returns True if they changed.
+
+		code is the program's source index, used to check return addresses."""
+		if (code is not self.code):
+			self.code = code
+			self.pages = {}
+		starts = memory.pagesBetween(sp, STACK_TOP)
+		pages = {}
+		for start in starts:
+			checksum = memory.checksum(start)
+			cached = self.pages.get(start)
+			if (cached is None or cached[0] != checksum):
+				words = memory.pageWords(start)
+				cached = (checksum, sorted((address, value) for address, value in words.iteritems() if self.isReturnAddress(value)))
+			pages[start] = cached
+		self.pages = pages
+		signature = (sp, fp, pc, symbols, tuple(pages[start][0] for start in starts))
+		if (signature == self.signature): return False
+		self.signature = signature
+		slots = []
+		for start in starts:
+			slots.extend(pages[start][1])
+		# The first and last pages can hold words outside the stack.
+		first = 0
+		while (first < len(slots) and slots[first][0] < sp): first += 1
+		last = len(slots)
+		while (last > first and slots[last - 1][0] >= STACK_TOP): last -= 1
+		self.returnSlots = slots[first:last]
+		self.sp, self.fp, self.symbols = sp, fp, symbols
+		self.function = functionName(symbols, pc)
+		self.selected = min(self.selected, len(self.returnSlots))
+		return True
+
+	def __len__(self):
+		return len(self.returnSlots) + 1 if (self.symbols is not None) else 0
+
+	def frame(self, index):
+		"""Frame number index, counting out from the innermost (0)."""
+		if (index == 0):
+			start, function = self.sp, self.function
+		else:
+			address, value = self.returnSlots[index - 1]
+			start, function = address + 4, functionName(self.symbols, value)
+		if (index < len(self.returnSlots)):
+			raSlot, returnAddress = self.returnSlots[index]
+			frame = StackFrame(function, start, raSlot + 4, raSlot, returnAddress)
+		else:
+			frame = StackFrame(function, start, max(start, STACK_TOP), None, None)
+		frame.framePointer = frame.start <= self.fp < frame.end
+		return frame
+
+	def current(self):
+		"""The selected frame, or None."""
+		return self.frame(self.selected) if (len(self)) else None
+
+	def move(self, delta):
+		"""Select the frame delta frames out (positive) or in (negative). Returns False at either end."""
+		wanted = self.selected + delta
+		if (not 0 <= wanted < len(self)): return False
+		self.selected = wanted
+		return True
+
+def functionName(symbols, address):
+	"""The name of the function an address is in, or None."""
+	found = symbols.lookup(address)
+	return found[0] if (found is not None) else None
@@ -0,0 +1,124 @@
+# PC Spim Status Reader
+# Support module for the PC Spim App Module
+# by Flint Million <flint.million@mnsu.edu>
+
+# Picks the messages worth announcing out of PCSpim's Status (Messages)
+# window, which PCSpim only ever appends to:
+#
+#   SPIM Version 9.1.4 of January 20, 2013
+#   ...
+#   C:\Program Files\PCSpim\exceptions.s successfully loaded
+#   spim: (parser) syntax error on line 12 of file C:\work\lab3.s
+#         add $t0, $t1
+#   Exception occurred at PC=0x0040002c
+#     Bad address in data/stack read: 0x00000000
+#
+# The reader keeps the offset it has read up to, so each update parses only
+# the text added since. Indented lines continue the message above them. The
+# caller can pass the window's length first, which lets an unchanged window
+# be skipped without fetching its text at all.
+#
+# This module has no NVDA dependencies.
+
+import re, threading
+
+EXCEPTION = "exception"
+ERROR = "error"
+BREAKPOINT = "breakpoint"
+LOADED = "loaded"
+OTHER = "other"
+
+# Kinds that are announced
+SIGNIFICANT = (EXCEPTION, ERROR, BREAKPOINT)
+
+# First match wins.
+CLASSIFIERS = [
+	(EXCEPTION, re.compile(r"^Exception\b")),
+	(BREAKPOINT, re.compile(r"[Bb]reakpoint")),
+	(ERROR, re.compile(r"^spim: |\berror\b|[Uu]ndefined|^Cannot |^Can't |^Instruction references")),
+	(LOADED, re.compile(r"^Loaded: | successfully loaded\s*$")),
+]
+
+# The file named by a LOADED line. PCSpim writes "<file> successfully loaded";
+# some builds write "Loaded: <file>" instead.
+LOADED_FILE = re.compile(r"^(?:Loaded: (.+?)|(.+?) successfully loaded)\s*$", re.M)
+
+# Characters kept from just before the offset, to notice the window being cleared or replaced
+TAIL_SIZE = 64
+
+def classify(line):
+	for kind, pattern in CLASSIFIERS:
+		if (pattern.search(line)): return kind
+	return OTHER
+
+def loadedFiles(text):
+	"""The files the Status window text says were loaded, in order."""
+	return [loaded or successful for loaded, successful in LOADED_FILE.findall(text)]
+
+class StatusMessage(object):
+	"""One message from the Status window, with its continuation lines."""
+
+	def __init__(self, kind, text):
+		self.kind = kind
+		self.text = text
+
+	def __repr__(self):
+		return "<StatusMessage %s: %r>" % (self.kind, self.text)
+
+class StatusReader(object):
+	"""Reads the Status window incrementally."""
+
+	# Significant messages kept for reciting later
+	historySize = 20
+
+	def __init__(self):
+		self.offset = None # None until the first read
+		self.length = None
+		self.tail = ""
+		self.history = []
+		self.lock = threading.Lock()
+
+	def unchanged(self, length):
+		"""Whether a window of this length is the one last read, so its text needn't be fetched."""
+		return length == self.length
+
+	def update(self, text):
+		"""Take in the window's text. Returns the new significant messages, oldest first.
+
+		The first update only records where the text ends (keeping its significant
+		messages in the history), and returns an empty list."""
+		with self.lock:
+			if (text is None): return []
+			first = self.offset is None
+			offset = self.offset or 0
+			if (len(text) < offset or text[max(offset - TAIL_SIZE, 0):offset] != self.tail):
+				offset = 0 # cleared, or a new program loaded
+			elif (len(text) == self.length):
+				return []
+			# Only whole lines are read; a line still being written is read next time.
+			end = text.rfind("\n", offset) + 1
+			messages = parse(text[offset:end]) if (end > offset) else []
+			self.offset = end if (end > offset) else offset
+			self.length = len(text)
+			self.tail = text[max(self.offset - TAIL_SIZE, 0):self.offset]
+			significant = [m for m in messages if m.kind in SIGNIFICANT]
+			self.history = (self.history + significant)[-self.historySize:]
+			return [] if (first) else significant
+
+def parse(text):
+	"""The messages in whole lines of Status window text."""
+	messages = []
+	for line in text.split("\n"):
+		line = line.rstrip("\r")
+		if (not line.strip()): continue
+		# Indented lines say more about the message above, such as what an exception was.
+		if (line[0] in " \t" and messages):
+			messages[-1].text += " " + line.strip()
+			continue
+		kind = classify(line)
+		# So do plain lines after one ending in a colon, such as the names after "The following symbols are undefined:".
+		if (kind == OTHER and messages and messages[-1].kind != OTHER and messages[-1].text.endswith(":")):
+			messages[-1].text += " " + line.strip()
+			continue
+		messages.append(StatusMessage(kind, line.strip()))
+	return messages
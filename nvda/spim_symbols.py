@@ -0,0 +1,164 @@
+# PC Spim Symbol Table
+# Support module for the PC Spim App Module
+# by Flint Million <flint.million@mnsu.edu>
+
+# Names for addresses, so the add-on can say "main plus 8" or "starting"
+# instead of reading out eight hex digits. Symbols come from three places:
+#
+#  - Code labels: the labels on each source statement, placed at the first
+#    instruction the statement became (from the source index).
+#  - Data labels: laid out from the .data and .kdata directives of the
+#    source files, the same way spim lays them out.
+#  - The Code window itself: "la" becomes a lui/ori pair annotated with the
+#    label, and jal and j are annotated with theirs, which gives the actual
+#    address even when the source file can't be read.
+#
+# Addresses are kept in a sorted array, and looking up the symbol at or
+# before an address is a binary search. Results are remembered per address,
+# since the same addresses (the PC, pointers in registers) are looked up over
+# and over.
+#
+# This module has no NVDA dependencies.
+
+import re
+from array import array
+from bisect import bisect_right
+
+import spim_source
+
+# Where spim starts each segment
+SEGMENT_BASES = {'.data': 0x10010000, '.kdata': 0x90000000, '.text': 0x00400000, '.ktext': 0x80000180}
+
+LA_PAIR = re.compile(r"lui \$1, (\d+) \[([^\]\-]+)\][^\n]*\n[^\n]*?ori \$\d+, \$1, (\d+) \[\2\]")
+JUMP = re.compile(r"\bj(?:al)? 0x([0-9a-f]{8}) \[([^\]\-]+)\]")
+
+class SymbolTable(object):
+	"""Sorted addresses and their names."""
+
+	# Addresses further than this past a symbol aren't described in terms of it.
+	maxOffset = 0x1000
+	# Most lookup results to remember
+	cacheSize = 65536
+
+	def __init__(self, symbols=()):
+		pairs = sorted(set((address & 0xffffffff, name) for address, name in symbols))
+		# Keep one name per address; when labels share an address the first alphabetically is used.
+		self.addresses = array('I')
+		self.names = []
+		for address, name in pairs:
+			if (self.addresses and self.addresses[-1] == address): continue
+			self.addresses.append(address)
+			self.names.append(name)
+		self.byName = dict((name, address) for address, name in pairs)
+		self.cache = {}
+
+	def __len__(self):
+		return len(self.addresses)
+
+	def lookup(self, address):
+		"""Return (symbol, offset) for the nearest symbol at or before address, or None."""
+		try:
+			return self.cache[address]
+		except KeyError:
+			pass
+		found = None
+		i = bisect_right(self.addresses, address) - 1
+		if (i >= 0):
+			base = self.addresses[i]
+			offset = address - base
+			# Stay within the symbol's segment.
+			if (offset <= self.maxOffset and (address >> 28) == (base >> 28)):
+				found = (self.names[i], offset)
+		if (len(self.cache) >= self.cacheSize): self.cache.clear()
+		self.cache[address] = found
+		return found
+
+	def describe(self, address):
+		"""'symbol' or 'symbol+offset' for an address, or None."""
+		found = self.lookup(address)
+		if (found is None): return None
+		name, offset = found
+		return name if (offset == 0) else "%s+%d" % (name, offset)
+
+	def speak(self, address):
+		"""Like describe, but for speech: 'symbol plus offset'."""
+		found = self.lookup(address)
+		if (found is None): return None
+		name, offset = found
+		return name if (offset == 0) else "%s plus %d" % (name, offset)
+
+	def address(self, name):
+		return self.byName.get(name)
+
+def layoutData(lines):
+	"""Lay out the data segments of a source file. Returns a list of (address, label)."""
+	symbols = []
+	pc = dict(SEGMENT_BASES)
+	segment = '.text'
+	pending = []
+	for line in lines:
+		labels, rest = spim_source.splitLabels(spim_source.splitComment(line)[0])
+		pending.extend(labels)
+		if (not rest):
+			continue
+		parts = rest.split(None, 1)
+		directive = parts[0]
+		args = parts[1] if (len(parts) > 1) else ""
+		if (directive in SEGMENT_BASES):
+			segment = directive
+			if (args.strip()):
+				try:
+					pc[segment] = int(args.strip(), 0)
+				except ValueError:
+					pass
+			pending = []
+			continue
+		if (segment not in ('.data', '.kdata')):
+			pending = []
+			continue
+		try:
+			size, alignment = dataSize(directive, args)
+		except ValueError:
+			size, alignment = 0, 1
+		pc[segment] = (pc[segment] + alignment - 1) & ~(alignment - 1)
+		for label in pending:
+			symbols.append((pc[segment], label))
+		pending = []
+		pc[segment] += size
+	return symbols
+
+def dataSize(directive, args):
+	"""(size in bytes, alignment) of a data directive."""
+	values = lambda: [v for v in re.split(r"\s*,\s*|\s+", args.strip()) if v]
+	if (directive in (".ascii", ".asciiz")):
+		m = re.match(r'^\s*"((?:[^"\\]|\\.)*)"', args)
+		text = m.group(1).decode("string_escape") if m else ""
+		return len(text) + (directive == ".asciiz"), 1
+	if (directive == ".byte"): return len(values()), 1
+	if (directive == ".half"): return 2 * len(values()), 2
+	if (directive in (".word", ".float")): return 4 * len(values()), 4
+	if (directive == ".double"): return 8 * len(values()), 8
+	if (directive == ".space"): return int(args.strip(), 0), 1
+	if (directive == ".align"): return 0, 1 << int(args.strip(), 0)
+	return 0, 1
+
+def build(sourceIndex):
+	"""Build the symbol table for a program from its source index."""
+	symbols = []
+	# Code labels
+	for key, addresses in sourceIndex.byLine.items():
+		line = sourceIndex.lookup(addresses[0])
+		for label in line.labels:
+			symbols.append((min(addresses), label))
+	# Data labels
+	for name, lines in sourceIndex.sources.items():
+		symbols.extend(layoutData(lines))
+	# Addresses the Code window gives directly. These win over the layout above.
+	found = {}
+	for m in LA_PAIR.finditer(sourceIndex.codeText):
+		found[m.group(2)] = (int(m.group(1)) << 16) | int(m.group(3))
+	for m in JUMP.finditer(sourceIndex.codeText):
+		found[m.group(2)] = int(m.group(1), 16)
+	symbols = [(address, name) for address, name in symbols if name not in found]
+	symbols.extend((address, name) for name, address in found.items())
+	return SymbolTable(symbols)
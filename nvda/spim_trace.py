@@ -0,0 +1,169 @@
+# SPIM Braille Tracing
+# Structured event tracing for the SPIM Braille display drivers.
+# by Flint Million <flint.million@mnsu.edu>
+
+# This replaces the old UDP debugger in spim_focus. Instead of building debug
+# strings on every frame, drivers record small fixed-size event records into a
+# ring buffer, and only when tracing has been turned on.
+#
+# Every trace point MUST be guarded by the module flag, like this:
+#
+#   if spim_trace.enabled: spim_trace.record(spim_trace.EV_WRITE, len(cells), cells)
+#
+# With tracing off, a trace point costs one attribute lookup and nothing is
+# formatted, packed or sent.
+#
+# This module has no NVDA dependencies, so tools/spim_trace_viewer.py can
+# import it to decode records.
+
+import struct, socket, itertools, time
+
+# Set to True to start tracing as soon as the SPIM Braille drivers load.
+# In ALL enduser cases, this should be OFF.
+TRACE_ON_LOAD = False
+
+# Where to stream records while tracing. None keeps them in the ring buffer only.
+# A (host, port) tuple streams over UDP; a string names a Unix socket path
+# (not available on Windows).
+TRACE_EXPORT = ('127.0.0.1', 6287)
+
+# Default number of records kept in the ring buffer.
+DEFAULT_CAPACITY = 4096
+
+# Record layout: sequence number, timestamp, event ID, data length, value, data bytes.
+# Data longer than DATA_SIZE bytes is truncated; 96 bytes holds a full 80 cell frame.
+DATA_SIZE = 96
+RECORD_FORMAT = "<IdHHq%ds" % DATA_SIZE
+RECORD_SIZE = struct.calcsize(RECORD_FORMAT)
+
+# Event IDs
+EV_TRACE_START = 0 # value: ring capacity
+EV_TRACE_ERROR = 1 # the exporter failed and was detached
+EV_NVDA_CELLS = 10 # value: number of cells NVDA asked the driver to show
+EV_COMPOSE = 11 # value: cell count after register blocks were appended; data: cells
+EV_WRITE = 12 # value: cells written to the hardware; data: cells
+EV_NUM_TO_BRAILLE = 20 # value: number converted; data: resulting cells
+EV_WIZWHEEL_BURST = 30 # value: wheel units coalesced into one gesture
+EV_WATCH_UPDATE = 40 # value: microseconds to read memory for, work out and show the watch expressions in one update; data: number of watches
+
+EVENT_NAMES = {
+	EV_TRACE_START: "traceStart",
+	EV_TRACE_ERROR: "traceError",
+	EV_NVDA_CELLS: "nvdaCells",
+	EV_COMPOSE: "compose",
+	EV_WRITE: "write",
+	EV_NUM_TO_BRAILLE: "numToBraille",
+	EV_WIZWHEEL_BURST: "wizWheelBurst",
+	EV_WATCH_UPDATE: "watchUpdate",
+}
+
+# The switch checked at every trace point. Use enable() and disable() to change it.
+enabled = False
+
+# Ring buffer state
+_ring = None
+_capacity = 0
+_counter = None
+_exporter = None
+
+def enable(capacity=DEFAULT_CAPACITY, exportTo=None):
+	"""Start tracing into a fresh ring buffer of 'capacity' records, optionally streaming them to exportTo."""
+	global enabled, _ring, _capacity, _counter, _exporter
+	enabled = False
+	_capacity = capacity
+	_ring = bytearray(RECORD_SIZE * capacity)
+	# itertools.count hands out sequence numbers atomically under the GIL, so
+	# recording threads never need to take a lock.
+	_counter = itertools.count()
+	if (_exporter is not None): _exporter.close()
+	_exporter = makeExporter(exportTo) if (exportTo is not None) else None
+	enabled = True
+	record(EV_TRACE_START, capacity)
+
+def disable():
+	"""Stop tracing. Records already in the ring buffer are kept until the next enable()."""
+	global enabled, _exporter
+	enabled = False
+	if (_exporter is not None):
+		_exporter.close()
+		_exporter = None
+
+def record(event, value=0, data=""):
+	"""Record one event. Callers must check 'enabled' first."""
+	global _exporter
+	if (not isinstance(data, str)):
+		# Cell lists are the common case.
+		data = "".join([chr(x & 0xff) for x in data])
+	seq = _counter.next()
+	offset = (seq % _capacity) * RECORD_SIZE
+	struct.pack_into(RECORD_FORMAT, _ring, offset, seq & 0xffffffff, time.time(), event, min(len(data), DATA_SIZE), value, data)
+	if (_exporter is not None):
+		try:
+			_exporter.send(str(_ring[offset:offset+RECORD_SIZE]))
+		except Exception:
+			# Stop exporting, but keep tracing into the ring buffer.
+			exporter, _exporter = _exporter, None
+			exporter.close()
+			record(EV_TRACE_ERROR)
+
+def decode(raw, offset=0):
+	"""Decode a packed record into a (seq, timestamp, event, value, data) tuple."""
+	seq, timestamp, event, length, value, data = struct.unpack_from(RECORD_FORMAT, raw, offset)
+	return (seq, timestamp, event, value, data[:length])
+
+def records():
+	"""Return the records currently in the ring buffer, oldest first."""
+	if (_ring is None): return []
+	out = []
+	for slot in xrange(_capacity):
+		rec = decode(_ring, slot * RECORD_SIZE)
+		if (rec[1] != 0): out.append(rec) # never-written slots have a zero timestamp
+	out.sort()
+	return out
+
+def formatRecord(rec):
+	"""Produce a human-readable line for a decoded record."""
+	seq, timestamp, event, value, data = rec
+	line = "%d %.6f %s %d" % (seq, timestamp, EVENT_NAMES.get(event, "event%d" % event), value)
+	if (data):
+		line += ": " + " ".join([str(ord(c)) for c in data])
+	return line
+
+# Exporters
+
+class UdpExporter(object):
+	"""Streams packed records as UDP datagrams."""
+
+	def __init__(self, address):
+		self.address = address
+		self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_UDP)
+
+	def send(self, packed):
+		self.sock.sendto(packed, self.address)
+
+	def close(self):
+		self.sock.close()
+
+class UnixExporter(object):
+	"""Streams packed records as datagrams on a Unix socket."""
+
+	def __init__(self, path):
+		if (not hasattr(socket, "AF_UNIX")):
+			raise ValueError("Unix sockets are not available on this platform")
+		self.path = path
+		self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+
+	def send(self, packed):
+		self.sock.sendto(packed, self.path)
+
+	def close(self):
+		self.sock.close()
+
+def makeExporter(exportTo):
+	"""Create the exporter for a TRACE_EXPORT style destination."""
+	if (isinstance(exportTo, basestring)):
+		return UnixExporter(exportTo)
+	return UdpExporter(tuple(exportTo))
+
+if (TRACE_ON_LOAD == True):
+	enable(exportTo=TRACE_EXPORT)
@@ -0,0 +1,161 @@
+# SPIM Braille Virtual Display
+# A SPIM Braille driver with no hardware, for measuring the display path.
+# by Flint Million <flint.million@mnsu.edu>
+
+# Stands in for a Focus display of any size. Frames are laid out exactly as
+# spim_focus lays them out, then "written" to a simulated device that takes
+# a fixed time per write (latency) plus a time per cell (bandwidth). Nothing
+# sleeps: the device is modelled on the clock. A frame that arrives while the
+# device is still busy waits; if another arrives before it can be written, the
+# waiting frame is replaced and counted as coalesced.
+#
+# Every frame written is recorded with the times it was composed and written,
+# and stats() reports frames per second, bytes per frame, coalesced frames,
+# and the latency from a register being set to the frame showing it being
+# written. Like the Focus driver, it folds a WizWheel burst into one frame
+# (script_wizWheelScroll, in SPIMBraille).
+#
+# tools/spim_replay.py and tools/spim_bench.py drive the app module through
+# this driver. In NVDA it can be chosen as "SPIM Braille (Virtual)"; set the
+# module variables below to pick its size and speed.
+
+import time
+from collections import deque
+
+import SPIMBraille
+
+# Cell count NVDA's instance of the driver uses
+CELLS = 40
+# Simulated time to write one frame, in seconds, and cells written per second (None for no limit)
+LATENCY = 0.0
+BANDWIDTH = None
+# Most frames to keep in the recording
+RECORD_LIMIT = 100000
+
+def layout(numCells):
+	"""(register blocks, main cells, separators) for a display size, as spim_focus lays them out."""
+	if (numCells < 15):
+		# No room for separators; one register block if it fits.
+		registers = 1 if (numCells >= 14) else 0
+		return registers, numCells - 8 * registers, False
+	# Each block is 8 cells and a separator, and there is a separator at the end.
+	registers = max(0, (numCells - 4) // 18)
+	return registers, numCells - 9 * registers - 1, True
+
+class RecordedFrame(object):
+	"""One frame written to the virtual display."""
+
+	def __init__(self, cells, composed, written, changed):
+		self.cells = cells
+		self.composed = composed # when display() was given it
+		self.written = written # when the simulated write finished
+		self.changed = changed # when the earliest register change it shows was made, or None
+
+class BrailleDisplayDriver(SPIMBraille.SPIMBrailleDisplayDriver):
+	"""A SPIM Braille driver that records frames instead of writing them to hardware."""
+	name = "spim_virtual"
+	# Translators: The name of a braille display driver that shows nothing, for testing.
+	description = _("SPIM Braille (Virtual)")
+
+	@classmethod
+	def check(cls):
+		return True
+
+	def __init__(self, port="auto", numCells=None, latency=None, bandwidth=None, clock=time.time):
+		self.actualNumCells = numCells or CELLS
+		registers, self.numCells, self.separators = layout(self.actualNumCells)
+		self.registers = [None] * registers
+		self.lastCells = [0] * self.numCells
+		self.latency = LATENCY if (latency is None) else latency
+		self.bandwidth = BANDWIDTH if (bandwidth is None) else bandwidth
+		self.clock = clock
+		self.initWizWheels()
+		self.reset()
+
+	def reset(self):
+		"""Forget the recording and the statistics."""
+		self.recorded = deque(maxlen=RECORD_LIMIT)
+		self.frames = 0 # frames written
+		self.composed = 0 # frames given to display()
+		self.coalesced = 0 # frames replaced before they could be written
+		self.bytes = 0
+		self.busyUntil = 0.0
+		self.pending = None # (cells, composed, changed) waiting for the device
+		self.changedAt = None # when registers were first set since the last frame was composed
+
+	def terminate(self):
+		self.flush()
+		super(BrailleDisplayDriver, self).terminate()
+
+	# Register changes are time stamped, for the latency to the frame that shows them.
+
+	def setRegister(self, regNum, data, updateNow=True):
+		if (self.changedAt is None): self.changedAt = self.clock()
+		super(BrailleDisplayDriver, self).setRegister(regNum, data, updateNow)
+
+	def setBanks(self, banks, names):
+		if (self.changedAt is None): self.changedAt = self.clock()
+		super(BrailleDisplayDriver, self).setBanks(banks, names)
+
+	def display(self, cells):
+		cells = super(BrailleDisplayDriver, self).display(list(cells), not self.separators)
+		self.composed += 1
+		cells = "".join([chr(x) for x in cells])
+		# During a WizWheel burst only the latest frame is kept; it is written once the burst is done.
+		if (self.holdFrame(cells)): return
+		self._writeCells(cells)
+
+	def _writeCells(self, cells):
+		now = self.clock()
+		changed, self.changedAt = self.changedAt, None
+		self.advance(now)
+		if (self.pending is not None):
+			# The device is busy, and the frame already waiting will never be seen.
+			self.coalesced += 1
+			if (changed is None): changed = self.pending[2]
+		self.pending = (cells, now, changed)
+		self.advance(now)
+
+	def advance(self, now):
+		"""Write the waiting frame if the device is free by now."""
+		if (self.pending is None or self.busyUntil > now): return
+		cells, composed, changed = self.pending
+		self.pending = None
+		start = max(composed, self.busyUntil)
+		self.busyUntil = start + self.writeTime(len(cells))
+		self.write(cells, composed, self.busyUntil, changed)
+
+	def flush(self):
+		"""Write the waiting frame, if any, once the device is free."""
+		if (self.pending is not None): self.advance(max(self.busyUntil, self.pending[1]))
+
+	def writeTime(self, length):
+		"""Simulated seconds to write length cells."""
+		return self.latency + (float(length) / self.bandwidth if (self.bandwidth) else 0.0)
+
+	def write(self, cells, composed, written, changed):
+		self.frames += 1
+		self.bytes += len(cells)
+		self.recorded.append(RecordedFrame(cells, composed, written, changed))
+		self.frameWritten(cells)
+
+	def stats(self):
+		"""Statistics on the frames written so far, as a dictionary."""
+		self.flush()
+		frames = list(self.recorded)
+		span = (frames[-1].written - frames[0].composed) if (frames) else 0.0
+		latencies = [f.written - f.changed for f in frames if f.changed is not None]
+		return {
+			'frames': self.frames,
+			'composed': self.composed,
+			'coalesced': self.coalesced,
+			'framesPerSecond': (len(frames) / span) if (span > 0) else 0.0,
+			'bytesPerFrame': (float(self.bytes) / self.frames) if (self.frames) else 0.0,
+			'latencyMean': (sum(latencies) / len(latencies)) if (latencies) else 0.0,
+			'latencyMax': max(latencies) if (latencies) else 0.0,
+		}
+
+def formatStats(stats):
+	"""A one line summary of stats()."""
+	return "%(frames)d frames written of %(composed)d composed, %(coalesced)d coalesced; %(framesPerSecond).1f frames/s, %(bytesPerFrame).1f bytes/frame; latency mean %(latencyMs).2f ms, max %(latencyMaxMs).2f ms" % dict(stats,
+		latencyMs=stats['latencyMean'] * 1000.0, latencyMaxMs=stats['latencyMax'] * 1000.0)
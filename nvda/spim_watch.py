@@ -0,0 +1,204 @@
+# PC Spim Watch Expressions
+# Support module for the PC Spim App Module
+# by Flint Million <flint.million@mnsu.edu>
+
+# Expressions that can be shown in a register slot instead of a register:
+#
+#   $sp+8        a register plus a constant
+#   mem[$a0]     the word in memory at an address
+#   $t0-$t1      the difference of two registers
+#   label+4      the address of a label, plus a constant
+#   mem[buffer+4*2]
+#
+# Registers are written with a '$' ($t0, $sp, $fp, $4) or by their bare name
+# (t0, sp). Other names are labels from the symbol table. Numbers are decimal
+# (a leading 0 doesn't make one octal) or hex (0x...). '+', '-' and '*' work
+# on 32-bit words, and parentheses group.
+#
+# An expression is compiled once, into a tree of small closures, so
+# evaluating it on every live mode update is a handful of function calls and
+# no parsing. Expressions are limited to MAX_NODES parts, which keeps each
+# one's cost per update bounded.
+#
+# This module has no NVDA dependencies.
+
+import re
+
+from spim_registers import GENERAL_NAMES, INTEGER_NAMES, INTEGER_SLOTS
+
+# Longest expression, in numbers, names, memory reads and operators
+MAX_NODES = 32
+
+# A number token runs on to the end of the word, so "12ab" is one bad number rather than 12 and a label.
+TOKEN = re.compile(r"\s*(?:(\d[\w.]*)|\$(\w+)|([A-Za-z_.][\w.]*)|(\S))")
+HEX_NUMBER = re.compile(r"0[xX][0-9a-fA-F]+$")
+DECIMAL_NUMBER = re.compile(r"\d+$")
+
+# Register names the window doesn't use
+REGISTER_ALIASES = {"fp": "s8", "zero": "r0"}
+
+class WatchError(ValueError):
+	"""An expression that can't be compiled."""
+
+class UnknownLabel(Exception):
+	"""A label the symbol table doesn't have, found while evaluating."""
+
+class Watch(object):
+	"""A compiled watch expression."""
+
+	def __init__(self, text, func, usesMemory, registers):
+		self.text = text
+		self.func = func
+		# Whether the memory model has to be current to evaluate it
+		self.usesMemory = usesMemory
+		# Names of the registers it reads
+		self.registers = registers
+
+	def value(self, regs, memory, symbols):
+		"""The expression's value, from a RegisterFile, a MemoryModel and a SymbolTable. None if a label is unknown."""
+		try:
+			return self.func(regs.ints, memory, symbols)
+		except UnknownLabel:
+			return None
+
+def registerSlot(name):
+	"""The RegisterFile slot of a register name ('t0', 'fp', '4'), or None."""
+	name = name.lower()
+	if (name.isdigit()):
+		number = int(name)
+		return number if (number < len(GENERAL_NAMES)) else None
+	return INTEGER_SLOTS.get(REGISTER_ALIASES.get(name, name))
+
+def parseNumber(text):
+	"""The value of a number token. Raises WatchError if it isn't a decimal or hex number."""
+	if (HEX_NUMBER.match(text)): return int(text, 16)
+	if (DECIMAL_NUMBER.match(text)): return int(text, 10)
+	raise WatchError("bad number %s" % text)
+
+def tokenize(text):
+	tokens = []
+	pos = 0
+	text = text.rstrip()
+	while (pos < len(text)):
+		m = TOKEN.match(text, pos)
+		number, register, name, other = m.groups()
+		if (number is not None): tokens.append(("number", parseNumber(number)))
+		elif (register is not None): tokens.append(("register", register))
+		elif (name is not None): tokens.append(("name", name))
+		elif (ord(other) > 127): raise WatchError("unexpected character at position %d" % (m.end() - 1))
+		else: tokens.append(("op", other))
+		pos = m.end()
+	return tokens
+
+class Compiler(object):
+	"""A recursive descent parser that builds closures as it goes."""
+
+	def __init__(self, text):
+		self.text = text
+		self.tokens = tokenize(text)
+		self.pos = 0
+		self.nodes = 0
+		self.usesMemory = False
+		self.registers = []
+
+	def compile(self):
+		if (not self.tokens): raise WatchError("empty expression")
+		node = self.expression()
+		if (self.pos < len(self.tokens)):
+			raise WatchError("unexpected %s" % str(self.tokens[self.pos][1]))
+		func = node[1] if (node[0] is None) else constant(node[0])
+		return Watch(self.text, func, self.usesMemory, self.registers)
+
+	def peek(self):
+		return self.tokens[self.pos] if (self.pos < len(self.tokens)) else (None, None)
+
+	def take(self, op):
+		if (self.peek() != ("op", op)): raise WatchError("expected %s" % op)
+		self.pos += 1
+
+	def count(self):
+		self.nodes += 1
+		if (self.nodes > MAX_NODES): raise WatchError("expression is too long")
+
+	# Each method returns (constant value, None) or (None, closure), so
+	# constant parts are worked out here rather than on every update.
+
+	def expression(self):
+		left = self.product()
+		while (self.peek() in (("op", "+"), ("op", "-"))):
+			op = self.peek()[1]
+			self.pos += 1
+			self.count()
+			left = combine(op, left, self.product())
+		return left
+
+	def product(self):
+		left = self.unary()
+		while (self.peek() == ("op", "*")):
+			self.pos += 1
+			self.count()
+			left = combine("*", left, self.unary())
+		return left
+
+	def unary(self):
+		if (self.peek() == ("op", "-")):
+			self.pos += 1
+			self.count()
+			return combine("-", (0, None), self.unary())
+		return self.atom()
+
+	def atom(self):
+		kind, value = self.peek()
+		if (kind is None): raise WatchError("expression ends too soon")
+		self.pos += 1
+		self.count()
+		if (kind == "number"):
+			return (value & 0xffffffff, None)
+		if (kind == "op" and value == "("):
+			inner = self.expression()
+			self.take(")")
+			return inner
+		if (kind == "name" and value.lower() == "mem" and self.peek() == ("op", "[")):
+			self.pos += 1
+			address = self.expression()
+			self.take("]")
+			self.usesMemory = True
+			if (address[0] is not None):
+				fixed = address[0]
+				return (None, lambda ints, memory, symbols: memory.read(fixed))
+			addressFunc = address[1]
+			return (None, lambda ints, memory, symbols: memory.read(addressFunc(ints, memory, symbols)))
+		if (kind == "register" or (kind == "name" and registerSlot(value) is not None)):
+			slot = registerSlot(value)
+			if (slot is None): raise WatchError("no register %s" % value)
+			self.registers.append(INTEGER_NAMES[slot])
+			return (None, lambda ints, memory, symbols: ints[slot])
+		if (kind == "name"):
+			return (None, labelFunc(value))
+		raise WatchError("unexpected %s" % value)
+
+def labelFunc(name):
+	def label(ints, memory, symbols):
+		address = symbols.address(name)
+		if (address is None): raise UnknownLabel(name)
+		return address
+	return label
+
+def constant(value):
+	return lambda ints, memory, symbols: value
+
+def combine(op, left, right):
+	"""Join two parts with an operator, folding them if both are constant."""
+	if (left[0] is not None and right[0] is not None):
+		if (op == "+"): return ((left[0] + right[0]) & 0xffffffff, None)
+		if (op == "-"): return ((left[0] - right[0]) & 0xffffffff, None)
+		return ((left[0] * right[0]) & 0xffffffff, None)
+	a = left[1] or constant(left[0])
+	b = right[1] or constant(right[0])
+	if (op == "+"): return (None, lambda ints, memory, symbols: (a(ints, memory, symbols) + b(ints, memory, symbols)) & 0xffffffff)
+	if (op == "-"): return (None, lambda ints, memory, symbols: (a(ints, memory, symbols) - b(ints, memory, symbols)) & 0xffffffff)
+	return (None, lambda ints, memory, symbols: (a(ints, memory, symbols) * b(ints, memory, symbols)) & 0xffffffff)
+
+def compileExpression(text):
+	"""Compile an expression into a Watch. Raises WatchError if it isn't valid."""
+	return Compiler(text).compile()
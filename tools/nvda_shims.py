@@ -0,0 +1,352 @@
+# NVDA Stand-in Modules
+# by Flint Million <flint.million@mnsu.edu>
+
+# The add-on imports NVDA's own modules (api, ui, braille, config, ...) and a
+# few Windows-only ones (wx, win32clipboard, ctypes.windll). None of these exist outside a
+# running copy of NVDA on Windows. install() registers small stand-ins for
+# them, just enough for the app module and the SPIM Braille drivers to be
+# imported and driven by the tools in this directory on any machine.
+#
+# The stand-ins record what the add-on asked for (spoken messages, tones,
+# clipboard text) in the 'state' object so tools can report on it.
+
+import sys, os, time, types, logging, ctypes, __builtin__
+
+NVDA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "nvda")
+
+class ShimState(object):
+	"""What the add-on did through the stand-ins."""
+
+	def __init__(self):
+		self.reset()
+
+	def reset(self):
+		self.messages = []
+		self.beeps = []
+		self.clipboard = None
+		self.keys = []
+		# Called with the name of each key the add-on sends, if set
+		self.keyHandler = None
+		# What scriptHandler.getLastScriptRepeatCount returns; set it to fake a repeated press
+		self.repeatCount = 0
+		# Gestures passed on to NVDA's own routing
+		self.routed = []
+		# Calls waiting in wx.CallLater, as (when, func, args, kwargs)
+		self.timers = []
+		# Gestures given to inputCore.manager.executeGesture
+		self.gestures = []
+		# Called with each of those gestures instead, if set
+		self.gestureHandler = None
+		# Windows timers set with SetTimer: (window, timer id) -> milliseconds
+		self.windowTimers = {}
+
+state = ShimState()
+
+def _module(name, **attrs):
+	mod = types.ModuleType(name)
+	mod.__dict__.update(attrs)
+	sys.modules[name] = mod
+	return mod
+
+# baseObject
+
+class ScriptableObject(object):
+	"""Binds gestures from __gestures dictionaries the way NVDA does."""
+
+	def __init__(self):
+		self._gestureMap = {}
+		for cls in reversed(type(self).__mro__):
+			gestures = cls.__dict__.get("_%s__gestures" % cls.__name__, {})
+			for gestureId, scriptName in gestures.items():
+				self.bindGesture(gestureId, scriptName)
+
+	def bindGesture(self, gestureId, scriptName):
+		func = getattr(self, "script_%s" % scriptName)
+		self._gestureMap[gestureId.lower()] = func.__func__
+
+	def clearGestureBindings(self):
+		self._gestureMap = {}
+
+	def getScript(self, gesture):
+		for gestureId in getattr(gesture, "identifiers", ()):
+			func = self._gestureMap.get(gestureId.lower())
+			if (func is not None):
+				return types.MethodType(func, self, self.__class__)
+		return None
+
+# appModuleHandler
+
+class AppModule(ScriptableObject):
+
+	def __init__(self, processID, appName=None):
+		super(AppModule, self).__init__()
+		self.processID = processID
+		self.appName = appName
+
+# NVDAObjects
+
+class NVDAObject(object):
+
+	def event_valueChange(self):
+		pass
+
+# braille
+
+class BrailleDisplayDriver(object):
+	name = ""
+	description = ""
+	numCells = 0
+
+	def terminate(self):
+		pass
+
+class BrailleHandler(object):
+	display = None
+	# What NVDA would be showing, as rows of cells, and the part of it on the display
+	rows = [[(row * 7 + n) & 0xff for n in xrange(200)] for row in xrange(50)]
+	row = 0
+	offset = 0
+
+	def message(self, text):
+		state.messages.append(text)
+
+	def scroll(self, rows=0, cells=0):
+		"""Move the display over rows, as NVDA's braille scroll commands do, and show the result."""
+		self.row = max(0, min(len(self.rows) - 1, self.row + rows))
+		self.offset = max(0, min(len(self.rows[self.row]) - 1, self.offset + cells * self.display.numCells)) if (not rows) else 0
+		self.display.display(self.rows[self.row][self.offset:self.offset + self.display.numCells])
+
+class BrailleDisplayGesture(object):
+	source = ""
+	id = ""
+
+# textInfos.offsets
+
+class Offsets(object):
+
+	def __init__(self, startOffset, endOffset):
+		self.startOffset = startOffset
+		self.endOffset = endOffset
+
+# keyboardHandler
+
+class KeyboardInputGesture(object):
+
+	def __init__(self, name):
+		self.name = name
+
+	@classmethod
+	def fromName(cls, name):
+		return cls(name)
+
+	def send(self):
+		state.keys.append(self.name)
+		if (state.keyHandler is not None):
+			state.keyHandler(self.name)
+
+# gui
+
+class SettingsDialog(object):
+
+	class MultiInstanceError(RuntimeError):
+		pass
+
+	def __init__(self, parent):
+		raise SettingsDialog.MultiInstanceError("Settings dialogs are not available outside NVDA.")
+
+# globalCommands
+
+class GlobalCommands(object):
+
+	def script_braille_routeTo(self, gesture):
+		state.routed.append(getattr(gesture, "routingIndex", None))
+
+	def script_braille_scrollBack(self, gesture):
+		sys.modules["braille"].handler.scroll(cells=-1)
+
+	def script_braille_scrollForward(self, gesture):
+		sys.modules["braille"].handler.scroll(cells=1)
+
+	def script_braille_previousLine(self, gesture):
+		sys.modules["braille"].handler.scroll(rows=-1)
+
+	def script_braille_nextLine(self, gesture):
+		sys.modules["braille"].handler.scroll(rows=1)
+
+# winUser
+
+WM_GETTEXTLENGTH = 0x000E
+
+# Windows by handle. The fake windows in spim_desktop.py add themselves.
+windows = {}
+
+def _sendMessage(hwnd, msg, wParam, lParam):
+	if (msg == WM_GETTEXTLENGTH): return windows[hwnd].getTextLength()
+	return 0
+
+# winUser window classes, for drivers that make a message window
+
+LRESULT = ctypes.c_long
+HCURSOR = ctypes.c_long
+# WINFUNCTYPE only exists on Windows; the calling convention makes no difference here.
+WNDPROC = getattr(ctypes, "WINFUNCTYPE", ctypes.CFUNCTYPE)(LRESULT, ctypes.c_void_p, ctypes.c_uint, ctypes.c_size_t, ctypes.c_ssize_t)
+
+class WNDCLASSEXW(ctypes.Structure):
+	_fields_ = [
+		("cbSize", ctypes.c_uint), ("style", ctypes.c_uint), ("lpfnWndProc", WNDPROC),
+		("cbClsExtra", ctypes.c_int), ("cbWndExtra", ctypes.c_int), ("hInstance", ctypes.c_void_p),
+		("hIcon", ctypes.c_void_p), ("hCursor", HCURSOR), ("hbrBackground", ctypes.c_void_p),
+		("lpszMenuName", ctypes.c_wchar_p), ("lpszClassName", ctypes.c_wchar_p), ("hIconSm", ctypes.c_void_p),
+	]
+
+# ctypes.windll
+
+class WinDLL(object):
+	"""A Windows DLL whose functions do nothing and return 0, apart from the few below."""
+
+	def __init__(self, functions):
+		self.functions = functions
+
+	def __getattr__(self, name):
+		return self.functions.get(name, lambda *args: 0)
+
+def _setTimer(hwnd, timerId, millis, func):
+	state.windowTimers[(hwnd, timerId)] = millis
+	return timerId
+
+def _killTimer(hwnd, timerId):
+	return state.windowTimers.pop((hwnd, timerId), None) is not None
+
+class WinDLLs(object):
+	"""ctypes.windll: system DLLs load; any other DLL, such as a display's, isn't installed."""
+	kernel32 = WinDLL({})
+	user32 = WinDLL({
+		"RegisterWindowMessageW": lambda name: 0xC000 + (hash(name) & 0xfff),
+		"RegisterClassExW": lambda wndClass: 1,
+		"CreateWindowExW": lambda *args: 1,
+		"SetTimer": _setTimer,
+		"KillTimer": _killTimer,
+	})
+
+	def __getattr__(self, name):
+		raise OSError("%s is not installed" % name)
+
+def _wintypes():
+	"""Stand-in for ctypes.wintypes, which can't be imported off Windows."""
+	c = ctypes
+	return _module("ctypes.wintypes", BYTE=c.c_byte, WORD=c.c_ushort, DWORD=c.c_ulong, BOOL=c.c_long,
+		INT=c.c_int, UINT=c.c_uint, LONG=c.c_long, ULONG=c.c_ulong, WPARAM=c.c_size_t, LPARAM=c.c_ssize_t,
+		HANDLE=c.c_void_p, HWND=c.c_void_p, HINSTANCE=c.c_void_p, HMODULE=c.c_void_p,
+		LPCWSTR=c.c_wchar_p, LPWSTR=c.c_wchar_p, LPCSTR=c.c_char_p, LPSTR=c.c_char_p)
+
+# inputCore
+
+class NoInputGestureAction(LookupError):
+	pass
+
+class InputManager(object):
+
+	def executeGesture(self, gesture):
+		if (state.gestureHandler is not None):
+			state.gestureHandler(gesture)
+		else:
+			state.gestures.append(gesture)
+
+class GlobalGestureMap(object):
+
+	def __init__(self, entries=None):
+		self.entries = dict(entries or {})
+		self.added = []
+
+	def add(self, gesture, module, className, script):
+		self.added.append((gesture, module, className, script))
+
+# brailleInput
+
+class BrailleInputGesture(object):
+	dots = 0
+	space = False
+
+# wx
+
+class CallLater(object):
+	"""Holds the call until runTimers; the stand-ins have no event loop."""
+
+	def __init__(self, millis, func, *args, **kwargs):
+		state.timers.append((time.time() + millis / 1000.0, func, args, kwargs))
+
+def runTimers():
+	"""Make the calls waiting in wx.CallLater, each when its time comes, until none are left."""
+	while (state.timers):
+		state.timers.sort(key=lambda timer: timer[0])
+		when, func, args, kwargs = state.timers.pop(0)
+		if (when > time.time()): time.sleep(when - time.time())
+		func(*args, **kwargs)
+
+# win32clipboard
+
+def _setClipboardText(text):
+	state.clipboard = text
+
+_installed = False
+
+def install():
+	"""Register the stand-in modules and put the add-on's directory on the import path. Returns the shim state."""
+	global _installed
+	if (_installed): return state
+	_installed = True
+
+	# NVDA installs the gettext translation function as a builtin.
+	__builtin__._ = lambda text: text
+
+	logging.basicConfig(level=logging.WARNING, format="%(levelname)s %(message)s")
+	log = logging.getLogger("nvda")
+	log.warn = log.warning
+	_module("logHandler", log=log)
+
+	_module("baseObject", ScriptableObject=ScriptableObject)
+	_module("appModuleHandler", AppModule=AppModule)
+	_module("ui", message=lambda text: state.messages.append(text))
+	_module("tones", beep=lambda hz, length, *args: state.beeps.append((hz, length)))
+	_module("config", conf={})
+	_module("scriptHandler", getLastScriptRepeatCount=lambda: state.repeatCount)
+	_module("globalCommands", GlobalCommands=GlobalCommands, commands=GlobalCommands())
+	# Functions queued for NVDA's main thread run straight away, on the calling thread.
+	_module("queueHandler", eventQueue=None, queueFunction=lambda queue, func, *args, **kwargs: func(*args, **kwargs))
+	textInfos = _module("textInfos", POSITION_CARET="caret", POSITION_ALL="all", POSITION_FIRST="first", UNIT_LINE="line", UNIT_CHARACTER="character")
+	textInfos.offsets = _module("textInfos.offsets", Offsets=Offsets)
+	_module("keyboardHandler", KeyboardInputGesture=KeyboardInputGesture)
+	_module("braille", BrailleDisplayDriver=BrailleDisplayDriver, BrailleDisplayGesture=BrailleDisplayGesture, handler=BrailleHandler())
+
+	api = _module("api", desktop=None, focus=None, navigator=None, foreground=None)
+	api.getDesktopObject = lambda: api.desktop
+	api.getForegroundObject = lambda: api.foreground
+	api.getFocusObject = lambda: api.focus
+	api.setFocusObject = lambda obj: setattr(api, "focus", obj)
+	api.getNavigatorObject = lambda: api.navigator
+	api.setNavigatorObject = lambda obj: setattr(api, "navigator", obj)
+
+	settingsDialogs = _module("gui.settingsDialogs", SettingsDialog=SettingsDialog)
+	_module("gui", mainFrame=None, settingsDialogs=settingsDialogs)
+
+	nvdaObjects = _module("NVDAObjects", NVDAObject=NVDAObject)
+	nvdaObjects.IAccessible = _module("NVDAObjects.IAccessible", IAccessible=NVDAObject, ContentGenericClient=NVDAObject)
+
+	_module("winUser", isWindow=lambda hwnd: hwnd in windows, sendMessage=_sendMessage,
+		WNDCLASSEXW=WNDCLASSEXW, WNDPROC=WNDPROC, LRESULT=LRESULT, HCURSOR=HCURSOR)
+	if (not hasattr(ctypes, "windll")): ctypes.windll = WinDLLs()
+	try:
+		__import__("ctypes.wintypes")
+	except ValueError:
+		ctypes.wintypes = _wintypes()
+	_module("inputCore", manager=InputManager(), NoInputGestureAction=NoInputGestureAction, GlobalGestureMap=GlobalGestureMap)
+	_module("brailleInput", BrailleInputGesture=BrailleInputGesture)
+	_module("hwPortUtils", listComPorts=lambda *args: [])
+	_module("wx", CallLater=CallLater)
+	_module("win32con", CF_TEXT=1)
+	_module("win32clipboard", OpenClipboard=lambda *args: None, EmptyClipboard=lambda: None,
+		SetClipboardText=_setClipboardText, CloseClipboard=lambda: None)
+
+	if (NVDA_DIR not in sys.path):
+		sys.path.insert(0, NVDA_DIR)
+	return state
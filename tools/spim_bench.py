@@ -0,0 +1,348 @@
+# PC Spim Add-On Benchmarks
+# by Flint Million <flint.million@mnsu.edu>
+
+# Times the add-on's hot paths outside of NVDA.
+#
+# Usage:
+#   python spim_bench.py            run every benchmark
+#   python spim_bench.py decode     run only the named benchmarks
+
+import sys, os, time, random
+from array import array
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "nvda"))
+
+def timeit(func, repeat=5):
+	"""Run func several times and return the best wall clock time in seconds."""
+	best = None
+	for i in range(repeat):
+		start = time.time()
+		func()
+		elapsed = time.time() - start
+		if (best is None or elapsed < best): best = elapsed
+	return best
+
+UNITS = {"ms": 1000.0, "us": 1000000.0}
+
+def report(name, seconds, note="", unit="ms"):
+	print "%-40s %10.2f %s %s" % (name, seconds * UNITS[unit], unit, note)
+
+# Benchmarks
+
+def bench_decode():
+	"""Whole-program decode of 100k instruction words."""
+	import spim_mips
+	words = array('I', [random.randrange(2**32) for i in xrange(100000)])
+	report("decodeProgram, 100k words, array('I')", timeit(lambda: spim_mips.decodeProgram(words, 0x00400000)))
+	try:
+		import numpy
+	except ImportError:
+		report("decodeProgram, 100k words, NumPy", 0, "(skipped, NumPy not installed)")
+		return
+	npWords = numpy.array(words, dtype=numpy.uint32)
+	report("decodeProgram, 100k words, NumPy", timeit(lambda: spim_mips.decodeProgram(npWords, 0x00400000)))
+
+def bench_live():
+	"""Live mode updates while stepping simulated programs that are hard on the pipeline."""
+	import spim_sim
+	loads = [
+		("live update, 20k line program", spim_sim.syntheticProgram(20000), 500),
+		("live update, 18 registers changing", spim_sim.syntheticProgram(2000, registers=18), 500),
+		("live update, console flood", spim_sim.syntheticProgram(2000, printEvery=1), 2000),
+	]
+	for name, source, steps in loads:
+		sim = spim_sim.PCSpimSimulator()
+		sim.loadSource(source, "load.s")
+		appModule, driver = spim_sim.loadAppModule(sim)
+		appModule.revealMode = False
+		def run():
+			for i in xrange(steps):
+				sim.step()
+				appModule.updateRegisters()
+		seconds = timeit(run, repeat=1)
+		report(name, seconds / steps, "per step (%d steps)" % steps)
+
+def bench_display():
+	"""Live updates through the virtual display at a Focus-like write speed: frame rate, coalescing and latency."""
+	import nvda_shims
+	nvda_shims.install()
+	import spim_sim, spim_virtual
+	for cells in (14, 40, 80):
+		sim = spim_sim.PCSpimSimulator()
+		sim.loadSource(spim_sim.syntheticProgram(2000, registers=18), "display.s")
+		appModule, driver = spim_sim.loadAppModule(sim, numCells=cells, latency=0.002, bandwidth=20000)
+		appModule.revealMode = False
+		driver.reset()
+		start = time.time()
+		for i in xrange(500):
+			sim.step()
+			appModule.updateRegisters()
+		report("%d cells, 500 updates" % cells, (time.time() - start) / 500, "per update")
+		print "    %s" % spim_virtual.formatStats(driver.stats())
+
+def bench_focus_dispatch():
+	"""Braille chords from a Focus display through the driver's window procedure, with and without the decode cache."""
+	import nvda_shims
+	state = nvda_shims.install()
+	import spim_focus
+	proc, message = spim_focus.nvdaFsBrlWndProc, spim_focus.nvdaFsBrlWm
+	# The chords a student uses most: dot 7 commands, dot 8 (enter), arrows and letters with the space bar
+	chords = [0x40 | 0x1b, 0x40 | 0x09, 0x80, 0x8000 | 0x01, 0x8000 | 0x08, 0x8000 | 0x1b, 0x40 | 0x1f, 0x8000 | 0x11]
+	presses = [chords[i % len(chords)] for i in xrange(20000)]
+	gestureHandler = state.gestureHandler
+	state.gestureHandler = lambda gesture: None
+	cache = spim_focus.KeyGesture._decodeCache
+	def press(keyBits):
+		# Keys down, then all keys up, which is when the chord is executed
+		proc(1, message, spim_focus.FB_INPUT, (keyBits << 8) | spim_focus.inputType_keys)
+		proc(1, message, spim_focus.FB_INPUT, spim_focus.inputType_keys)
+	def run(cached):
+		for keyBits in presses:
+			if (not cached): cache.clear()
+			press(keyBits)
+	try:
+		for cached in (False, True):
+			name = "cached" if (cached) else "uncached"
+			report("chord through window procedure, %s" % name, timeit(lambda: run(cached)) / len(presses), "per chord", "us")
+			decode = spim_focus.KeyGesture.decode
+			def decodeAll():
+				for keyBits in presses:
+					if (not cached): cache.clear()
+					decode(keyBits, 0)
+			report("KeyGesture.decode, %s" % name, timeit(decodeAll) / len(presses), "per chord", "us")
+	finally:
+		state.gestureHandler = gestureHandler
+		cache.clear()
+
+def bench_wizwheel():
+	"""Frames written per WizWheel burst: each turn as its own gesture, against the Focus driver folding a burst into one."""
+	import nvda_shims
+	state = nvda_shims.install()
+	import braille, spim_focus, spim_virtual
+	driver = braille.handler.display = spim_virtual.BrailleDisplayDriver(numCells=40)
+	proc, message = spim_focus.nvdaFsBrlWndProc, spim_focus.nvdaFsBrlWm
+	gestureHandler = state.gestureHandler
+	state.gestureHandler = driver.script_wizWheelScroll
+	try:
+		for units in (1, 5, 20):
+			bursts = 200
+			# Without coalescing, every turn was a gesture of its own.
+			driver.reset()
+			start = time.time()
+			for burst in xrange(bursts):
+				for unit in xrange(units):
+					driver.script_wizWheelScroll(spim_focus.WizWheelGesture(burst % 2 == 0, False))
+			separate = (time.time() - start, float(driver.frames) / bursts)
+			# Through the window procedure: the wheel messages, then the burst timer firing
+			driver.reset()
+			start = time.time()
+			for burst in xrange(bursts):
+				for unit in xrange(units):
+					proc(1, message, spim_focus.FB_INPUT, ((burst % 2 == 0) << 11) | (1 << 8) | spim_focus.inputType_wizWheel)
+				proc(1, spim_focus.WM_TIMER, spim_focus.WIZWHEEL_TIMER_ID, 0)
+			coalesced = (time.time() - start, float(driver.frames) / bursts)
+			report("WizWheel burst of %d, turn by turn" % units, separate[0] / bursts, "per burst, %.1f frames" % separate[1])
+			report("WizWheel burst of %d, coalesced" % units, coalesced[0] / bursts, "per burst, %.1f frames" % coalesced[1])
+	finally:
+		state.gestureHandler = gestureHandler
+		braille.handler.display = None
+
+# Run in a fresh Python for each startup timing. Prints the seconds to import
+# pcspim, the seconds to create the AppModule, and the modules they imported.
+STARTUP_SCRIPT = """
+import sys, time
+sys.path[:0] = %r
+import nvda_shims
+nvda_shims.install()
+import braille, spim_virtual
+braille.handler.display = spim_virtual.BrailleDisplayDriver(numCells=40)
+before = set(sys.modules)
+start = time.time()
+import pcspim
+imported = time.time()
+pcspim.AppModule(1, "pcspim").updateThreadDieFlag = 1
+created = time.time()
+print imported - start, created - imported, " ".join(name for name in set(sys.modules) - before if sys.modules[name] is not None)
+"""
+
+# Modules the app module should leave until a feature needs them
+HEAVY_MODULES = ("wx", "win32clipboard", "subprocess", "tempfile", "random", "numpy", "spim_settings", "spim_export", "spim_stack", "spim_watch", "spim_session")
+
+def bench_startup():
+	"""Importing the app module and creating it, under the NVDA stand-ins.
+
+	Each timing runs in a new Python process, so no spim_* module or NumPy has been imported yet: a real cold start."""
+	import subprocess
+	script = STARTUP_SCRIPT % ([os.path.dirname(os.path.abspath(__file__)), os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "nvda")],)
+	runs = [subprocess.check_output([sys.executable, "-c", script]).split(" ", 2) for i in range(5)]
+	report("import pcspim, cold", min(float(run[0]) for run in runs))
+	report("AppModule(), first", min(float(run[1]) for run in runs))
+	loaded = runs[0][2].split()
+	heavy = [name for name in HEAVY_MODULES if name in loaded]
+	report("heavy modules imported at load", 0, ", ".join(heavy) or "(none)")
+
+def bench_export():
+	"""The verbose exporter on a simulated 20k line program, exported fresh and then again unchanged."""
+	import tempfile, shutil
+	import spim_sim, spim_jobs, spim_cache
+	from spim_desktop import EF_CODE
+	sim = spim_sim.PCSpimSimulator()
+	sim.loadSource(spim_sim.syntheticProgram(20000), "load.s")
+	appModule, driver = spim_sim.loadAppModule(sim)
+	import pcspim
+	directory = tempfile.mkdtemp()
+	try:
+		pcspim.exportCache = spim_cache.ExportCache(directory)
+		data = sim.desktop.edits[EF_CODE].value
+		job = spim_jobs.Job(spim_jobs.JobPool(), "export", None)
+		symbols = appModule.getSymbols()
+		export = lambda: appModule.exportFile("makeCodeReadable2", appModule.formatReadableCodeVerbose, data, symbols, job)
+		report("verbose export, 20k lines, first time", timeit(lambda: (shutil.rmtree(directory), os.mkdir(directory), export()), repeat=3))
+		report("verbose export, 20k lines, unchanged", timeit(export))
+	finally:
+		pcspim.exportCache = None
+		shutil.rmtree(directory)
+
+def bench_large_export():
+	"""Both exporters on a 500k line Code window, formatted a chunk at a time."""
+	import spim_export, spim_symbols
+	lines = 500000
+	symbols = spim_symbols.SymbolTable([(0x00400000 + i * 256, "label%d" % i) for i in xrange(lines // 64)])
+	data = "\n".join(["[0x%08x]\t0x%08x  addiu $8, $8, %d ; %d: addi $t0, $t0, %d" % (0x00400000 + i * 4, 0x25080000 | (i & 0xffff), i & 0xffff, i, i & 0xffff) for i in xrange(lines)])
+	for verbose in (False, True):
+		kind = "verbose" if (verbose) else "plain"
+		report("%s export, 500k lines" % kind, timeit(lambda: sum(len(text) for text in spim_export.formatCode(data, symbols, verbose)), repeat=1))
+
+def bench_symbols():
+	"""Symbol lookups in a table of 2000 labels, for new addresses and repeated ones."""
+	import spim_symbols
+	table = spim_symbols.SymbolTable([(0x00400000 + i * 64, "label%d" % i) for i in xrange(2000)])
+	addresses = [random.randrange(0x00400000, 0x00420000) for i in xrange(50000)]
+	lookup = table.lookup
+	report("symbol lookup, new addresses", timeit(lambda: [lookup(a) for a in addresses], repeat=1) / len(addresses), "per lookup", "us")
+	# A working set of a few hundred addresses, like the PC and pointers in registers
+	working = [random.choice(addresses[:300]) for i in xrange(50000)]
+	report("symbol lookup, repeated addresses", timeit(lambda: [lookup(a) for a in working]) / len(working), "per lookup", "us")
+
+def bench_memory():
+	"""Diffing a Data window with 256k nonzero words after a step that stores a few of them."""
+	import spim_memory, spim_sim
+	memory = dict((0x10010000 + 4 * i, random.randrange(1, 1 << 32)) for i in xrange(256 * 1024))
+	before = "\r\n".join(spim_sim.renderWords(memory, 0x10000000, 0x10110000))
+	for address in random.sample(sorted(memory), 10):
+		memory[address] ^= 0x55
+	after = "\r\n".join(spim_sim.renderWords(memory, 0x10000000, 0x10110000))
+	def diff():
+		model = spim_memory.MemoryModel()
+		model.update(before)
+		return model
+	report("memory model, first read of %.1f MB" % (len(before) / 1048576.0), timeit(diff, repeat=3))
+	models = [diff() for i in range(5)]
+	report("memory model, update after 10 stores", timeit(lambda: models.pop().update(after)))
+
+def bench_stack():
+	"""The stack view with 10k frames of recursion, rebuilt after a step that pushes one more."""
+	import spim_memory, spim_stack, spim_sim, spim_symbols
+	symbols = spim_symbols.SymbolTable([(0x00400000, "main"), (0x00400100, "fact")])
+	def render(frames):
+		# Each frame is 8 bytes: the argument and the saved $ra.
+		sp = spim_stack.STACK_TOP - 8 * frames
+		memory = {}
+		for i in xrange(frames):
+			memory[sp + 8 * i] = frames - i
+			memory[sp + 8 * i + 4] = 0x00400128
+		return sp, "\r\n".join(spim_sim.renderWords(memory, sp & ~0xf, spim_stack.STACK_TOP))
+	sp, before = render(10000)
+	newSp, after = render(10001)
+	def build():
+		memory = spim_memory.MemoryModel()
+		memory.update(before)
+		view = spim_stack.StackView()
+		view.update(memory, sp, 0, 0x00400100, symbols)
+		return memory, view
+	report("stack view, 10k frames, first build", timeit(build, repeat=3))
+	states = [build() for i in range(5)]
+	def step():
+		memory, view = states.pop()
+		memory.update(after)
+		view.update(memory, newSp, 0, 0x00400100, symbols)
+	report("stack view, 10k frames, after a push", timeit(step))
+
+def bench_registers():
+	"""Parsing the Registers window: every register, against the general registers alone as the add-on used to."""
+	import re, spim_registers, spim_sim
+	sim = spim_sim.PCSpimSimulator()
+	sim.loadSource(spim_sim.syntheticProgram(200, registers=18), "registers.s")
+	sim.step(150)
+	sim.fpRegs[2] = 3.25
+	text = sim.renderRegisters()
+	def generalOnly():
+		regs = dict(re.findall(r"R[0-9]{1,2} {1,2}\(([a-z0-9]{2})\) = ([0-9a-f]{8})", text))
+		regs.update((x, int(y, 16)) for x, y in regs.items())
+		return regs
+	registers = spim_registers.RegisterFile()
+	loops = 10000
+	report("general registers only (old parser)", timeit(lambda: [generalOnly() for i in xrange(loops)]) / loops, "per parse", "us")
+	report("register file, %d registers" % registers.parse(text), timeit(lambda: [registers.parse(text) for i in xrange(loops)]) / loops, "per parse", "us")
+
+def bench_watches():
+	"""Live mode updates with four watch expressions on the display, against the same registers alone."""
+	import spim_sim
+	for name, registers in (("live update, registers", ["a0", "t0", "t1", "sp"]),
+			("live update, 4 watch expressions", ["mem[$a0]", "$t0-$t1", "$sp+8", "mem[$sp+4]"])):
+		sim = spim_sim.PCSpimSimulator()
+		sim.loadSource(spim_sim.syntheticProgram(2000, registers=18), "watches.s")
+		appModule, driver = spim_sim.loadAppModule(sim, numCells=80, registers=registers)
+		appModule.revealMode = False
+		def run():
+			for i in xrange(200):
+				sim.step()
+				appModule.updateRegisters()
+		report(name, timeit(run, repeat=1) / 200, "per update")
+
+def bench_codeline():
+	"""Speaking the Code window line at the caret, in small and large programs."""
+	import spim_sim
+	from spim_desktop import EF_CODE
+	class Gesture(object):
+		def _get_displayName(self):
+			return "bench"
+	for lines in (2000, 200000):
+		sim = spim_sim.PCSpimSimulator()
+		sim.loadSource(spim_sim.syntheticProgram(lines), "codeline.s")
+		appModule, driver = spim_sim.loadAppModule(sim)
+		import api
+		desktop = api.desktop
+		desktop.setFocus(EF_CODE, desktop.edits[EF_CODE].getTextLength() // 2)
+		appModule.script_getCodeInfo(Gesture()) # builds the source index
+		for edit in desktop.edits.values(): edit.valueReads = 0
+		loops = 200
+		seconds = timeit(lambda: [appModule.script_getCodeInfo(Gesture()) for i in xrange(loops)], repeat=3) / loops
+		reads = sum(edit.valueReads for edit in desktop.edits.values()) / (3.0 * loops)
+		report("code line at caret, %dk line program" % (lines // 1000), seconds, "per keypress, %.1f pane texts read" % reads, "us")
+
+BENCHMARKS = [
+	("startup", bench_startup),
+	("decode", bench_decode),
+	("live", bench_live),
+	("display", bench_display),
+	("focus", bench_focus_dispatch),
+	("wizwheel", bench_wizwheel),
+	("export", bench_export),
+	("bigexport", bench_large_export),
+	("symbols", bench_symbols),
+	("memory", bench_memory),
+	("stack", bench_stack),
+	("registers", bench_registers),
+	("watches", bench_watches),
+	("codeline", bench_codeline),
+]
+
+def main(args):
+	random.seed(1)
+	for name, func in BENCHMARKS:
+		if (args and name not in args): continue
+		func()
+
+if (__name__ == "__main__"):
+	main(sys.argv[1:])
@@ -0,0 +1,152 @@
+# Stand-in PCSpim Desktop
+# by Flint Million <flint.million@mnsu.edu>
+
+# A fake desktop object tree shaped like a running PCSpim, for use with the
+# stand-ins in nvda_shims.py. The app module finds PCSpim's panes by walking
+# this tree exactly as it walks the real one:
+#
+#   Desktop
+#     "PCSpim" top level window
+#       "PCSpim - ..." main window
+#         "AfxFrame..." frame
+#           Edit (Registers), Edit (Text/Code), Edit (Data/Memory), Edit (Messages/Status)
+#     "Console" window (same thread as PCSpim)
+#       child window
+#         RichEdit20A (the console text)
+
+import itertools
+
+import nvda_shims
+
+# Pane identifiers, matching the EF_* values in the app module.
+EF_CODE = 1
+EF_REGISTERS = 2
+EF_MEMORY = 3
+EF_STATUS = 4
+EF_CONSOLE = 5
+
+PCSPIM_THREAD_ID = 1234
+
+handles = itertools.count(0x10000)
+
+class FakeObject(object):
+	"""A window in the fake tree."""
+
+	def __init__(self, name=None, windowClassName="", children=None, windowThreadID=PCSPIM_THREAD_ID, windowControlID=0):
+		self.name = name
+		self.windowClassName = windowClassName
+		self.children = children or []
+		self.windowThreadID = windowThreadID
+		self.windowControlID = windowControlID
+		self.windowHandle = handles.next()
+		nvda_shims.windows[self.windowHandle] = self
+		self._value = None
+
+	# Reading a window's text copies all of it out of the window, so reads are counted.
+	valueReads = 0
+
+	def _getValue(self):
+		self.valueReads += 1
+		return self._value
+
+	def _setValue(self, value):
+		self._value = value
+
+	value = property(_getValue, _setValue)
+
+	def getTextLength(self):
+		"""The length of the window's text, as WM_GETTEXTLENGTH gives it without reading the text."""
+		return len(self._value or "")
+
+	def setFocus(self):
+		import api
+		api.setFocusObject(self)
+
+	def __repr__(self):
+		return "<FakeObject %s %r>" % (self.windowClassName, self.name)
+
+class FakeEdit(FakeObject):
+	"""An edit control holding one pane's text, with a caret."""
+
+	def __init__(self, windowClassName="Edit", value=""):
+		super(FakeEdit, self).__init__(name=None, windowClassName=windowClassName)
+		self.value = value
+		self.caretOffset = 0
+
+	def makeTextInfo(self, position):
+		if (hasattr(position, "startOffset")):
+			return FakeTextInfo(self, position.startOffset, position.endOffset)
+		return FakeTextInfo(self, self.caretOffset, self.caretOffset)
+
+class FakeBookmark(object):
+
+	def __init__(self, startOffset, endOffset):
+		self.startOffset = startOffset
+		self.endOffset = endOffset
+
+class FakeTextInfo(object):
+	"""Enough of NVDA's TextInfo for reading and moving by line."""
+
+	def __init__(self, obj, start, end):
+		self.obj = obj
+		self._start = start
+		self._end = end
+
+	@property
+	def bookmark(self):
+		return FakeBookmark(self._start, self._end)
+
+	# A real edit control gives a range's text and the line around an offset
+	# without copying out all of its text, so these don't count as reads.
+
+	@property
+	def text(self):
+		return self.obj._value[self._start:self._end]
+
+	def expand(self, unit):
+		value = self.obj._value
+		self._start = value.rfind("\n", 0, self._start) + 1
+		end = value.find("\n", self._start)
+		self._end = len(value) if (end < 0) else end + 1
+
+	def updateCaret(self):
+		self.obj.caretOffset = self._start
+
+class PCSpimDesktop(FakeObject):
+	"""The desktop, holding a fake PCSpim and its console."""
+
+	def __init__(self):
+		self.edits = {
+			EF_REGISTERS: FakeEdit(),
+			EF_CODE: FakeEdit(),
+			EF_MEMORY: FakeEdit(),
+			EF_STATUS: FakeEdit(),
+			EF_CONSOLE: FakeEdit(windowClassName="RichEdit20A"),
+		}
+		frame = FakeObject(windowClassName="AfxFrameOrView42", children=[self.edits[ef] for ef in (EF_REGISTERS, EF_CODE, EF_MEMORY, EF_STATUS)])
+		mainWindow = FakeObject(name="PCSpim - Program", windowClassName="AfxMDIFrame42", children=[frame])
+		app = FakeObject(name="PCSpim", windowClassName="#32769", children=[mainWindow])
+		consoleClient = FakeObject(windowClassName="AfxWnd42", children=[self.edits[EF_CONSOLE]])
+		console = FakeObject(name="Console", windowClassName="AfxFrameOrView42", children=[consoleClient])
+		other = FakeObject(name="Program Manager", windowClassName="Progman", windowThreadID=1)
+		super(PCSpimDesktop, self).__init__(name="Desktop", windowClassName="#32769", children=[other, app, console], windowThreadID=0)
+
+	def setPanes(self, panes):
+		"""Replace the text of the given panes. Takes a dictionary of EF_* identifier to text."""
+		for which, text in panes.items():
+			edit = self.edits[which]
+			edit.value = text
+			edit.caretOffset = min(edit.caretOffset, len(text))
+
+	def setFocus(self, which, caret=None):
+		"""Move the focus to a pane, and optionally put its caret at an offset. which may be None."""
+		import api
+		if (which is None): return
+		edit = self.edits[which]
+		if (caret is not None):
+			edit.caretOffset = min(caret, len(edit._value))
+		api.setFocusObject(edit)
+		api.setNavigatorObject(edit)
+
+	def getPanes(self):
+		return dict((which, edit._value) for which, edit in self.edits.items())
@@ -0,0 +1,511 @@
+# PC Spim Differential Fuzzer
+# by Flint Million <flint.million@mnsu.edu>
+
+# Checks the add-on's encoders and parsers against reference versions of
+# them. The references below are the original, plain implementations from
+# the first release of the add-on, frozen here so they never change. The
+# add-on's own versions have since been rewritten for speed (lookup tables,
+# cached encodings, one-pass register parsing); for every input generated
+# here they must give exactly what the references give.
+#
+# Inputs are random and skewed towards trouble: register values at and past
+# the edges of 32 bits, Registers and Code window text with lines dropped,
+# repeated, cut short or mangled, Unicode text, and displays of sizes no real
+# display has. Each case is generated from the seed, target and case number
+# alone, so a failure can be run again by itself with --case.
+#
+# Usage:
+#   python spim_fuzz.py                    every target, 2000 cases each
+#   python spim_fuzz.py display code       only the named targets
+#   python spim_fuzz.py --cases 100000 --budget 60
+#   python spim_fuzz.py --seed 7 --case 1234 registers
+#
+# Exits with status 1 on the first mismatch, after printing the input, or if
+# a target runs fewer than --min-rate cases per second.
+
+import sys, re, time, random, optparse
+
+import nvda_shims
+nvda_shims.install()
+
+import SPIMBraille, spim_registers, spim_source, spim_virtual, spim_watch
+import pcspim
+
+class Mismatch(Exception):
+	"""The add-on and a reference gave different results."""
+
+	def __init__(self, what, given, expected, actual):
+		Exception.__init__(self, what)
+		self.what = what
+		self.given = given
+		self.expected = expected
+		self.actual = actual
+
+def check(what, given, expected, actual):
+	if (expected != actual): raise Mismatch(what, given, expected, actual)
+
+# Reference implementations, as first released. Only the logging is left out:
+# ref_numToBraille's log line called ord() on ints, so the original raised
+# TypeError on every call; the cells it built are what it was meant to return.
+
+refNumMap = { '1': 0x02, '2': 0x06, '3': 0x12, '4': 0x32,
+		   '5': 0x22, '6': 0x16, '7': 0x36, '8': 0x26,
+		   '9': 0x14, '0': 0x34, 'a': 0x01, 'b': 0x03,
+		   'c': 0x09, 'd': 0x19, 'e': 0x11, 'f': 0x0b}
+
+def ref_numToBraille(num, desiredLength=8):
+	num = hex(num)[2:]
+	s = num[0:8].zfill(8)
+	out = []
+	for c in s:
+		if (c in refNumMap.keys()):
+			out.append(refNumMap[c])
+		else:
+			out.append(252)
+	return out
+
+refBrailleMap = {
+	'a': 0x01, 'b': 0x03, 'c': 0x09, 'd': 0x19, 'e': 0x11,
+	'f': 0x0b, 'g': 0x1b, 'h': 0x13, 'i': 0x0a, 'j': 0x1a,
+	'k': 0x05, 'l': 0x07, 'm': 0x0d, 'n': 0x1d, 'o': 0x15,
+	'p': 0x0f, 'q': 0x1f, 'r': 0x17, 's': 0x0e, 't': 0x1e,
+	'u': 0x25, 'v': 0x27, 'w': 0x3a, 'x': 0x2d, 'y': 0x3d,
+	'z': 0x35,
+	'1': 0x02, '2': 0x06, '3': 0x12, '4': 0x32,
+	'5': 0x22, '6': 0x16, '7': 0x36, '8': 0x26,
+	'9': 0x14, '0': 0x34,
+	' ': 0x00, '.': 0x28,
+	# Added for signs in floating point registers
+	'-': 0x24, '+': 0x2c }
+
+def ref_simpleTranslateToBrl(text):
+	out = ""
+	for c in text.lower():
+		try:
+			ch = refBrailleMap[c]
+			out += chr(ch)
+		except KeyError:
+			out += "\xff"
+	return out
+
+def ref_parseGPRegisters(text):
+	gpRegisters = dict ( re.findall(r"R[0-9]{1,2} {1,2}\(([a-z0-9]{2})\) = ([0-9a-f]{8})", text) )
+	gpRegisters.update((x, int(y,16)) for x, y in gpRegisters.items())
+	return gpRegisters
+
+def ref_parseCodeLine(text):
+	codeRegex = re.compile(r"^\[0x([0-9a-f]{8})\]\t0x([0-9a-f]{8})  (.+)$")
+	m = codeRegex.match(text)
+	if (m is None): return None
+	result = {}
+	result['encoded_instruction'] = int(m.group(2),16)
+	result['address'] = int(m.group(1),16)
+	instr = m.group(3)
+	if (";" in instr):
+		pos = instr.index(";")
+		comment = instr[pos+1:].strip()
+		instr = instr[:pos].strip()
+	else:
+		instr = instr.strip()
+		comment = ""
+	result['comment'], result['instruction'] = comment, instr
+	return result
+
+class RefDisplay(object):
+	"""The original driver's register handling: setRegister, setAllRegisters and display."""
+
+	def __init__(self, registerCount, hasSPIM=True):
+		self.registers = [None] * registerCount
+		self.hasSPIM = hasSPIM
+
+	def setAllRegisters(self, regs):
+		if (self.hasSPIM == False): return
+		if (len(regs) > len(self.registers)):
+			raise ValueError("Too many registers provided")
+		for i in range(len(regs)):
+			self.setRegister(i, regs[i])
+
+	def setRegister(self, regNum, data):
+		if (self.hasSPIM == False): return
+		if (data is None):
+			self.registers[regNum] = None
+		elif (type(data) is int):
+			if (regNum >= (len(self.registers))): return
+			self.registers[regNum] = data
+		else:
+			data = str(data)
+			data = data[:8].ljust(8,'\x00')
+			self.registers[regNum] = data
+
+	def display(self, cells, noSeparators=False):
+		if (self.hasSPIM == True):
+			for r in self.registers:
+				if (noSeparators == False): cells.extend([255])
+				if (type(r) is str):
+					cells.extend([ord(x) for x in r[0:8]])
+				elif (r is None):
+					cells.extend([0]*8)
+				else:
+					cells.extend( ref_numToBraille(r) )
+			if (noSeparators == False):  cells.extend([255])
+		return cells
+
+	def regions(self, mainCells, noSeparators=False):
+		"""The slot of each cell display() lays out, or None."""
+		out = [None] * mainCells
+		if (self.hasSPIM == True):
+			for slot in range(len(self.registers)):
+				if (noSeparators == False): out.append(None)
+				out.extend([slot] * 8)
+			if (noSeparators == False): out.append(None)
+		return out
+
+# Input generators
+
+EDGE_WORDS = [0, 1, 0x7fffffff, 0x80000000, 0xfffffffe, 0xffffffff, 0x0000000f, 0x10000000, 0xdeadbeef]
+
+def randomWord(rng):
+	"""A register value: usually 32 bits, sometimes negative or wider, as a caller might mistakenly give."""
+	r = rng.random()
+	if (r < 0.2): return rng.choice(EDGE_WORDS)
+	if (r < 0.3): return 1 << rng.randrange(32)
+	if (r < 0.4): return rng.randrange(256)
+	if (r < 0.5): return -rng.randrange(1, 2**33)
+	if (r < 0.55): return rng.randrange(2**32, 2**62)
+	return rng.randrange(2**32)
+
+TEXT_POOLS = [
+	"abcdefghijklmnopqrstuvwxyz0123456789",
+	"ABCDEFXYZ$()+-. \t",
+	"!\"#%&'*,/:;<=>?@[\\]^_`{|}~",
+	"\x00\x01\x1f\x7f\x80\xa0\xe9\xff",
+]
+UNICODE_POOL = u"\xe9\xdf\u0130\u212a\u2800\u28ff\u4e2d\xa0\u2013\ufeff"
+
+def randomText(rng, maxLength=24):
+	"""Text mixing register names, punctuation, control characters and, as unicode, letters outside ASCII."""
+	length = rng.randrange(maxLength + 1)
+	if (rng.random() < 0.3):
+		pool = u"".join(TEXT_POOLS[:3]).decode("ascii") + UNICODE_POOL
+		return u"".join([rng.choice(pool) for i in range(length)])
+	pool = "".join(rng.sample(TEXT_POOLS, rng.randrange(1, len(TEXT_POOLS) + 1)))
+	return "".join([rng.choice(pool) for i in range(length)])
+
+PANE_NAMES = list(spim_registers.GENERAL_NAMES)
+
+def registersWindow(rng):
+	"""The text of PCSpim's Registers window, with random values."""
+	special = [randomWord(rng) & 0xffffffff for i in range(7)]
+	general = [randomWord(rng) & 0xffffffff for i in range(32)]
+	out = [
+		" PC      = %08x    EPC     = %08x    Cause   = %08x    BadVAddr= %08x" % tuple(special[:4]),
+		" Status  = %08x    HI      = %08x    LO      = %08x" % tuple(special[4:]),
+		"                                 General Registers",
+	]
+	for row in range(8):
+		out.append(" " + "  ".join(["R%-2d (%s) = %08x" % (n, PANE_NAMES[n], general[n]) for n in (row, row + 8, row + 16, row + 24)]))
+	out.append("")
+	out.append("                              Double Floating Point Registers")
+	for row in range(4):
+		out.append(" " + "  ".join(["FP%-2d    = %-10s" % (n, "%.6f" % rng.uniform(-1e6, 1e6)) for n in (row * 2, row * 2 + 8, row * 2 + 16, row * 2 + 24)]))
+	out.append("                              Single Floating Point Registers")
+	for row in range(8):
+		out.append(" " + "  ".join(["FP%-2d    = %-10s" % (n, "%.6f" % rng.uniform(-1e6, 1e6)) for n in (row, row + 8, row + 16, row + 24)]))
+	return out
+
+def sameKind(text, like):
+	"""text as a byte string if like is one, or as unicode if like is."""
+	if (isinstance(like, str) and isinstance(text, unicode)): return text.encode("utf-8")
+	if (isinstance(like, unicode) and isinstance(text, str)): return text.decode("latin-1")
+	return text
+
+def mangleLines(rng, lines, extra):
+	"""Damage window lines the ways a scrape can: lines lost, repeated or cut short, characters changed, text inserted."""
+	lines = list(lines)
+	for i in range(rng.randrange(1, 4)):
+		if (not lines): break
+		n = rng.randrange(len(lines))
+		r = rng.random()
+		if (r < 0.15): del lines[n]
+		elif (r < 0.3): lines.insert(n, lines[n])
+		elif (r < 0.45): lines[n] = lines[n][:rng.randrange(len(lines[n]) + 1)]
+		elif (r < 0.6): lines[n] = lines[n].upper()
+		elif (r < 0.75 and lines[n]):
+			p = rng.randrange(len(lines[n]))
+			lines[n] = lines[n][:p] + sameKind(randomText(rng, 2), lines[n]) + lines[n][p + 1:]
+		elif (r < 0.9): lines.insert(n, rng.choice(extra))
+		else: lines[n] = lines[n].replace(" ", "\t")
+	return lines
+
+REGISTER_JUNK = ["R8  (t0) = 1234", "R99 (zz) = 0badf00d", "x)) = 12345678", "(t0)=abcdef01", "R1  (at) = 89abcdef"]
+
+# Targets. Each checks one case, made from its own random generator.
+
+def target_hex(rng):
+	"""numToBraille, and the hex rendering of a register slot."""
+	num = randomWord(rng)
+	expected = ref_numToBraille(num)
+	check("numToBraille", num, expected, SPIMBraille.numToBraille(num))
+	check("encodeRegister hex", num, expected, SPIMBraille.encodeRegister(num, "hex"))
+
+def target_translate(rng):
+	"""simpleTranslateToBrl, including text the map doesn't cover."""
+	text = randomText(rng)
+	check("simpleTranslateToBrl", text, ref_simpleTranslateToBrl(text), pcspim.simpleTranslateToBrl(text))
+
+def target_registers(rng):
+	"""The general registers from RegisterFile, against the original general register parser.
+
+	RegisterFile also finds registers written in ways the original didn't
+	accept (such as without their R number), so the check is that every
+	register the original finds is found with the same value; and, for
+	undamaged windows, that no others are. A register named more than once
+	has no one right value, and isn't checked."""
+	lines = registersWindow(rng)
+	damaged = rng.random() < 0.7
+	if (damaged): lines = mangleLines(rng, lines, REGISTER_JUNK)
+	# Window text comes as unicode from NVDA, or as bytes from a saved session.
+	if (rng.random() < 0.2 or [l for l in lines if isinstance(l, unicode)]):
+		lines = [(l.decode("latin-1") if isinstance(l, str) else l) for l in lines]
+	text = rng.choice(["\r\n", "\n"]).join(lines)
+	# Registers are only looked for above the floating point registers.
+	double = text.find(spim_registers.DOUBLE_HEADING)
+	expected = ref_parseGPRegisters(text[:double] if (double >= 0) else text)
+	regs = spim_registers.RegisterFile(text)
+	for name, value in expected.items():
+		if (name in spim_registers.GENERAL_NAMES and text.lower().count("(%s)" % name) == 1):
+			check("RegisterFile[%r]" % name, text, value, regs.get(name))
+	if (not damaged):
+		check("RegisterFile general names", text, sorted(expected), sorted(n for n in regs.keys() if n in spim_registers.GENERAL_NAMES))
+
+CODE_INSTRUCTIONS = ["lw $4, 0($29)", "addiu $5, $29, 4", "syscall", "jal 0x00400020 [main]", "ori $2, $0, 10", "nop", "bne $8, $0, -12 [loop-0x0040003c]"]
+CODE_JUNK = ["", " User Text Segment [00400000]..[00440000]", "[0x00400000]\t0x8fa40000", "[0x0040000]\t0x8fa40000  lw $4, 0($29)", "[0x00400000] 0x8fa40000  lw $4, 0($29)"]
+
+def codeLine(rng):
+	"""A line of PCSpim's Code window."""
+	text = rng.choice(CODE_INSTRUCTIONS)
+	r = rng.random()
+	if (r < 0.5): text = "%s; %d: %s" % (text.ljust(rng.choice([0, 32])), rng.randrange(1, 5000), randomText(rng))
+	elif (r < 0.6): text = "%s;%s" % (text, randomText(rng))
+	elif (r < 0.7): text = randomText(rng)
+	return "[0x%08x]\t0x%08x  " % (randomWord(rng) & 0xffffffff, randomWord(rng) & 0xffffffff) + text
+
+def target_code(rng):
+	"""parseCodeLine, and the Code window pattern the source index uses."""
+	lines = [codeLine(rng)]
+	if (rng.random() < 0.4): lines = mangleLines(rng, lines, CODE_JUNK) or [""]
+	line = lines[0]
+	if (isinstance(line, str) and rng.random() < 0.2): line = line.decode("latin-1")
+	expected = ref_parseCodeLine(line)
+	check("parseCodeLine", line, expected, pcspim.AppModule.parseCodeLine.im_func(None, line))
+	# The source index reads the same fields. It only accepts the comments PCSpim writes ("; 12: ..."),
+	# and keeps leading white space, which PCSpim never puts before an instruction.
+	if (expected is None or not isinstance(line, str)): return
+	if (";" in line and not re.match(r"\d+:", expected['comment'])): return
+	m = spim_source.CODE_LINE.match(line)
+	if (m is not None and m.group(3)[:1].isspace()): return
+	fields = (int(m.group(1), 16), int(m.group(2), 16), m.group(3)) if (m is not None) else None
+	check("spim_source.CODE_LINE", line, (expected['address'], expected['encoded_instruction'], expected['instruction']), fields)
+
+class FuzzDriver(SPIMBraille.SPIMBrailleDisplayDriver):
+	"""The SPIM Braille driver with any number of main cells and register slots."""
+
+	def __init__(self, mainCells, registerCount, hasSPIM=True):
+		self.registers = [None] * registerCount
+		self.lastCells = [0] * mainCells
+		self.hasSPIM = hasSPIM
+
+def registerData(rng):
+	"""Something to put in a register slot: a number, nothing, raw cells or text."""
+	r = rng.random()
+	if (r < 0.6): return int(randomWord(rng))
+	if (r < 0.7): return None
+	if (r < 0.9): return "".join([chr(rng.randrange(256)) for i in range(rng.randrange(13))])
+	return pcspim.simpleTranslateToBrl(randomText(rng, 8).strip().center(8, ' '))
+
+def target_display(rng):
+	"""Frames from the driver, after a run of register updates, against the original driver."""
+	if (rng.random() < 0.5):
+		registers, mainCells, separators = spim_virtual.layout(rng.choice([0, 1, 13, 14, 15, 20, 22, 40, 44, 70, 80, rng.randrange(200)]))
+		noSeparators = not separators
+	else:
+		registers, mainCells, noSeparators = rng.randrange(9), rng.randrange(100), rng.random() < 0.5
+	hasSPIM = rng.random() < 0.9
+	driver = FuzzDriver(mainCells, registers, hasSPIM)
+	ref = RefDisplay(registers, hasSPIM)
+	for step in range(rng.randrange(1, 8)):
+		r = rng.random()
+		if (registers and r < 0.4):
+			slot, data = rng.randrange(registers), registerData(rng)
+			driver.setRegister(slot, data, rng.random() < 0.5)
+			ref.setRegister(slot, data)
+		elif (r < 0.6):
+			regs = [registerData(rng) for i in range(rng.randrange(registers + 1))]
+			driver.setAllRegisters(regs)
+			ref.setAllRegisters(regs)
+		elif (r < 0.8):
+			# Banks of values as the app module gives them; the bank shown must read like setAllRegisters.
+			banks = [[registerData(rng) for i in range(rng.randrange(registers + 1))] for b in range(rng.randrange(1, 4))]
+			driver.setBanks(banks, ["bank %d" % b for b in range(len(banks))])
+			driver.selectBank(rng.randrange(len(banks)))
+			if (hasSPIM and registers):
+				bank = banks[driver.currentBank]
+				ref.setAllRegisters(bank + [None] * (registers - len(bank)))
+		else:
+			driver.setSlotModes(["hex"] * rng.randrange(registers + 1))
+	main = [rng.randrange(256) for i in range(mainCells)]
+	given = (mainCells, registers, noSeparators, hasSPIM, ref.registers, main)
+	expected = ref.display(list(main), noSeparators)
+	check("display", given, expected, driver.display(list(main), noSeparators))
+	if (hasSPIM):
+		check("registerAt", given, ref.regions(mainCells, noSeparators), [driver.registerAt(i) for i in range(len(expected))])
+
+# Watch expressions have no first release to compare with. They are checked
+# against the value of the expression the generator wrote, worked out in
+# Python as it was written, and any text that isn't a valid expression must
+# raise WatchError.
+
+WATCH_LABELS = {"main": 0x00400000, "buffer": 0x10010000, "loop.end": 0x00400040}
+
+class FuzzMemory(object):
+	"""Memory whose words are a simple function of their address."""
+
+	def read(self, address):
+		return (address * 2654435761 + 12345) & 0xffffffff
+
+class FuzzSymbols(object):
+	def address(self, name):
+		return WATCH_LABELS.get(name)
+
+def watchNumber(rng):
+	"""A number as an expression may write it, and its value."""
+	value = rng.choice([0, 1, 8, 10, 0xffffffff, 2**32, rng.randrange(2**36)])
+	r = rng.random()
+	if (r < 0.3): return "0" * rng.randrange(1, 3) + str(value), value
+	if (r < 0.6): return rng.choice(["0x%x", "0X%X", "0x%08X"]) % value, value
+	return str(value), value
+
+def watchExpression(rng, ints, depth=3):
+	"""A random expression, its value (None if it reads an unknown label) and how many parts it counts as."""
+	memory = FuzzMemory()
+	r = rng.random()
+	if (depth == 0 or r < 0.3):
+		r = rng.random()
+		if (r < 0.4):
+			text, value = watchNumber(rng)
+			return text, value & 0xffffffff, 1
+		if (r < 0.8):
+			slot = rng.randrange(len(spim_registers.GENERAL_NAMES))
+			name = spim_registers.GENERAL_NAMES[slot]
+			text = rng.choice(["$%s" % name, "$%d" % slot, name.upper()]) if (name != "r0") else rng.choice(["$zero", "$0"])
+			return text, ints[slot], 1
+		name = rng.choice(WATCH_LABELS.keys() + ["nowhere"])
+		return name, WATCH_LABELS.get(name), 1
+	if (r < 0.45):
+		text, value, nodes = watchExpression(rng, ints, depth - 1)
+		return "(%s)" % text, value, nodes + 1
+	if (r < 0.6):
+		text, value, nodes = watchExpression(rng, ints, depth - 1)
+		return "mem[%s]" % text, None if (value is None) else memory.read(value), nodes + 1
+	if (r < 0.7):
+		text, value, nodes = watchExpression(rng, ints, depth - 1)
+		return "-(%s)" % text, None if (value is None) else -value & 0xffffffff, nodes + 2
+	op = rng.choice("+-*")
+	left, a, leftNodes = watchExpression(rng, ints, depth - 1)
+	right, b, rightNodes = watchExpression(rng, ints, depth - 1)
+	# Both sides are bracketed, so the text parses the way it is computed here.
+	left, right = "(%s)" % left, "(%s)" % right
+	if (a is None or b is None): value = None
+	elif (op == "+"): value = (a + b) & 0xffffffff
+	elif (op == "-"): value = (a - b) & 0xffffffff
+	else: value = (a * b) & 0xffffffff
+	return rng.choice(["%s%s%s", "%s %s %s"]) % (left, op, right), value, leftNodes + rightNodes + 3
+
+# Text that must be refused with WatchError
+WATCH_JUNK = ["", "12ab", "0x", "0xg1", "$sp+0x", "1.5", "$sp+08ab", "mem[", "mem[$sp", "(1", "1)", "$nosuch", "+", "1 2", "0x1 0x2", "#"]
+
+def target_watch(rng):
+	"""Watch expressions, against their values worked out as they were written, and malformed ones."""
+	regs = spim_registers.RegisterFile()
+	for slot in range(len(spim_registers.GENERAL_NAMES)):
+		regs.ints[slot] = randomWord(rng) & 0xffffffff
+	ints = list(regs.ints)
+	if (rng.random() < 0.2):
+		text = rng.choice(WATCH_JUNK)
+		if (rng.random() < 0.5): text = "%s+%s" % (text, rng.choice(WATCH_JUNK))
+		if (rng.random() < 0.3): text = randomText(rng, 12)
+		try:
+			spim_watch.compileExpression(text)
+		except spim_watch.WatchError:
+			pass
+		return
+	text, expected, nodes = watchExpression(rng, ints)
+	try:
+		watch = spim_watch.compileExpression(text)
+	except spim_watch.WatchError:
+		check("compileExpression", text, "too long", "too long" if (nodes > spim_watch.MAX_NODES) else "WatchError")
+		return
+	check("compileExpression", text, True, nodes <= spim_watch.MAX_NODES)
+	check("Watch.value", text, expected, watch.value(regs, FuzzMemory(), FuzzSymbols()))
+
+TARGETS = [
+	("hex", target_hex),
+	("translate", target_translate),
+	("registers", target_registers),
+	("code", target_code),
+	("display", target_display),
+	("watch", target_watch),
+]
+
+def caseRandom(seed, name, case):
+	return random.Random("%d:%s:%d" % (seed, name, case))
+
+def run(name, func, seed, cases, budget):
+	"""Run the numbered cases of one target until they are done or the time is up. Returns (cases run, seconds)."""
+	start = time.time()
+	done = 0
+	for case in cases:
+		if (time.time() - start > budget): break
+		try:
+			func(caseRandom(seed, name, case))
+		except Mismatch, e:
+			print "MISMATCH in %s, case %d (rerun with --seed %d --case %d %s)" % (e.what, case, seed, case, name)
+			print "  input:    %r" % (e.given,)
+			print "  expected: %r" % (e.expected,)
+			print "  actual:   %r" % (e.actual,)
+			raise SystemExit(1)
+		except Exception:
+			# The references never raise on these inputs, so neither may the add-on.
+			print "EXCEPTION in %s, case %d (rerun with --seed %d --case %d %s)" % (name, case, seed, case, name)
+			raise
+		done += 1
+	return done, time.time() - start
+
+def main(args):
+	parser = optparse.OptionParser(usage="%prog [--seed N] [--cases N] [--budget SECONDS] [--min-rate N] [--case N] [target ...]")
+	parser.add_option("--seed", type="int", default=1, help="seed the cases are made from")
+	parser.add_option("--cases", type="int", default=2000, help="cases per target")
+	parser.add_option("--budget", type="float", default=30.0, help="seconds for all the targets together")
+	parser.add_option("--min-rate", type="float", default=200.0, help="fail if a target checks fewer cases per second")
+	parser.add_option("--case", type="int", default=None, help="run only this case number")
+	options, args = parser.parse_args(args)
+	targets = [(name, func) for name, func in TARGETS if (not args or name in args)]
+	if (not targets):
+		parser.error("no such target; targets are %s" % ", ".join(name for name, func in TARGETS))
+	status = 0
+	for name, func in targets:
+		if (options.case is not None):
+			run(name, func, options.seed, [options.case], options.budget)
+			print "%-10s case %d matches" % (name, options.case)
+			continue
+		done, seconds = run(name, func, options.seed, xrange(options.cases), options.budget / len(targets))
+		rate = done / seconds if (seconds > 0) else float(done)
+		note = ""
+		if (rate < options.min_rate):
+			note = "  TOO SLOW (under %d cases/s)" % options.min_rate
+			status = 1
+		print "%-10s %7d cases match %8.0f cases/s%s" % (name, done, rate, note)
+	return status
+
+if (__name__ == "__main__"):
+	sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,81 @@
+# PC Spim Session Replayer
+# by Flint Million <flint.million@mnsu.edu>
+
+# Plays back a session recorded with NVDA+Shift+S (see nvda/spim_session.py)
+# against the real app module and SPIM Braille driver code, using the
+# stand-ins in nvda_shims.py in place of NVDA and PCSpim. Reports how long each
+# gesture and live update took, the CPU time used and the frames written, so
+# changes to the scraping, parsing and display paths can be compared run to run.
+#
+# Usage:
+#   python spim_replay.py [--realtime] [--cells N] [--latency MS] [--bandwidth CELLS] session.jsonl
+#
+# Frames go to the virtual display in nvda/spim_virtual.py, which can be
+# given the write latency and bandwidth of a real display; its frame rate,
+# coalesced frames and latency are reported too.
+
+import sys, optparse
+
+import nvda_shims
+shimState = nvda_shims.install()
+
+import api, braille, config
+import spim_virtual, spim_session
+import spim_desktop
+
+class ReplayDisplayDriver(spim_virtual.BrailleDisplayDriver):
+	"""The virtual display, laid out like the Focus driver, with no write delay unless one is given."""
+	name = "spim_replay"
+	description = "SPIM Braille (Replay)"
+
+	def __init__(self, numCells=40, latency=0.0, bandwidth=None):
+		super(ReplayDisplayDriver, self).__init__(numCells=numCells, latency=latency, bandwidth=bandwidth)
+
+def loadAppModule(events, numCells, latency=0.0, bandwidth=None):
+	"""Set up the stand-in desktop and driver, and create the app module."""
+	desktop = spim_desktop.PCSpimDesktop()
+	api.desktop = desktop
+	driver = ReplayDisplayDriver(numCells, latency, bandwidth)
+	braille.handler.display = driver
+	start = events[0] if (events and events[0]['event'] == "start") else {'info': {}}
+	config.conf['pcspim'] = dict(start['info'].get('config', {}))
+
+	import pcspim
+	appModule = pcspim.AppModule(1, "pcspim")
+	# Live mode updates are replayed from the recorded ticks rather than from a timer thread.
+	appModule._updateThread = lambda: None
+	return appModule, desktop, driver
+
+def main(args):
+	parser = optparse.OptionParser(usage="%prog [--realtime] [--cells N] [--latency MS] [--bandwidth CELLS] session.jsonl")
+	parser.add_option("--realtime", action="store_true", default=False, help="keep the recorded timing instead of running at full speed")
+	parser.add_option("--cells", type="int", default=40, help="display size to lay frames out for (14, 40, 80 or another size)")
+	parser.add_option("--latency", type="float", default=0.0, help="simulated time to write a frame, in milliseconds")
+	parser.add_option("--bandwidth", type="float", default=None, help="simulated cells written per second")
+	options, args = parser.parse_args(args)
+	if (len(args) != 1):
+		parser.error("a session file is required")
+
+	events = spim_session.readSession(args[0])
+	appModule, desktop, driver = loadAppModule(events, options.cells, options.latency / 1000.0, options.bandwidth)
+	replayer = spim_session.SessionReplayer(events, appModule, desktop, lambda: driver.frames, appModule.jobs.join)
+	results = replayer.run(realTime=options.realtime)
+	appModule.updateThreadDieFlag = 1
+
+	printReport(results, len([ev for ev in events if ev['event'] == "frame"]), driver.frames)
+	print "Virtual display: %s." % spim_virtual.formatStats(driver.stats())
+
+def printReport(results, recordedFrames, replayedFrames):
+	print "%-8s %-26s %10s %10s %7s" % ("EVENT", "SCRIPT", "WALL ms", "CPU ms", "FRAMES")
+	totalWall = totalCpu = 0.0
+	for kind, script, wall, cpu, frames in results:
+		print "%-8s %-26s %10.2f %10.2f %7d" % (kind, script, wall * 1000.0, cpu * 1000.0, frames)
+		totalWall += wall
+		totalCpu += cpu
+	print
+	print "%d events replayed: %.2f ms wall, %.2f ms CPU." % (len(results), totalWall * 1000.0, totalCpu * 1000.0)
+	print "Frames written: %d during replay, %d in the recording." % (replayedFrames, recordedFrames)
+	print "Spoken messages: %d." % len(shimState.messages)
+
+if (__name__ == "__main__"):
+	main(sys.argv[1:])
@@ -0,0 +1,913 @@
+# Simulated PCSpim
+# by Flint Million <flint.million@mnsu.edu>
+
+# A small MIPS assembler and interpreter that stands in for PCSpim. It loads
+# programs such as experiment/*.s, runs or steps them, and renders the
+# Registers, Text (Code), Data (Memory), Messages (Status) and Console panes in
+# PCSpim's text formats into the fake desktop from spim_desktop.py. With the
+# stand-ins from nvda_shims.py, the app module's whole live pipeline can then
+# run on any machine, including under loads that are hard to produce with the
+# real PCSpim: huge programs, many registers changing per step, console floods.
+#
+# Like PCSpim, the trap file (exceptions.s) is loaded first. It is read from
+# pcspim.zip at the top of the repository; it provides the __start code that
+# calls main, and the kernel exception handler.
+#
+# Usage:
+#   python spim_sim.py [--steps N] [--cells N] program.s
+# runs the program one step at a time with the app module in live mode,
+# updating the Braille registers after every step, and reports the cost.
+
+import sys, os, re, time, zipfile
+
+import nvda_shims
+sys.path.insert(0, nvda_shims.NVDA_DIR)
+import spim_mips
+import spim_desktop
+from spim_desktop import EF_CODE, EF_REGISTERS, EF_MEMORY, EF_STATUS, EF_CONSOLE
+
+REPO_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+PCSPIM_ZIP = os.path.join(REPO_DIR, "pcspim.zip")
+
+# Memory layout, as PCSpim sets it up
+TEXT_BASE = 0x00400000
+TEXT_LIMIT = 0x00440000
+DATA_SEGMENT = 0x10000000
+DATA_BASE = 0x10010000
+DATA_LIMIT = 0x10040000
+STACK_POINTER = 0x7fffeffc
+STACK_LIMIT = 0x80000000
+KTEXT_SEGMENT = 0x80000000
+KTEXT_BASE = 0x80000180
+KTEXT_LIMIT = 0x80010000
+KDATA_BASE = 0x90000000
+KDATA_LIMIT = 0x90010000
+GLOBAL_POINTER = 0x10008000
+STATUS_INITIAL = 0x3000ff10
+
+# Coprocessor 0 registers
+C0_BADVADDR = 8
+C0_STATUS = 12
+C0_CAUSE = 13
+C0_EPC = 14
+
+# Exception codes
+EXC_ADDRESS_LOAD = 4
+EXC_ADDRESS_STORE = 5
+EXC_SYSCALL = 8
+EXC_BREAKPOINT = 9
+EXC_RESERVED = 10
+EXC_OVERFLOW = 12
+
+# PCSpim names R30 s8 in the Registers window.
+PANE_REGISTER_NAMES = list(spim_mips.REGISTER_NAMES)
+PANE_REGISTER_NAMES[0] = "r0"
+PANE_REGISTER_NAMES[30] = "s8"
+
+REGISTER_NUMBERS = dict((name, num) for num, name in enumerate(spim_mips.REGISTER_NAMES))
+REGISTER_NUMBERS["s8"] = 30
+
+STATUS_BANNER = (
+	"SPIM Version 9.1.4 of January 20, 2013\r\n"
+	"Copyright 1990-2012 by James R. Larus.\r\n"
+	"All Rights Reserved.\r\n"
+	"See the file README for a full copyright notice.\r\n")
+
+class AssemblyError(Exception):
+	pass
+
+# ASSEMBLER
+
+# Encodings, built from the decoder's tables: name -> (opcode, shift, sub-table index, operand kind)
+ENCODINGS = {}
+for _op, _entry in enumerate(spim_mips.OPCODES):
+	if (_entry is not None): ENCODINGS[_entry[0]] = (_op, 0, 0, _entry[2])
+for _op, (_table, _shift, _mask) in spim_mips.SUBTABLES.items():
+	for _index, _entry in enumerate(_table):
+		if (_entry is not None and not _entry[0].startswith("cop1")):
+			ENCODINGS.setdefault(_entry[0], (_op, _shift, _index, _entry[2]))
+
+def parseRegister(text):
+	text = text.strip()
+	if (not text.startswith("$")): raise AssemblyError("expected a register, got '%s'" % text)
+	name = text[1:]
+	if (name.isdigit()): return int(name)
+	try:
+		return REGISTER_NUMBERS[name]
+	except KeyError:
+		raise AssemblyError("unknown register '%s'" % text)
+
+def isRegister(text):
+	return text.strip().startswith("$")
+
+def parseNumber(text):
+	text = text.strip()
+	if (text.startswith("'")):
+		return ord(text[1:-1].decode("string_escape"))
+	return int(text, 0)
+
+def isNumber(text):
+	try:
+		parseNumber(text)
+		return True
+	except (ValueError, IndexError):
+		return False
+
+def splitOperands(text):
+	"""Split an operand list. Operands may be separated by commas or spaces, as spim allows."""
+	text = text.strip()
+	if (not text): return []
+	return [t for t in re.split(r"\s*,\s*|\s+", text) if t]
+
+def stripComment(line):
+	"""Remove a '#' comment, leaving '#' inside string literals alone."""
+	inString = False
+	escaped = False
+	for i, c in enumerate(line):
+		if (escaped):
+			escaped = False
+		elif (c == "\\"):
+			escaped = True
+		elif (c == '"'):
+			inString = not inString
+		elif (c == "#" and not inString):
+			return line[:i]
+	return line
+
+def hi16(value):
+	"""Upper half for a lui/ori pair."""
+	return (value >> 16) & 0xffff
+
+def lo16(value):
+	return value & 0xffff
+
+def hiAdjusted(value):
+	"""Upper half for a lui/signed-offset pair (lw, sw)."""
+	return ((value + 0x8000) >> 16) & 0xffff
+
+class Instruction(object):
+	"""One machine instruction produced by the assembler."""
+
+	def __init__(self, mnemonic, operands, label=None):
+		self.mnemonic = mnemonic
+		# Operands are in assembly order: registers as numbers, immediates as numbers,
+		# branch and jump targets as addresses.
+		self.operands = operands
+		# Label named by the source statement, for the disassembly ("[starting]").
+		self.label = label
+		self.address = 0
+		self.word = 0
+		self.sourceLine = None
+		self.sourceText = ""
+
+class Program(object):
+	"""The result of assembling one or more source files."""
+
+	def __init__(self):
+		self.text = [] # Instructions, in address order per segment
+		self.data = {} # word address -> word
+		self.labels = {}
+		self.sources = [] # (file name, lines)
+
+class Assembler(object):
+	"""A two pass assembler for the subset of spim's assembly language used in class."""
+
+	def __init__(self, program=None):
+		self.program = program or Program()
+		self.pc = {'text': TEXT_BASE, 'ktext': KTEXT_BASE, 'data': DATA_BASE, 'kdata': KDATA_BASE}
+
+	def assemble(self, sources):
+		"""Assemble a list of (source text, file name) pairs, which may use each other's labels."""
+		files = []
+		for source, fileName in sources:
+			lines = source.replace("\r\n", "\n").split("\n")
+			self.program.sources.append((fileName, lines))
+			files.append((fileName, lines))
+		start = dict(self.pc)
+		# Pass 1 lays out labels; pass 2 emits code and data.
+		for emit in (False, True):
+			self.pc = dict(start)
+			for fileName, lines in files:
+				self.segment = 'text'
+				for number, line in enumerate(lines):
+					try:
+						self.assembleLine(line, number + 1, emit)
+					except AssemblyError, e:
+						raise AssemblyError("%s line %d: %s" % (fileName, number + 1, e))
+		return self.program
+
+	def assembleLine(self, line, number, emit):
+		statement = stripComment(line).strip()
+		while (True):
+			m = re.match(r"^([A-Za-z_.$][\w.$]*)\s*:\s*", statement)
+			if (m is None): break
+			if (not emit): self.program.labels[m.group(1)] = self.pc[self.segment]
+			statement = statement[m.end():]
+		if (not statement): return
+		parts = statement.split(None, 1)
+		op = parts[0]
+		rest = parts[1] if (len(parts) > 1) else ""
+		if (op.startswith(".")):
+			self.directive(op, rest, emit)
+			return
+		if (self.segment not in ('text', 'ktext')):
+			raise AssemblyError("instruction outside a text segment")
+		instructions = self.expand(op.lower(), splitOperands(rest), emit)
+		for i, ins in enumerate(instructions):
+			ins.address = self.pc[self.segment]
+			self.pc[self.segment] += 4
+			if (emit):
+				if (i == 0):
+					ins.sourceLine = number
+					ins.sourceText = line.strip().replace("\t", " ")
+				ins.word = encode(ins)
+				self.program.text.append(ins)
+
+	# Directives
+
+	def directive(self, name, rest, emit):
+		if (name in (".text", ".ktext", ".data", ".kdata")):
+			self.segment = name[1:]
+			if (rest.strip()): self.pc[self.segment] = parseNumber(rest)
+		elif (name in (".globl", ".set", ".extern", ".ent", ".end")):
+			pass
+		elif (name in (".asciiz", ".ascii")):
+			text = self.parseString(rest)
+			if (name == ".asciiz"): text += "\0"
+			self.emitBytes(text, emit)
+		elif (name == ".byte"):
+			self.emitBytes("".join(chr(parseNumber(v) & 0xff) for v in splitOperands(rest)), emit)
+		elif (name == ".half"):
+			self.align(1)
+			for v in splitOperands(rest):
+				value = parseNumber(v) & 0xffff
+				self.emitBytes(chr(value & 0xff) + chr(value >> 8), emit)
+		elif (name == ".word"):
+			self.align(2)
+			for v in splitOperands(rest):
+				value = self.resolve(v, emit)
+				self.emitWord(value, emit)
+		elif (name == ".space"):
+			self.pc[self.segment] += parseNumber(rest)
+		elif (name == ".align"):
+			self.align(parseNumber(rest))
+		else:
+			raise AssemblyError("unsupported directive %s" % name)
+
+	def parseString(self, rest):
+		m = re.match(r'^\s*"((?:[^"\\]|\\.)*)"\s*$', rest)
+		if (m is None): raise AssemblyError("expected a string")
+		return m.group(1).decode("string_escape")
+
+	def align(self, power):
+		size = 1 << power
+		self.pc[self.segment] = (self.pc[self.segment] + size - 1) & ~(size - 1)
+
+	def emitBytes(self, data, emit):
+		for c in data:
+			if (emit): storeByte(self.program.data, self.pc[self.segment], ord(c))
+			self.pc[self.segment] += 1
+
+	def emitWord(self, value, emit):
+		if (emit): self.program.data[self.pc[self.segment]] = value & 0xffffffff
+		self.pc[self.segment] += 4
+
+	def resolve(self, text, emit):
+		"""Value of a number or label operand. Labels resolve to 0 in pass 1."""
+		if (isNumber(text)): return parseNumber(text)
+		m = re.match(r"^([A-Za-z_.$][\w.$]*)\s*([+-]\s*\d+)?$", text)
+		if (m is None): raise AssemblyError("bad operand '%s'" % text)
+		offset = int(m.group(2).replace(" ", "")) if m.group(2) else 0
+		if (not emit): return offset
+		try:
+			return self.program.labels[m.group(1)] + offset
+		except KeyError:
+			raise AssemblyError("undefined label '%s'" % m.group(1))
+
+	# Instructions and pseudo-instructions
+
+	def expand(self, op, args, emit):
+		"""Turn one source statement into machine instructions, expanding pseudo-instructions as spim does."""
+		I = Instruction
+		AT = 1
+		if (op == "nop"):
+			return [I("sll", [0, 0, 0])]
+		if (op == "move"):
+			return [I("addu", [parseRegister(args[0]), 0, parseRegister(args[1])])]
+		if (op == "li"):
+			return self.loadImmediate(parseRegister(args[0]), parseNumber(args[1]))
+		if (op == "la"):
+			address = self.resolve(args[1], emit)
+			return [I("lui", [AT, hi16(address)], args[1]), I("ori", [parseRegister(args[0]), AT, lo16(address)], args[1])]
+		if (op in ("not", "neg", "negu")):
+			rd, rs = parseRegister(args[0]), parseRegister(args[1])
+			if (op == "not"): return [I("nor", [rd, rs, 0])]
+			return [I("sub" if (op == "neg") else "subu", [rd, 0, rs])]
+		if (op == "b"):
+			return [I("bgez", [0, self.resolve(args[0], emit)], args[0])]
+		if (op in ("beqz", "bnez")):
+			return [I("beq" if (op == "beqz") else "bne", [parseRegister(args[0]), 0, self.resolve(args[1], emit)], args[1])]
+		if (op in ("blt", "bgt", "ble", "bge", "bltu", "bgtu", "bleu", "bgeu")):
+			rs = parseRegister(args[0])
+			out = []
+			if (isRegister(args[1])):
+				rt = parseRegister(args[1])
+			else:
+				out = self.loadImmediate(AT, parseNumber(args[1]))
+				rt = AT
+			compare = "sltu" if op.endswith("u") else "slt"
+			swapped = op[:3] in ("bgt", "ble")
+			branch = "bne" if op[:3] in ("blt", "bgt") else "beq"
+			out.append(I(compare, [AT, rt, rs] if swapped else [AT, rs, rt]))
+			out.append(I(branch, [AT, 0, self.resolve(args[2], emit)], args[2]))
+			return out
+		if (op in ("mul", "mulo", "mulou") and len(args) == 3 and not isRegister(args[2])):
+			return self.loadImmediate(AT, parseNumber(args[2])) + [I("mul", [parseRegister(args[0]), parseRegister(args[1]), AT])]
+		if (op in ("div", "divu", "rem", "remu") and len(args) == 3):
+			rd, rs, rt = parseRegister(args[0]), parseRegister(args[1]), parseRegister(args[2])
+			return [I(op[:3] if op.startswith("div") else "div" + op[3:], [rs, rt]), I("mflo" if op.startswith("div") else "mfhi", [rd])]
+
+		if (op not in ENCODINGS):
+			raise AssemblyError("unknown instruction '%s'" % op)
+		kind = ENCODINGS[op][3]
+
+		# Immediate forms with a register where the immediate goes, or two operands for three.
+		if (kind == spim_mips.OP_RT_RS_IMM):
+			if (len(args) == 2): args = [args[0]] + args
+			if (isRegister(args[2])):
+				registerForms = {"addi": "add", "addiu": "addu", "andi": "and", "ori": "or", "xori": "xor", "slti": "slt", "sltiu": "sltu"}
+				return [I(registerForms.get(op, op), [parseRegister(a) for a in args])]
+			return [I(op, [parseRegister(args[0]), parseRegister(args[1]), parseNumber(args[2]) & 0xffff])]
+		if (kind == spim_mips.OP_RD_RS_RT):
+			if (len(args) == 2): args = [args[0]] + args
+			if (not isRegister(args[2])):
+				immediateForms = {"add": "addi", "addu": "addiu", "and": "andi", "or": "ori", "xor": "xori", "slt": "slti", "sltu": "sltiu"}
+				if (op in immediateForms):
+					return self.expand(immediateForms[op], args, emit)
+				return self.loadImmediate(AT, parseNumber(args[2])) + [I(op, [parseRegister(args[0]), parseRegister(args[1]), AT])]
+			return [I(op, [parseRegister(a) for a in args])]
+		if (kind == spim_mips.OP_RT_OFF_RS):
+			rt = parseRegister(args[0])
+			m = re.match(r"^(.*?)\(\s*(\$\w+)\s*\)$", args[1])
+			if (m is not None and (m.group(1) == "" or isNumber(m.group(1)))):
+				return [I(op, [rt, parseNumber(m.group(1) or "0"), parseRegister(m.group(2))])]
+			# label or label($reg)
+			address = self.resolve(m.group(1) if m else args[1], emit)
+			out = [I("lui", [AT, hiAdjusted(address)], m.group(1) if m else args[1])]
+			if (m is not None):
+				out.append(I("addu", [AT, AT, parseRegister(m.group(2))]))
+			out.append(I(op, [rt, lo16(address), AT]))
+			return out
+		if (kind in (spim_mips.OP_RS_RT_BR, spim_mips.OP_RS_BR)):
+			if (kind == spim_mips.OP_RS_RT_BR and not isRegister(args[1])):
+				return self.loadImmediate(AT, parseNumber(args[1])) + [I(op, [parseRegister(args[0]), AT, self.resolve(args[2], emit)], args[2])]
+			regs = [parseRegister(a) for a in args[:-1]]
+			return [I(op, regs + [self.resolve(args[-1], emit)], args[-1])]
+		if (kind == spim_mips.OP_TARGET):
+			return [I(op, [self.resolve(args[0], emit)], args[0])]
+		if (kind == spim_mips.OP_RD_RT_SA):
+			if (isRegister(args[2])):
+				return [I(op + "v", [parseRegister(a) for a in args])]
+			return [I(op, [parseRegister(args[0]), parseRegister(args[1]), parseNumber(args[2]) & 0x1f])]
+		if (kind == spim_mips.OP_RT_IMM):
+			return [I(op, [parseRegister(args[0]), parseNumber(args[1]) & 0xffff])]
+		if (kind == spim_mips.OP_RD_RS and op == "jalr" and len(args) == 1):
+			return [I(op, [31, parseRegister(args[0])])]
+		return [I(op, [parseRegister(a) for a in args])]
+
+	def loadImmediate(self, reg, value):
+		"""Expand li the way spim does."""
+		I = Instruction
+		if (0 <= value <= 0xffff):
+			return [I("ori", [reg, 0, value])]
+		if (-0x8000 <= value < 0):
+			return [I("addiu", [reg, 0, value & 0xffff])]
+		value &= 0xffffffff
+		if (lo16(value) == 0):
+			return [I("lui", [reg, hi16(value)])]
+		return [I("lui", [1, hi16(value)]), I("ori", [reg, 1, lo16(value)])]
+
+def encode(ins):
+	"""Encode an assembled instruction into its word."""
+	op, shift, index, kind = ENCODINGS[ins.mnemonic]
+	word = (op << 26) | (index << shift)
+	a = ins.operands
+	K = spim_mips
+	if (kind == K.OP_RD_RS_RT): word |= (a[1] << 21) | (a[2] << 16) | (a[0] << 11)
+	elif (kind == K.OP_RD_RT_SA): word |= (a[1] << 16) | (a[0] << 11) | (a[2] << 6)
+	elif (kind == K.OP_RD_RT_RS): word |= (a[2] << 21) | (a[1] << 16) | (a[0] << 11)
+	elif (kind == K.OP_RS): word |= (a[0] << 21)
+	elif (kind == K.OP_RD): word |= (a[0] << 11)
+	elif (kind == K.OP_RS_RT): word |= (a[0] << 21) | (a[1] << 16)
+	elif (kind == K.OP_RD_RS): word |= (a[1] << 21) | (a[0] << 11)
+	elif (kind == K.OP_RT_RS_IMM): word |= (a[1] << 21) | (a[0] << 16) | (a[2] & 0xffff)
+	elif (kind == K.OP_RT_IMM): word |= (a[0] << 16) | (a[1] & 0xffff)
+	elif (kind == K.OP_RT_OFF_RS): word |= (a[2] << 21) | (a[0] << 16) | (a[1] & 0xffff)
+	elif (kind == K.OP_RS_RT_BR): word |= (a[0] << 21) | (a[1] << 16) | (((a[2] - ins.address - 4) >> 2) & 0xffff)
+	elif (kind == K.OP_RS_BR): word |= (a[0] << 21) | (((a[1] - ins.address - 4) >> 2) & 0xffff)
+	elif (kind == K.OP_TARGET): word |= (a[0] >> 2) & 0x3ffffff
+	elif (kind == K.OP_RT_RD): word |= (a[0] << 16) | (a[1] << 11)
+	return word
+
+def disassemble(ins):
+	"""PCSpim style disassembly: numeric registers and decimal immediates, with the source label in brackets."""
+	info = spim_mips.decodeInstruction(ins.word, ins.address)
+	kind = ENCODINGS[ins.mnemonic][3]
+	K = spim_mips
+	r = lambda n: "$%d" % n
+	name = ins.mnemonic
+	if (kind == K.OP_NONE): text = name
+	elif (kind == K.OP_RD_RS_RT): text = "%s %s, %s, %s" % (name, r(info['rd']), r(info['rs']), r(info['rt']))
+	elif (kind == K.OP_RD_RT_SA): text = "%s %s, %s, %d" % (name, r(info['rd']), r(info['rt']), info['shamt'])
+	elif (kind == K.OP_RD_RT_RS): text = "%s %s, %s, %s" % (name, r(info['rd']), r(info['rt']), r(info['rs']))
+	elif (kind == K.OP_RS): text = "%s %s" % (name, r(info['rs']))
+	elif (kind == K.OP_RD): text = "%s %s" % (name, r(info['rd']))
+	elif (kind == K.OP_RS_RT): text = "%s %s, %s" % (name, r(info['rs']), r(info['rt']))
+	elif (kind == K.OP_RD_RS): text = "%s %s, %s" % (name, r(info['rd']), r(info['rs']))
+	elif (kind == K.OP_RT_RS_IMM): text = "%s %s, %s, %d" % (name, r(info['rt']), r(info['rs']), info['imm'] if name in ("addi", "addiu", "slti", "sltiu") else info['imm'] & 0xffff)
+	elif (kind == K.OP_RT_IMM): text = "%s %s, %d" % (name, r(info['rt']), info['imm'] & 0xffff)
+	elif (kind == K.OP_RT_OFF_RS): text = "%s %s, %d(%s)" % (name, r(info['rt']), info['imm'], r(info['rs']))
+	elif (kind == K.OP_RS_RT_BR): text = "%s %s, %s, %d" % (name, r(info['rs']), r(info['rt']), info['imm'] << 2)
+	elif (kind == K.OP_RS_BR): text = "%s %s, %d" % (name, r(info['rs']), info['imm'] << 2)
+	elif (kind == K.OP_TARGET): text = "%s 0x%08x" % (name, info['jump_target'])
+	elif (kind == K.OP_RT_RD): text = "%s %s, %s" % (name, r(info['rt']), r(info['rd']))
+	else: text = name
+	if (ins.label):
+		if (kind in (K.OP_RS_RT_BR, K.OP_RS_BR)):
+			text += " [%s-0x%08x]" % (ins.label, ins.address)
+		else:
+			text += " [%s]" % ins.label
+	return text
+
+# MEMORY
+
+def storeByte(memory, address, value):
+	"""Store a byte into a word-addressed little-endian memory dictionary."""
+	wordAddress = address & ~3
+	shift = (address & 3) * 8
+	memory[wordAddress] = (memory.get(wordAddress, 0) & ~(0xff << shift) & 0xffffffff) | ((value & 0xff) << shift)
+
+def loadByte(memory, address):
+	return (memory.get(address & ~3, 0) >> ((address & 3) * 8)) & 0xff
+
+def toSigned(value):
+	value &= 0xffffffff
+	return value - 0x100000000 if (value & 0x80000000) else value
+
+class SimulatorException(Exception):
+	"""A MIPS exception raised while executing an instruction."""
+
+	def __init__(self, code, badAddress=None):
+		Exception.__init__(self, code)
+		self.code = code
+		self.badAddress = badAddress
+
+# THE SIMULATOR
+
+class PCSpimSimulator(object):
+	"""Runs a program and keeps the fake PCSpim panes up to date."""
+
+	def __init__(self, desktop=None, trapFile=True):
+		self.desktop = desktop or spim_desktop.PCSpimDesktop()
+		self.trapFile = trapFile
+		self.input = [] # values returned by the read syscalls, in order
+		self.reset()
+
+	def reset(self):
+		self.program = Program()
+		self.regs = [0] * 32
+		self.regs[28] = GLOBAL_POINTER
+		self.regs[29] = STACK_POINTER
+		self.fpRegs = [0.0] * 32
+		self.hi = self.lo = 0
+		self.cop0 = {C0_BADVADDR: 0, C0_STATUS: STATUS_INITIAL, C0_CAUSE: 0, C0_EPC: 0}
+		self.pc = TEXT_BASE
+		self.memory = {}
+		self.code = {}
+		self.console = ""
+		self.status = STATUS_BANNER
+		self.halted = False
+		self.steps = 0
+		self.memoryDirty = True
+
+	def loadSource(self, source, fileName="<source>"):
+		"""Assemble and load a program, after the trap file. Replaces any loaded program."""
+		self.reset()
+		sources = []
+		trap = self.trapSource()
+		if (trap is not None):
+			sources.append((trap, "exceptions.s"))
+			self.status += "C:\\Program Files\\PCSpim\\exceptions.s successfully loaded\r\n"
+		sources.append((source, fileName))
+		self.status += "%s successfully loaded\r\n" % fileName
+		Assembler(self.program).assemble(sources)
+		self.memory = dict(self.program.data)
+		self.code = {}
+		for ins in self.program.text:
+			info = spim_mips.decodeInstruction(ins.word, ins.address)
+			self.code[ins.address] = (EXECUTE.get(ins.mnemonic, _reserved), info)
+		self.pc = TEXT_BASE if (trap is not None) else self.program.labels.get("main", TEXT_BASE)
+		self.desktop.children[1].children[0].name = "PCSpim - %s" % os.path.basename(fileName)
+		self.renderAll()
+
+	def loadFile(self, fileName):
+		self.loadSource(open(fileName).read(), fileName)
+
+	def trapSource(self):
+		"""The trap file text, or None if it isn't to be used or can't be found."""
+		if (self.trapFile is True):
+			try:
+				return zipfile.ZipFile(PCSPIM_ZIP).read("exceptions.s")
+			except (IOError, KeyError):
+				return None
+		if (self.trapFile):
+			return open(self.trapFile).read()
+		return None
+
+	# Execution
+
+	def step(self, count=1):
+		"""Execute up to count instructions, then update the panes."""
+		for i in xrange(count):
+			if (self.halted): break
+			self.execute()
+		self.renderChanged()
+
+	def run(self, maxSteps=1000000):
+		"""Run until the program exits, stops for input, or maxSteps instructions have run."""
+		self.step(maxSteps)
+
+	def execute(self):
+		pc = self.pc
+		try:
+			handler, info = self.code[pc]
+		except KeyError:
+			self.exception(SimulatorException(6, pc), pc)
+			return
+		self.nextPc = (pc + 4) & 0xffffffff
+		try:
+			handler(self, info)
+		except SimulatorException, e:
+			self.exception(e, pc)
+			return
+		self.regs[0] = 0
+		self.pc = self.nextPc
+		self.steps += 1
+
+	def exception(self, e, pc):
+		"""Enter the kernel exception handler, as PCSpim does, and note the exception in the Status pane."""
+		self.cop0[C0_EPC] = pc
+		self.cop0[C0_CAUSE] = (e.code & 0x1f) << 2
+		if (e.badAddress is not None):
+			self.cop0[C0_BADVADDR] = e.badAddress & 0xffffffff
+		if (e.code in (EXC_ADDRESS_LOAD, EXC_ADDRESS_STORE, 6, 7)):
+			self.status += "Exception occurred at PC=0x%08x\r\n  Bad address in %s: 0x%08x\r\n" % (
+				pc, "data/stack write" if e.code == EXC_ADDRESS_STORE else "data/stack read", self.cop0[C0_BADVADDR])
+		elif (e.code == EXC_OVERFLOW):
+			self.status += "Exception occurred at PC=0x%08x\r\n  Arithmetic overflow\r\n" % pc
+		else:
+			self.status += "Exception %d occurred at PC=0x%08x\r\n" % (e.code, pc)
+		if (KTEXT_BASE in self.code):
+			self.pc = KTEXT_BASE
+		else:
+			self.halted = True
+		self.steps += 1
+
+	def checkAddress(self, address, size, store=False):
+		if (address & (size - 1)) or not (TEXT_BASE <= address < KDATA_LIMIT):
+			raise SimulatorException(EXC_ADDRESS_STORE if store else EXC_ADDRESS_LOAD, address)
+
+	def load(self, address, size, signed=False):
+		address &= 0xffffffff
+		self.checkAddress(address, size)
+		word = self.memory.get(address & ~3, 0)
+		if (size == 4): value = word
+		else:
+			shift = (address & 3) * 8
+			value = (word >> shift) & ((1 << (size * 8)) - 1)
+			if (signed and value & (1 << (size * 8 - 1))): value -= 1 << (size * 8)
+		return value & 0xffffffff
+
+	def store(self, address, size, value):
+		address &= 0xffffffff
+		self.checkAddress(address, size, True)
+		if (size == 4):
+			self.memory[address] = value & 0xffffffff
+		else:
+			shift = (address & 3) * 8
+			mask = ((1 << (size * 8)) - 1) << shift
+			wordAddress = address & ~3
+			self.memory[wordAddress] = (self.memory.get(wordAddress, 0) & ~mask & 0xffffffff) | ((value << shift) & mask)
+		self.memoryDirty = True
+
+	def readString(self, address):
+		out = []
+		while (True):
+			c = loadByte(self.memory, address)
+			if (c == 0 or len(out) > 65536): break
+			out.append(chr(c))
+			address += 1
+		return "".join(out)
+
+	def syscall(self):
+		code = self.regs[2]
+		if (code == 1):
+			self.output(str(toSigned(self.regs[4])))
+		elif (code == 4):
+			self.output(self.readString(self.regs[4]))
+		elif (code == 11):
+			self.output(chr(self.regs[4] & 0xff))
+		elif (code in (5, 12)):
+			value = self.input.pop(0) if self.input else 0
+			self.regs[2] = (ord(value[0]) if isinstance(value, str) else value) & 0xffffffff
+		elif (code == 8):
+			value = str(self.input.pop(0)) if self.input else ""
+			address, length = self.regs[4], self.regs[5]
+			for i, c in enumerate((value + "\n")[:max(length - 1, 0)] + "\0"):
+				storeByte(self.memory, address + i, ord(c))
+			self.memoryDirty = True
+		elif (code in (10, 17)):
+			self.halted = True
+		else:
+			raise SimulatorException(EXC_SYSCALL)
+
+	def output(self, text):
+		# The PCSpim console separates lines with a bare carriage return.
+		self.console += text.replace("\n", "\r")
+
+	# Rendering
+
+	def renderAll(self):
+		self.desktop.setPanes({EF_CODE: self.renderCode()})
+		self.memoryDirty = True
+		self._lastConsole = self._lastStatus = None
+		self.renderChanged()
+
+	def renderChanged(self):
+		"""Update the panes that can have changed since the last render."""
+		panes = {EF_REGISTERS: self.renderRegisters()}
+		if (self.memoryDirty):
+			panes[EF_MEMORY] = self.renderMemory()
+			self.memoryDirty = False
+		if (self.console != self._lastConsole):
+			panes[EF_CONSOLE] = self._lastConsole = self.console
+		if (self.status != self._lastStatus):
+			panes[EF_STATUS] = self._lastStatus = self.status
+		self.desktop.setPanes(panes)
+
+	def renderRegisters(self):
+		out = [
+			" PC      = %08x    EPC     = %08x    Cause   = %08x    BadVAddr= %08x" % (self.pc, self.cop0[C0_EPC], self.cop0[C0_CAUSE], self.cop0[C0_BADVADDR]),
+			" Status  = %08x    HI      = %08x    LO      = %08x" % (self.cop0[C0_STATUS], self.hi, self.lo),
+			"                                 General Registers",
+		]
+		for row in range(8):
+			out.append(" " + "  ".join("R%-2d (%s) = %08x" % (n, PANE_REGISTER_NAMES[n], self.regs[n]) for n in (row, row + 8, row + 16, row + 24)))
+		out.append("")
+		out.append("                              Double Floating Point Registers")
+		for row in range(4):
+			out.append(" " + "  ".join("FP%-2d    = %-10s" % (n, "%.6f" % self.fpRegs[n]) for n in (row * 2, row * 2 + 8, row * 2 + 16, row * 2 + 24)))
+		out.append("                              Single Floating Point Registers")
+		for row in range(8):
+			out.append(" " + "  ".join("FP%-2d    = %-10s" % (n, "%.6f" % self.fpRegs[n]) for n in (row, row + 8, row + 16, row + 24)))
+		return "\r\n".join(out) + "\r\n"
+
+	def renderCode(self):
+		out = []
+		segments = ((" User Text Segment [%08x]..[%08x]" % (TEXT_BASE, TEXT_LIMIT), TEXT_BASE, TEXT_LIMIT),
+			(" Kernel Text Segment [%08x]..[%08x]" % (KTEXT_SEGMENT, KTEXT_LIMIT), KTEXT_SEGMENT, KTEXT_LIMIT))
+		for title, start, limit in segments:
+			out.append(title)
+			for ins in self.program.text:
+				if not (start <= ins.address < limit): continue
+				text = disassemble(ins)
+				if (ins.sourceLine is not None):
+					text = "%s; %d: %s" % (text.ljust(32), ins.sourceLine, ins.sourceText)
+				out.append("[0x%08x]\t0x%08x  %s" % (ins.address, ins.word, text))
+			out.append("")
+		return "\r\n".join(out)
+
+	def renderMemory(self):
+		out = []
+		stackStart = min(self.regs[29], STACK_POINTER) & ~0xf
+		segments = ((" User data segment [%08x]..[%08x]" % (DATA_SEGMENT, DATA_LIMIT), DATA_SEGMENT, DATA_LIMIT),
+			(" User Stack [%08x]..[%08x]" % (self.regs[29], STACK_LIMIT), stackStart, STACK_LIMIT),
+			(" Kernel data segment [%08x]..[%08x]" % (KDATA_BASE, KDATA_LIMIT), KDATA_BASE, KDATA_LIMIT))
+		for title, start, limit in segments:
+			out.append(title)
+			out.extend(renderWords(self.memory, start, limit))
+			out.append("")
+		return "\r\n".join(out)
+
+def renderWords(memory, start, limit):
+	"""Render memory rows of four words as PCSpim does, collapsing runs of zero rows into a range."""
+	rows = sorted(set(a & ~0xf for a, v in memory.items() if start <= a < limit and v != 0))
+	out = []
+	address = start
+	for row in rows + [limit]:
+		if (row > address):
+			# A run of zero words
+			if (row - address > 16):
+				out.append("[0x%08x]...[0x%08x]\t0x00000000" % (address, row - 4))
+			else:
+				out.append("[0x%08x]    0x00000000  0x00000000  0x00000000  0x00000000" % address)
+		if (row >= limit): break
+		out.append("[0x%08x]    " % row + "  ".join("0x%08x" % memory.get(row + 4*i, 0) for i in range(4)))
+		address = row + 16
+	return out
+
+# Instruction semantics, indexed by mnemonic. Each takes the simulator and the decoded fields.
+
+def _reserved(sim, f):
+	raise SimulatorException(EXC_RESERVED)
+
+def _add(sim, f, a, b, rd):
+	result = toSigned(a) + toSigned(b)
+	if not (-0x80000000 <= result <= 0x7fffffff):
+		raise SimulatorException(EXC_OVERFLOW)
+	sim.regs[rd] = result & 0xffffffff
+
+def _branch(sim, f, taken):
+	if (taken): sim.nextPc = f['branch_target']
+
+def _mult(sim, product):
+	product &= 0xffffffffffffffff
+	sim.hi, sim.lo = product >> 32, product & 0xffffffff
+
+def _div(sim, a, b, signed):
+	if (b == 0): return # result undefined; spim leaves HI and LO alone
+	if (signed):
+		a, b = toSigned(a), toSigned(b)
+		q = abs(a) // abs(b)
+		if ((a < 0) != (b < 0)): q = -q
+		r = a - q * b
+	else:
+		q, r = a // b, a % b
+	sim.lo, sim.hi = q & 0xffffffff, r & 0xffffffff
+
+def _setReg(name, func):
+	"""Semantics for R format instructions that only compute rd from rs, rt and shamt."""
+	def execute(sim, f):
+		r = sim.regs
+		r[f['rd']] = func(r[f['rs']], r[f['rt']], f['shamt']) & 0xffffffff
+	return execute
+
+def _setImm(func):
+	"""Semantics for I format instructions computing rt from rs and the immediate."""
+	def execute(sim, f):
+		r = sim.regs
+		r[f['rt']] = func(r[f['rs']], f['imm']) & 0xffffffff
+	return execute
+
+def _loader(size, signed):
+	def execute(sim, f):
+		sim.regs[f['rt']] = sim.load(sim.regs[f['rs']] + f['imm'], size, signed)
+	return execute
+
+def _storer(size):
+	def execute(sim, f):
+		sim.store(sim.regs[f['rs']] + f['imm'], size, sim.regs[f['rt']])
+	return execute
+
+def _jal(sim, f):
+	sim.regs[31] = sim.nextPc
+	sim.nextPc = f['jump_target']
+
+def _jalr(sim, f):
+	target = sim.regs[f['rs']]
+	sim.regs[f['rd']] = sim.nextPc
+	sim.nextPc = target
+
+def _eret(sim, f):
+	sim.nextPc = sim.cop0[C0_EPC]
+
+def _setPc(sim, f):
+	sim.nextPc = f['jump_target']
+
+def _mfc0(sim, f):
+	sim.regs[f['rt']] = sim.cop0.get(f['rd'], 0)
+
+def _mtc0(sim, f):
+	sim.cop0[f['rd']] = sim.regs[f['rt']]
+
+EXECUTE = {
+	"sll": _setReg("sll", lambda s, t, sa: t << sa),
+	"srl": _setReg("srl", lambda s, t, sa: t >> sa),
+	"sra": _setReg("sra", lambda s, t, sa: toSigned(t) >> sa),
+	"sllv": _setReg("sllv", lambda s, t, sa: t << (s & 0x1f)),
+	"srlv": _setReg("srlv", lambda s, t, sa: t >> (s & 0x1f)),
+	"srav": _setReg("srav", lambda s, t, sa: toSigned(t) >> (s & 0x1f)),
+	"addu": _setReg("addu", lambda s, t, sa: s + t),
+	"subu": _setReg("subu", lambda s, t, sa: s - t),
+	"and": _setReg("and", lambda s, t, sa: s & t),
+	"or": _setReg("or", lambda s, t, sa: s | t),
+	"xor": _setReg("xor", lambda s, t, sa: s ^ t),
+	"nor": _setReg("nor", lambda s, t, sa: ~(s | t)),
+	"slt": _setReg("slt", lambda s, t, sa: int(toSigned(s) < toSigned(t))),
+	"sltu": _setReg("sltu", lambda s, t, sa: int(s < t)),
+	"mul": _setReg("mul", lambda s, t, sa: toSigned(s) * toSigned(t)),
+	"clz": _setReg("clz", lambda s, t, sa: 32 - len(bin(s)) + 2 if s else 32),
+	"add": lambda sim, f: _add(sim, f, sim.regs[f['rs']], sim.regs[f['rt']], f['rd']),
+	"sub": lambda sim, f: _add(sim, f, sim.regs[f['rs']], -toSigned(sim.regs[f['rt']]) & 0xffffffff if sim.regs[f['rt']] != 0x80000000 else 0x80000000, f['rd']),
+	"addi": lambda sim, f: _add(sim, f, sim.regs[f['rs']], f['imm'] & 0xffffffff, f['rt']),
+	"addiu": _setImm(lambda s, imm: s + imm),
+	"slti": _setImm(lambda s, imm: int(toSigned(s) < imm)),
+	"sltiu": _setImm(lambda s, imm: int(s < (imm & 0xffffffff))),
+	"andi": _setImm(lambda s, imm: s & (imm & 0xffff)),
+	"ori": _setImm(lambda s, imm: s | (imm & 0xffff)),
+	"xori": _setImm(lambda s, imm: s ^ (imm & 0xffff)),
+	"lui": _setImm(lambda s, imm: (imm & 0xffff) << 16),
+	"lb": _loader(1, True), "lbu": _loader(1, False),
+	"lh": _loader(2, True), "lhu": _loader(2, False),
+	"lw": _loader(4, False),
+	"sb": _storer(1), "sh": _storer(2), "sw": _storer(4),
+	"beq": lambda sim, f: _branch(sim, f, sim.regs[f['rs']] == sim.regs[f['rt']]),
+	"bne": lambda sim, f: _branch(sim, f, sim.regs[f['rs']] != sim.regs[f['rt']]),
+	"blez": lambda sim, f: _branch(sim, f, toSigned(sim.regs[f['rs']]) <= 0),
+	"bgtz": lambda sim, f: _branch(sim, f, toSigned(sim.regs[f['rs']]) > 0),
+	"bltz": lambda sim, f: _branch(sim, f, toSigned(sim.regs[f['rs']]) < 0),
+	"bgez": lambda sim, f: _branch(sim, f, toSigned(sim.regs[f['rs']]) >= 0),
+	"j": _setPc, "jal": _jal,
+	"jr": lambda sim, f: setattr(sim, "nextPc", sim.regs[f['rs']]),
+	"jalr": _jalr,
+	"syscall": lambda sim, f: sim.syscall(),
+	"break": lambda sim, f: _raise(EXC_BREAKPOINT),
+	"mfhi": lambda sim, f: sim.regs.__setitem__(f['rd'], sim.hi),
+	"mflo": lambda sim, f: sim.regs.__setitem__(f['rd'], sim.lo),
+	"mthi": lambda sim, f: setattr(sim, "hi", sim.regs[f['rs']]),
+	"mtlo": lambda sim, f: setattr(sim, "lo", sim.regs[f['rs']]),
+	"mult": lambda sim, f: _mult(sim, toSigned(sim.regs[f['rs']]) * toSigned(sim.regs[f['rt']])),
+	"multu": lambda sim, f: _mult(sim, sim.regs[f['rs']] * sim.regs[f['rt']]),
+	"div": lambda sim, f: _div(sim, sim.regs[f['rs']], sim.regs[f['rt']], True),
+	"divu": lambda sim, f: _div(sim, sim.regs[f['rs']], sim.regs[f['rt']], False),
+	"mfc0": _mfc0, "mtc0": _mtc0, "eret": _eret,
+}
+
+def _raise(code):
+	raise SimulatorException(code)
+
+# LOAD GENERATION
+
+def syntheticProgram(statements, registers=8, printEvery=0):
+	"""Generate a large program for load testing.
+
+	The program runs 'statements' arithmetic statements, each changing one of
+	the first 'registers' temporaries, so every step changes registers. If
+	printEvery is given, the running value is printed to the console every
+	printEvery statements, flooding the console."""
+	names = ["$t%d" % i for i in range(min(registers, 10))] + ["$s%d" % i for i in range(max(0, min(registers - 10, 8)))]
+	out = [".data", "newLine: .asciiz \"\\n\"", ".text", "main:"]
+	for i in xrange(statements):
+		reg = names[i % len(names)]
+		out.append("addiu %s, %s, %d" % (reg, names[(i + 1) % len(names)], (i % 97) + 1))
+		if (printEvery and i % printEvery == printEvery - 1):
+			out.extend(["li $v0, 1", "move $a0, %s" % reg, "syscall", "li $v0, 4", "la $a0, newLine", "syscall"])
+	out.extend(["li $v0, 10", "syscall"])
+	return "\n".join(out) + "\n"
+
+# LIVE PIPELINE RUNNER
+
+def loadAppModule(sim, numCells=40, registers=None, latency=0.0, bandwidth=None):
+	"""Create the app module and a replay driver on the simulator's desktop, in live mode's update path."""
+	nvda_shims.install()
+	import api, braille, config
+	import spim_replay
+	api.desktop = sim.desktop
+	driver = spim_replay.ReplayDisplayDriver(numCells, latency, bandwidth)
+	braille.handler.display = driver
+	regs = registers or ["v0", "a0", "t0", "t1"]
+	config.conf['pcspim'] = dict(("r%d" % i, regs[i]) for i in range(min(len(regs), driver.getRegisterCount())))
+	# F10 and F5 sent by the app module step and run the simulator.
+	nvda_shims.state.keyHandler = lambda key: {"f10": sim.step, "f5": sim.run}.get(key, lambda: None)()
+	import pcspim
+	appModule = pcspim.AppModule(1, "pcspim")
+	appModule._updateThread = lambda: None
+	return appModule, driver
+
+def main(args):
+	import optparse
+	parser = optparse.OptionParser(usage="%prog [--steps N] [--cells N] program.s")
+	parser.add_option("--steps", type="int", default=1000, help="instructions to step through")
+	parser.add_option("--cells", type="int", default=40, help="display size (14, 40 or 80)")
+	options, args = parser.parse_args(args)
+	if (len(args) != 1):
+		parser.error("a program is required")
+	sim = PCSpimSimulator()
+	sim.loadFile(args[0])
+	appModule, driver = loadAppModule(sim, options.cells)
+	appModule.viewMode = 1
+	appModule.revealMode = False
+	start = time.time()
+	updates = 0
+	for i in xrange(options.steps):
+		if (sim.halted): break
+		sim.step()
+		appModule.updateRegisters()
+		updates += 1
+	elapsed = time.time() - start
+	print "Ran %d steps with %d live updates in %.2f ms (%.3f ms per step), %d frames." % (sim.steps, updates, elapsed * 1000.0, elapsed * 1000.0 / max(updates, 1), driver.frames)
+	print "Console:"
+	print sim.console.replace("\r", "\n")
+
+if (__name__ == "__main__"):
+	main(sys.argv[1:])
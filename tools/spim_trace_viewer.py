@@ -0,0 +1,41 @@
+# SPIM Braille Trace Viewer
+# Receives trace records streamed by nvda/spim_trace.py and prints them.
+# by Flint Million <flint.million@mnsu.edu>
+
+# Usage:
+#   python spim_trace_viewer.py            listen on UDP port 6287 (the default TRACE_EXPORT)
+#   python spim_trace_viewer.py 7000       listen on another UDP port
+#   python spim_trace_viewer.py /tmp/spim  listen on a Unix socket path
+
+import sys, os, socket
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "nvda"))
+import spim_trace
+
+def openSocket(where):
+	"""Bind a datagram socket for the given port number or Unix socket path."""
+	if (where.isdigit()):
+		sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_UDP)
+		sock.bind(('127.0.0.1', int(where)))
+	else:
+		if (os.path.exists(where)): os.unlink(where)
+		sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+		sock.bind(where)
+	return sock
+
+def main(args):
+	where = args[0] if args else str(spim_trace.TRACE_EXPORT[1])
+	sock = openSocket(where)
+	print "SPIM Braille trace viewer listening on %s" % where
+	while (True):
+		packed = sock.recv(spim_trace.RECORD_SIZE)
+		if (len(packed) != spim_trace.RECORD_SIZE):
+			print "(ignoring %d byte datagram)" % len(packed)
+			continue
+		print spim_trace.formatRecord(spim_trace.decode(packed))
+
+if (__name__ == "__main__"):
+	try:
+		main(sys.argv[1:])
+	except KeyboardInterrupt:
+		pass
@@ -0,0 +1,67 @@
+# SPIM Braille Frame Viewer
+# Shows the frames a SPIM Braille display is showing, as Unicode braille in a terminal.
+# by Flint Million <flint.million@mnsu.edu>
+
+# The driver publishes frames once publishing is turned on (NVDA+Control+
+# Shift+V in PCSpim, or PUBLISH_ON_LOAD in nvda/spim_publish.py). Any number
+# of viewers can run at once.
+#
+# Usage:
+#   python spim_viewer.py              follow the default frame file
+#   python spim_viewer.py FILE         follow another frame file
+#   python spim_viewer.py --once       print the latest frame and exit
+#   python spim_viewer.py --all        print every frame on its own line, rather than redrawing one line
+
+import sys, os, time, optparse, codecs
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "nvda"))
+import spim_publish
+
+def formatFrame(frame, showTime=False):
+	sequence, timestamp, cells = frame
+	line = spim_publish.toUnicodeBraille(cells)
+	if (showTime):
+		line = u"%s.%03d %6d %s" % (time.strftime("%H:%M:%S", time.localtime(timestamp)), int(timestamp * 1000) % 1000, sequence, line)
+	return line
+
+def main(args):
+	parser = optparse.OptionParser(usage="%prog [--once] [--all] [--interval SECONDS] [FILE]")
+	parser.add_option("--once", action="store_true", default=False, help="print the latest frame and exit")
+	parser.add_option("--all", action="store_true", default=False, help="print every frame, with its time and sequence number")
+	parser.add_option("--interval", type="float", default=0.05, help="how often to look for new frames")
+	options, args = parser.parse_args(args)
+	path = args[0] if args else spim_publish.DEFAULT_PATH
+	out = codecs.getwriter("utf-8")(sys.stdout)
+	try:
+		reader = spim_publish.FrameReader(path)
+	except (IOError, ValueError), e:
+		print "Can't read frames: %s" % e
+		return 1
+	if (options.once):
+		latest = reader.latest()
+		frame = reader.frame(latest) if (latest) else None
+		if (frame is None):
+			print "No frame has been published yet."
+			return 1
+		out.write(formatFrame(frame, True) + u"\n")
+		return 0
+	print "Following %s. Press Control+C to stop." % path
+	seen = 0
+	while (True):
+		# If the file was made afresh, its sequence numbers start again and framesAfter gives the newest frames.
+		frames = reader.framesAfter(seen)
+		if (frames):
+			if (options.all):
+				for frame in frames: out.write(formatFrame(frame, True) + u"\n")
+			else:
+				# Redraw one line with the latest frame; a viewer needn't keep up with every frame.
+				out.write(u"\r" + formatFrame(frames[-1]) + u"\x1b[K")
+			sys.stdout.flush()
+			seen = frames[-1][0]
+		time.sleep(options.interval)
+
+if (__name__ == "__main__"):
+	try:
+		sys.exit(main(sys.argv[1:]))
+	except KeyboardInterrupt:
+		print